@@ -0,0 +1,248 @@
+"""
+Entrega dos arquivos de MEDIA (fotos, miniaturas e PDFs de NF) em produção.
+
+As URLs geradas pelo storage levam uma assinatura com validade (?exp=&sig=): só
+quem recebeu o item pela API (inclusive a página pública de triagem) consegue
+abrir o arquivo, e <img>/<a> funcionam sem cabeçalho Authorization. Clientes da
+API também podem usar o access token JWT no cabeçalho, com a mesma permissão do
+detalhe do item dono do arquivo. Com MEDIA_ACCEL_REDIRECT definido, o Django só
+autoriza e o nginx faz a transferência (X-Accel-Redirect); sem ele, a resposta sai
+do próprio Django com Range, ETag e cache longo.
+"""
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import quote, urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+FILE_BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+# --- URLS ASSINADAS ---
+
+_signer = signing.Signer(salt='core.media')
+
+
+def _signature(name, expires):
+    return _signer.signature(f'{name}:{expires}')
+
+
+def signed_query(name, now=None):
+    """
+    ?exp=&sig= de `name`. A validade é arredondada para janelas de MEDIA_URL_TTL_SECONDS,
+    então a URL de um arquivo fica igual por uma janela inteira e o cache do navegador vale.
+    """
+    ttl = settings.MEDIA_URL_TTL_SECONDS
+    now = int(time.time()) if now is None else now
+    expires = (now // ttl + 2) * ttl
+    return urlencode({'exp': expires, 'sig': _signature(name, expires)})
+
+
+def valid_signature(name, expires, signature):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    return expires >= time.time() and constant_time_compare(_signature(name, expires), signature or '')
+
+
+class SignedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage cujas URLs já saem assinadas (serializers, admin, exports)."""
+
+    def url(self, name):
+        return f'{super().url(name)}?{signed_query(name)}'
+
+
+# --- RESPOSTA ---
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _byte_range(request, size, etag, mtime):
+    """
+    (início, fim) do cabeçalho Range, None para o arquivo inteiro ou False se o
+    intervalo não é satisfazível (416). Só um intervalo por requisição; múltiplos
+    (multipart/byteranges) recebem o arquivo inteiro, como o RFC permite.
+    """
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        if if_range.startswith(('"', 'W/')):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(mtime):
+            return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if size == 0:
+        return False
+    if not first:
+        # Sufixo: os últimos N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, end
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(FILE_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def _aread(path, start, length):
+    # Sob ASGI um iterador síncrono (e o FileResponse) seria lido inteiro para a memória
+    file = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        await sync_to_async(file.seek, thread_sensitive=False)(start)
+        while length > 0:
+            chunk = await read(min(FILE_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def file_response(request, name):
+    path = default_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+
+    etag = _etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        # Os nomes gravados nunca são reaproveitados com outro conteúdo (o storage gera
+        # um nome novo), então o navegador pode guardar pelo tempo máximo
+        'Cache-Control': f'private, max-age={settings.MEDIA_CACHE_SECONDS}, immutable',
+    }
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        for header, value in headers.items():
+            conditional[header] = value
+        return conditional
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        # O nginx entrega o arquivo (Range, sendfile) sem ocupar o worker
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(name)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    size = stat.st_size
+    byte_range = _byte_range(request, size, etag, stat.st_mtime)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    length = max(0, end - start + 1)
+
+    if request.method == 'HEAD':
+        response = HttpResponse()
+    elif isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_aread(path, start, length))
+    elif byte_range:
+        response = StreamingHttpResponse(_read(path, start, length))
+    else:
+        # Arquivo inteiro sob WSGI: o FileResponse usa o wsgi.file_wrapper (sendfile no gunicorn)
+        response = FileResponse(open(path, 'rb'))
+    content_type, encoding = mimetypes.guess_type(path)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    for header, value in headers.items():
+        response[header] = value
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+# --- VIEW ---
+
+def _token_may_read(request, name):
+    """
+    Com access token JWT, o arquivo precisa pertencer a um item (foto, miniatura ou NF)
+    que o usuário possa abrir pelo detalhe /api/physical-control/items/<id>/: as mesmas
+    classes de permissão da viewset, com o usuário lido do banco (ativo).
+    Devolve True/False, ou None quando nenhum item é dono do arquivo.
+    """
+    from physical_control.media import owning_items
+    from physical_control.views import PhysicalControlViewSet
+
+    drf_request = Request(request, authenticators=[JWTAuthentication()])
+    view = PhysicalControlViewSet(request=drf_request, action='retrieve', format_kwarg=None, args=(), kwargs={})
+    try:
+        view.check_permissions(drf_request)
+    except APIException:
+        return False
+    items = owning_items(name)
+    if not items:
+        return None
+    for item in items:
+        try:
+            view.check_object_permissions(drf_request, item)
+        except APIException:
+            continue
+        return True
+    return False
+
+
+@require_safe
+def serve_media(request, path):
+    """Arquivo de MEDIA com URL assinada ou access token JWT (Authorization: Bearer)."""
+    if not valid_signature(path, request.GET.get('exp'), request.GET.get('sig')):
+        allowed = _token_may_read(request, path)
+        if allowed is None:
+            raise Http404
+        if not allowed:
+            return JsonResponse({"detail": "Link expirado ou sem autorização."}, status=403)
+    try:
+        return file_response(request, path)
+    except SuspiciousFileOperation:
+        raise Http404
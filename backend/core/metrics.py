@@ -0,0 +1,313 @@
+"""
+Métricas por rota (latência, SQL, tamanho da resposta) no formato texto do Prometheus.
+
+Cada processo acumula os valores em memória e grava um snapshot em METRICS_DIR no
+máximo a cada METRICS_FLUSH_SECONDS; o /metrics soma os snapshots de todos os workers
+(o scrape cai num worker qualquer do gunicorn). Snapshots de workers encerrados são
+apagados no scrape; a queda que isso causa nos contadores é tratada pelo Prometheus
+como um reset (rate/increase continuam corretos).
+"""
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger('core.metrics.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+# Máximo de statements guardados por requisição para o log de requisições lentas
+SLOW_LOG_MAX_QUERIES = 50
+
+# nome -> (tipo, ajuda, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requisições por rota, método e status.', None),
+    'http_request_duration_seconds': ('histogram', 'Latência da requisição (até o início da resposta).', LATENCY_BUCKETS),
+    'http_request_db_queries': ('histogram', 'Statements SQL por requisição.', QUERY_COUNT_BUCKETS),
+    'http_request_db_seconds_total': ('counter', 'Tempo total gasto em SQL.', None),
+    'http_request_python_seconds_total': ('counter', 'Tempo fora do SQL (views, serializers, renderização).', None),
+    'http_response_size_bytes': ('histogram', 'Tamanho do corpo das respostas não-streaming.', SIZE_BUCKETS),
+}
+
+UNMATCHED_ROUTE = 'unmatched'
+
+
+# --- REGISTRO EM MEMÓRIA (por processo) ---
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [contagem por bucket..., +Inf, soma]
+                state = self.values[key] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, list(labels), list(value) if isinstance(value, list) else value]
+                for (name, labels), value in self.values.items()
+            ]
+
+
+registry = Registry()
+
+
+def _metrics_dir():
+    return settings.METRICS_DIR
+
+
+def flush(force=False):
+    """Grava o snapshot deste processo (escrita atômica via rename)."""
+    now = time.monotonic()
+    if not force and now - registry.last_flush < settings.METRICS_FLUSH_SECONDS:
+        return
+    registry.last_flush = now
+    directory = _metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(registry.snapshot(), file)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, mas é de outro usuário
+        return True
+    return True
+
+
+def collect():
+    """Soma os snapshots dos processos vivos e apaga os de workers encerrados."""
+    flush(force=True)
+    merged = {}
+    directory = _metrics_dir()
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        pid = filename[:-len('.json')]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            # Worker gravando neste instante; entra no próximo scrape
+            continue
+        for name, labels, value in rows:
+            if name not in METRICS:
+                continue
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if isinstance(value, list):
+                current = merged.setdefault(key, [0] * len(value))
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render(merged):
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in merged.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            for bound, count in zip(buckets, value):
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {value[-2]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-2]}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- SQL DA REQUISIÇÃO CORRENTE ---
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'statements')
+
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = [] if capture_sql else None
+
+
+# Propaga para as threads do sync_to_async (views async) junto com o contexto
+_current = ContextVar('metrics_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None and len(stats.statements) < SLOW_LOG_MAX_QUERIES:
+            stats.statements.append((elapsed, sql))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # Cada thread tem seu DatabaseWrapper; instala uma única vez por wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+# --- MIDDLEWARE ---
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name or match.route or UNMATCHED_ROUTE
+
+
+def _response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """Registra latência, SQL e tamanho por rota; opcionalmente loga requisições lentas."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Conexões abertas antes do middleware (ex.: migrações no startup)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    def begin(self):
+        stats = RequestStats(capture_sql=bool(settings.METRICS_SLOW_REQUEST_MS))
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        duration = time.perf_counter() - start
+        route = _route(request)
+        labels = (('route', route), ('method', request.method))
+
+        registry.inc('http_requests_total', labels + (('status', str(response.status_code)),))
+        registry.observe('http_request_duration_seconds', labels, duration)
+        registry.observe('http_request_db_queries', labels, stats.queries)
+        registry.inc('http_request_db_seconds_total', labels, stats.db_seconds)
+        registry.inc('http_request_python_seconds_total', labels, max(0.0, duration - stats.db_seconds))
+        size = _response_size(response)
+        if size is not None:
+            registry.observe('http_response_size_bytes', labels, size)
+
+        slow_ms = settings.METRICS_SLOW_REQUEST_MS
+        if slow_ms and stats.statements is not None and duration * 1000 >= slow_ms:
+            self.log_slow(request, route, duration, stats)
+        try:
+            flush()
+        except OSError:
+            logger.exception("Falha ao gravar o snapshot de métricas")
+
+    def log_slow(self, request, route, duration, stats):
+        slowest = sorted(stats.statements, key=lambda row: -row[0])
+        logger.warning(
+            "Requisição lenta: %s %s [%s] %.0f ms, %d queries (%.0f ms em SQL)\n%s",
+            request.method, request.get_full_path(), route, duration * 1000,
+            stats.queries, stats.db_seconds * 1000,
+            '\n'.join(f'  {elapsed * 1000:8.1f} ms  {sql}' for elapsed, sql in slowest),
+        )
+
+
+# --- ENDPOINT ---
+
+def metrics_view(request):
+    """
+    /metrics no formato texto do Prometheus, com "Authorization: Bearer <METRICS_TOKEN>".
+    Sem METRICS_TOKEN configurado o endpoint não existe (404), com ou sem DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    received = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(received, f'Bearer {token}'.encode('utf-8')):
+        return HttpResponse(status=401)
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
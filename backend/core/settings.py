@@ -14,6 +14,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -22,6 +23,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira (core/metrics.py)
+    'core.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -66,8 +69,19 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# --- CACHE ---
+# Padrão em arquivo: compartilhado entre os workers do gunicorn sem precisar de Redis.
+# Para um único processo (dev) pode-se usar django.core.cache.backends.locmem.LocMemCache.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("DJANGO_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", "/tmp/engineering_panel_cache"),
+    }
+}
+
 ROOT_URLCONF = 'core.urls'
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 DATABASES = {
     "default": {
@@ -77,6 +91,14 @@ DATABASES = {
         "PASSWORD": os.environ.get("DATABASE_PASSWORD", "35jsJL9d"),
         "HOST": os.environ.get("DATABASE_HOST", "db"),  
         "PORT": os.environ.get("DATABASE_PORT", "5432"),
+        # Sob ASGI cada requisição roda o ORM numa thread própria, então conexões
+        # persistentes não seriam reaproveitadas e só acumulariam: o padrão é 0 (uma
+        # conexão por requisição). No perfil WSGI (workers sync) use 60 ou mais.
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
+        # Com um pooler em modo transação (pgbouncer) os cursores server-side das
+        # exportações precisam ser desligados
+        "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("DATABASE_DISABLE_SERVER_SIDE_CURSORS", "0") == "1",
     }
 }
 
@@ -88,4 +110,45 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# --- ENTREGA DE MEDIA (core/media.py) ---
+# URLs de arquivos assinadas; servidas por /media/ com verificação da assinatura ou do JWT
+STORAGES = {
+    "default": {"BACKEND": "core.media.SignedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# Validade mínima de uma URL assinada (a mesma URL é reaproveitada dentro da janela)
+MEDIA_URL_TTL_SECONDS = int(os.environ.get("MEDIA_URL_TTL_SECONDS", str(7 * 24 * 3600)))
+MEDIA_CACHE_SECONDS = int(os.environ.get("MEDIA_CACHE_SECONDS", str(365 * 24 * 3600)))
+# Location "internal" do nginx apontando para MEDIA_ROOT (ex.: /protected-media/); vazio
+# faz o próprio Django enviar o arquivo
+MEDIA_ACCEL_REDIRECT = os.environ.get("MEDIA_ACCEL_REDIRECT", "")
+
+# --- PROCESSAMENTO DE FOTOS ---
+# Miniaturas geradas em threads após o commit; False gera na própria requisição (testes/scripts)
+PHOTO_RENDITIONS_ASYNC = os.environ.get("PHOTO_RENDITIONS_ASYNC", "1") == "1"
+PHOTO_RENDITION_WORKERS = int(os.environ.get("PHOTO_RENDITION_WORKERS", "2"))
+# Threads que gravam fotos/NF do create_batch em paralelo (4 fotos + NF)
+MEDIA_WRITE_WORKERS = int(os.environ.get("MEDIA_WRITE_WORKERS", "5"))
+
+# --- UPLOADS RETOMÁVEIS (physical_control/uploads.py) ---
+# Fora do MEDIA_ROOT (não é servido); de preferência no mesmo disco, a cópia final é local
+UPLOAD_STAGING_DIR = os.environ.get("UPLOAD_STAGING_DIR", os.path.join(BASE_DIR, 'upload_staging'))
+# Horas sem receber blocos até o upload ser descartado (comando purge_staged_uploads)
+UPLOAD_STAGING_TTL_HOURS = int(os.environ.get("UPLOAD_STAGING_TTL_HOURS", "24"))
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get("UPLOAD_MAX_FILE_SIZE", str(200 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_SIZE", str(16 * 1024 * 1024)))
+
+# --- FILA DE PROCESSAMENTO ---
+# Minutos até um item "Em andamento" sem conclusão voltar a ser entregue pelo claim
+PROCESSING_CLAIM_TIMEOUT_MINUTES = int(os.environ.get("PROCESSING_CLAIM_TIMEOUT_MINUTES", "30"))
+
+# --- MÉTRICAS (/metrics) ---
+# Snapshots por processo somados no scrape; o diretório precisa ser compartilhado pelos workers
+METRICS_DIR = os.environ.get("METRICS_DIR", "/tmp/engineering_panel_metrics")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+# O /metrics exige "Authorization: Bearer <token>"; sem token configurado responde 404
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Loga (WARNING, logger core.metrics.slow) o SQL das requisições acima deste tempo; 0 desliga
+METRICS_SLOW_REQUEST_MS = int(os.environ.get("METRICS_SLOW_REQUEST_MS", "0"))
@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import metrics
+from physical_control.models import InvoiceDocument, Location, PhysicalControl
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.override = override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN='segredo')
+        self.override.enable()
+        metrics.registry.values.clear()
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def scrape(self, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', 'Bearer segredo')
+        return APIClient().get('/metrics', **headers)
+
+    def sample(self, text, series):
+        match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.MULTILINE)
+        return float(match.group(1)) if match else None
+
+    def test_records_routes_queries_and_size(self):
+        location = Location.objects.create(name='Almoxarifado')
+        PhysicalControl.objects.create(product='Peça', quantity=1, location=location, current_responsible=self.user)
+        self.client.get('/api/physical-control/items/')
+        self.client.get('/api/physical-control/items/')
+        self.client.get('/api/physical-control/items/999999/')
+        self.client.get('/nao-existe/')
+
+        text = self.scrape().content.decode()
+        labels = 'route="items-list",method="GET"'
+        self.assertEqual(self.sample(text, f'http_requests_total{{{labels},status="200"}}'), 2)
+        self.assertEqual(self.sample(text, f'http_request_duration_seconds_count{{{labels}}}'), 2)
+        self.assertEqual(self.sample(text, f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'), 2)
+        self.assertGreater(self.sample(text, f'http_request_db_queries_sum{{{labels}}}'), 0)
+        self.assertGreater(self.sample(text, f'http_response_size_bytes_sum{{{labels}}}'), 0)
+        self.assertEqual(
+            self.sample(text, 'http_requests_total{route="items-detail",method="GET",status="404"}'), 1
+        )
+        self.assertEqual(self.sample(text, 'http_requests_total{route="unmatched",method="GET",status="404"}'), 1)
+
+    async def test_async_view_queries_are_attributed(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.get('/api/physical-control/items/export/', headers=headers)
+        [chunk async for chunk in response.streaming_content]
+
+        text = (await sync_to_async(self.scrape)()).content.decode()
+        self.assertGreater(
+            self.sample(text, 'http_request_db_queries_sum{route="items-export",method="GET"}'), 0
+        )
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0.001)
+    def test_slow_request_log_includes_sql(self):
+        with self.assertLogs('core.metrics.slow', 'WARNING') as logs:
+            self.client.get('/api/physical-control/items/')
+        self.assertIn('[items-list]', logs.output[0])
+        self.assertIn('physical_control_physicalcontrol', logs.output[0])
+
+    def test_token_protects_endpoint(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer outro').status_code, 401)
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', response.content.decode())
+
+    def test_endpoint_is_closed_without_configured_token(self):
+        # O settings fixa DEBUG = True: o endpoint não pode depender disso
+        for debug in (False, True):
+            with override_settings(METRICS_TOKEN='', DEBUG=debug):
+                self.assertEqual(self.scrape().status_code, 404)
+                self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    def test_snapshots_of_dead_workers_are_removed(self):
+        dead = os.path.join(self.metrics_dir, '999999999.json')
+        with open(dead, 'w') as file:
+            json.dump([['http_requests_total', [['route', 'antiga'], ['method', 'GET'], ['status', '200']], 5]], file)
+        self.assertNotIn('route="antiga"', self.scrape().content.decode())
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.exists(os.path.join(self.metrics_dir, f'{os.getpid()}.json')))
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT='')
+        self.override.enable()
+        self.name = default_storage.save('physical_control/NF_1/DUR-0125-0001/nota.pdf', ContentFile(b'0123456789'))
+        self.url = default_storage.url(self.name)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_signed_url_or_token_is_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        path = f'/media/{self.name}'
+        self.assertEqual(self.client.get(path).status_code, 403)
+        self.assertEqual(self.client.get(self.url.replace('sig=', 'sig=x')).status_code, 403)
+        other = default_storage.url('physical_control/outro.pdf').split('?')[1]
+        self.assertEqual(self.client.get(f'{path}?{other}').status_code, 403)
+
+        user = User.objects.create_user(username='ana', password='x')
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        # Com token, o arquivo precisa ter um item dono
+        self.assertEqual(self.client.get(path, **auth).status_code, 404)
+        self.make_owner(user)
+        response = self.client.get(path, **auth)
+        self.assertEqual(self.body(response), b'0123456789')
+        self.assertEqual(self.client.get('/media/../core/settings.py', **auth).status_code, 404)
+        self.assertEqual(self.client.get('/media/physical_control/nada.pdf', **auth).status_code, 404)
+
+    def make_owner(self, user, **fields):
+        fields.setdefault('invoice', InvoiceDocument.objects.create(file=self.name))
+        return PhysicalControl.objects.create(
+            nf_number='1', sender='Fornecedor', product='Peça', quantity=1,
+            location=Location.objects.create(name='Almoxarifado'), current_responsible=user, **fields,
+        )
+
+    def test_token_without_access_is_forbidden(self):
+        owner = User.objects.create_user(username='dono', password='x')
+        item = self.make_owner(owner, invoice=None, photo_top=self.name, photo_renditions={
+            'photo_top': {'source': self.name, 'thumb': self.name.replace('nota.pdf', 'renditions/nota_thumb.pdf')},
+        })
+        thumb = default_storage.save(item.photo_renditions['photo_top']['thumb'], ContentFile(b'mini'))
+        self.assertEqual(thumb, item.photo_renditions['photo_top']['thumb'])
+
+        allowed = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(owner)}'}
+        self.assertEqual(self.client.get(f'/media/{self.name}', **allowed).status_code, 200)
+        self.assertEqual(self.body(self.client.get(f'/media/{thumb}', **allowed)), b'mini')
+
+        blocked = User.objects.create_user(username='bloqueado', password='x', is_active=False)
+        denied = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(blocked)}'}
+        self.assertEqual(self.client.get(f'/media/{self.name}', **denied).status_code, 403)
+        self.assertEqual(self.client.get(f'/media/{thumb}', **denied).status_code, 403)
+
+    def test_ranges_and_conditional_requests(self):
+        partial = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(self.body(partial), b'2345')
+        self.assertEqual(self.body(self.client.get(self.url, HTTP_RANGE='bytes=-3')), b'789')
+        self.assertEqual(self.body(self.client.get(self.url, HTTP_RANGE='bytes=7-')), b'789')
+        unsatisfiable = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(unsatisfiable.status_code, 416)
+        self.assertEqual(unsatisfiable['Content-Range'], 'bytes */10')
+        stale = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"outra-versao"')
+        self.assertEqual(stale.status_code, 200)
+
+        etag = partial['ETag']
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+    def test_accel_redirect_hands_transfer_to_nginx(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    async def test_asgi_streams_with_async_iterator(self):
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=0-3'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'0123')
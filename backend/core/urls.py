@@ -10,38 +10,33 @@ from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
+from rest_framework import status
 
-# Import do Model de Preferências
-from userprefs.models import UserPreferences
+# Perfil pré-calculado (cache invalidado por signals em userprefs)
+from userprefs.profile import get_profile_entry
+
+from .media import serve_media
+from .metrics import metrics_view
 
 # --- View de Perfil ---
+# Autenticação stateless: o usuário vem do próprio token, sem SELECT. Com cache
+# quente e If-None-Match igual ao ETag, a resposta 304 não toca no banco.
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([JWTStatelessUserAuthentication])
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
-    user_perms = []
-    if request.user.is_authenticated:
-        for perm in request.user.get_all_permissions():
-            user_perms.append(perm)
-
-    prefs_obj, _ = UserPreferences.objects.get_or_create(
-        user=request.user,
-        defaults={"data": {}}
-    )
+    entry = get_profile_entry(request.user.id)
+    if entry is None:
+        raise AuthenticationFailed('Usuário inativo ou inexistente.')
 
-    return Response({
-        'id': request.user.id,
-        'username': request.user.username,
-        'first_name': request.user.first_name or request.user.username,
-        'last_name': request.user.last_name or "",
-        'is_staff': request.user.is_staff,
-        'is_superuser': request.user.is_superuser,
-        'permissions': user_perms,
-        'groups': list(request.user.groups.values_list('name', flat=True)),
-        'preferences': prefs_obj.data or {}
-    })
+    headers = {'ETag': entry['etag'], 'Cache-Control': 'private, no-cache'}
+    if_none_match = request.headers.get('If-None-Match', '')
+    if entry['etag'] in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entry['data'], headers=headers)
 
 # --- Rotas Principais ---
 urlpatterns = [
@@ -57,13 +52,15 @@ urlpatterns = [
     # UserPrefs
     path("api/userprefs/", include("userprefs.urls")),
 
+    # Métricas no formato do Prometheus
+    path('metrics', metrics_view, name='metrics'),
+
     # Controle Físico (App de Engenharia)
     path('api/physical-control/', include('physical_control.urls')),
+
+    # Fotos e PDFs (URL assinada ou JWT), em DEBUG e em produção
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='media'),
 ]
 
-# --- Configuração para servir arquivos de MEDIA ---
-# Isso permite que URLs como http://localhost:8000/media/physical_control/... 
-# abram as imagens e PDFs diretamente no navegador do frontend.
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
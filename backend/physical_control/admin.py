@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Location, PhysicalControl
+from .models import Location, MovementEvent, PhysicalControl
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
@@ -10,4 +10,17 @@ class LocationAdmin(admin.ModelAdmin):
 class PhysicalControlAdmin(admin.ModelAdmin):
     list_display = ('control_id', 'product', 'nf_number', 'location', 'current_responsible')
     search_fields = ('control_id', 'product', 'nf_number')
-    readonly_fields = ('control_id', 'movement_history')
\ No newline at end of file
+    readonly_fields = ('control_id',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Usa o índice de busca textual em vez de icontains sem índice
+        if not search_term.strip():
+            return queryset, False
+        return queryset.search(search_term), False
+
+@admin.register(MovementEvent)
+class MovementEventAdmin(admin.ModelAdmin):
+    list_display = ('item', 'action', 'timestamp', 'location', 'physical_location', 'responsible')
+    list_filter = ('action', 'location')
+    list_select_related = ('item', 'location', 'responsible')
+    raw_id_fields = ('item',)
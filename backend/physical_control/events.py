@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Canal do LISTEN/NOTIFY do Postgres. Os eventos saem no on_commit da transação
+# corrente, então nenhum cliente vê mudança desfeita nem o NOTIFY pesa na transação.
+EVENTS_CHANNEL = 'physical_control_events'
+
+# O payload do NOTIFY tem limite de 8000 bytes; lotes maiores são divididos
+MAX_PAYLOAD_BYTES = 7500
+
+# Eventos pendentes por cliente antes de ele ser desconectado (cliente lento)
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Espera máxima pela conexão LISTEN antes de recusar o stream (503)
+LISTEN_TIMEOUT_SECONDS = 5.0
+
+
+# --- PUBLICAÇÃO ---
+
+def _chunks(events):
+    chunk, size = [], 2
+    for event in events:
+        encoded = json.dumps(event, separators=(',', ':'), default=str)
+        if chunk and size + len(encoded) + 1 > MAX_PAYLOAD_BYTES:
+            yield '[' + ','.join(chunk) + ']'
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        yield '[' + ','.join(chunk) + ']'
+
+
+def publish(*events):
+    """Envia eventos compactos ({"type": ..., ...}) depois do commit da transação corrente."""
+    payloads = list(_chunks(events))
+
+    def notify():
+        with connection.cursor() as cursor:
+            for payload in payloads:
+                cursor.execute(f"NOTIFY {EVENTS_CHANNEL}, %s", [payload])
+
+    transaction.on_commit(notify)
+
+
+def item_event(item, event_type):
+    return {
+        'type': event_type,
+        'id': item.pk,
+        'control_id': item.control_id,
+        'location': item.location_id,
+        'physical_location': item.physical_location,
+    }
+
+
+def processing_event(processing):
+    return {
+        'type': 'processing.updated',
+        'id': processing.pk,
+        'item': processing.item_id,
+        'status': processing.status,
+        'claimed_by': processing.claimed_by_id,
+    }
+
+
+# --- DISTRIBUIÇÃO (uma conexão LISTEN por processo) ---
+
+class Subscription:
+    def __init__(self, hub, loop):
+        self.hub = hub
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, events):
+        # Chamado na thread do listener; a fila só é tocada no loop do cliente
+        try:
+            self.loop.call_soon_threadsafe(self._put, events)
+        except RuntimeError:
+            # Loop encerrado sem passar pelo close()
+            self.close()
+
+    def _put(self, events):
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                return
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Mantém uma conexão psycopg2 dedicada com LISTEN e repassa cada NOTIFY para as
+    filas dos clientes conectados neste processo. A thread só existe enquanto houver
+    algum inscrito.
+    """
+    poll_interval = 1.0
+    reconnect_delay = 2.0
+
+    def __init__(self, alias=DEFAULT_DB_ALIAS):
+        self.alias = alias
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.listening = threading.Event()
+
+    def subscribe(self):
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.thread is None or not self.thread.is_alive():
+                self.listening.clear()
+                self.thread = threading.Thread(target=self._run, name='events-listener', daemon=True)
+                self.thread.start()
+        return subscription
+
+    async def wait_listening(self, timeout=LISTEN_TIMEOUT_SECONDS):
+        """True quando o LISTEN está ativo; False se não ficou pronto dentro de `timeout`."""
+        deadline = time.monotonic() + timeout
+        while not self.listening.is_set():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        params = connections[self.alias].get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+        return conn
+
+    def _dispatch(self, payload):
+        try:
+            events = json.loads(payload)
+        except ValueError:
+            logger.warning("Evento inválido no canal %s: %r", EVENTS_CHANNEL, payload[:200])
+            return
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.deliver(events)
+
+    def _run(self):
+        conn = None
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    self.listening.clear()
+                    break
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    self.listening.set()
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._dispatch(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Conexão LISTEN perdida; reconectando")
+                if conn is not None:
+                    conn.close()
+                conn = None
+                time.sleep(self.reconnect_delay)
+        if conn is not None:
+            conn.close()
+
+
+hub = EventHub()
+
+
+# --- STREAM SSE ---
+
+HEARTBEAT_SECONDS = 15
+
+
+def _sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)}\n\n"
+
+
+async def stream_events(subscription, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Gera o texto SSE de uma inscrição já ativa (ver EventHub.wait_listening). "ready"
+    avisa que o LISTEN está ativo (o cliente sincroniza o que perdeu antes disso pelo
+    feed ?since=); "resync" indica que eventos foram descartados e o cliente deve recarregar.
+    """
+    try:
+        yield 'retry: 5000\n\n'
+        yield _sse('ready', {})
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if subscription.overflowed:
+                yield _sse('resync', {})
+                return
+            yield _sse(event.get('type', 'message'), event)
+    finally:
+        subscription.close()
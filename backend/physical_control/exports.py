@@ -0,0 +1,176 @@
+import csv
+import os
+import tempfile
+from datetime import date, datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+# Tamanho do lote lido do cursor server-side do Postgres
+EXPORT_CHUNK_SIZE = 2000
+
+# Bloco lido do arquivo temporário do XLSX no modo async
+FILE_BLOCK_SIZE = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# (cabeçalho, coluna do values_list)
+ITEM_COLUMNS = [
+    ('ID Controle', 'control_id'),
+    ('NF', 'nf_number'),
+    ('Data Recebimento', 'receipt_date'),
+    ('Remetente', 'sender'),
+    ('Produto', 'product'),
+    ('Quantidade', 'quantity'),
+    ('Local', 'location__name'),
+    ('Posição', 'physical_location'),
+    ('Responsável', 'current_responsible__first_name'),
+    ('', 'current_responsible__last_name'),
+    ('', 'current_responsible__username'),
+    ('Obs. Item', 'item_notes'),
+    ('Obs. NF', 'nf_notes'),
+    ('Criado em', 'created_at'),
+]
+
+PROCESSING_COLUMNS = [
+    ('ID Controle', 'item__control_id'),
+    ('NF', 'item__nf_number'),
+    ('Remetente', 'item__sender'),
+    ('Produto', 'item__product'),
+    ('Local', 'item__location__name'),
+    ('Status', 'status'),
+    ('Motivo', 'reason'),
+    ('Observação', 'observation'),
+    ('Atualizado em', 'updated_at'),
+]
+
+
+class Echo:
+    """Buffer "falso" para o csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, value):
+        return value
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%d/%m/%Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    return value
+
+
+def _rows(queryset, columns):
+    """
+    Gera (cabeçalho, linhas...) lendo o queryset via cursor server-side, sem
+    instanciar models. As três colunas do responsável viram um único "nome amigável".
+    """
+    fields = [field for _, field in columns]
+    headers = [header for header, _ in columns if header]
+    yield headers
+
+    name_slice = None
+    if 'current_responsible__first_name' in fields:
+        start = fields.index('current_responsible__first_name')
+        name_slice = (start, start + 3)
+
+    for values in queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        values = list(values)
+        if name_slice:
+            first, last, username = values[name_slice[0]:name_slice[1]]
+            full_name = f"{first or ''} {last or ''}".strip() or username
+            values[name_slice[0]:name_slice[1]] = [full_name]
+        yield [_clean(value) for value in values]
+
+
+async def _arows(queryset, columns):
+    """
+    Versão async de _rows: cada lote é lido na thread da requisição (a mesma do
+    cursor server-side), fora do event loop.
+    """
+    rows = _rows(queryset, columns)
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+    try:
+        while chunk := await next_chunk():
+            for row in chunk:
+                yield row
+    finally:
+        await sync_to_async(rows.close)()
+
+
+def _filename(basename, extension):
+    return f"{basename}_{timezone.localtime():%Y%m%d_%H%M}.{extension}"
+
+
+def stream_csv(queryset, columns, basename, asynchronous=False):
+    writer = csv.writer(Echo(), delimiter=';')
+
+    def generate():
+        # BOM para o Excel abrir o UTF-8 com acentos corretamente
+        yield '\ufeff'
+        for row in _rows(queryset, columns):
+            yield writer.writerow(row)
+
+    async def agenerate():
+        yield '\ufeff'
+        async for row in _arows(queryset, columns):
+            yield writer.writerow(row)
+
+    # Sob ASGI um iterador síncrono seria lido inteiro para a memória antes do envio
+    content = agenerate() if asynchronous else generate()
+    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{_filename(basename, "csv")}"'
+    return response
+
+
+async def _aread(fileobj):
+    read = sync_to_async(fileobj.read, thread_sensitive=False)
+    try:
+        while chunk := await read(FILE_BLOCK_SIZE):
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def stream_xlsx(queryset, columns, basename, asynchronous=False):
+    """
+    O formato XLSX é um zip e não pode ser emitido linha a linha; o openpyxl em
+    modo write_only grava as linhas direto em disco, então a memória continua
+    constante e o arquivo temporário é enviado em blocos.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=basename[:31])
+    for row in _rows(queryset, columns):
+        sheet.append(row)
+
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(tmp)
+    tmp.seek(0)
+    filename = _filename(basename, 'xlsx')
+    if not asynchronous:
+        return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+    # FileResponse também seria bufferizado inteiro sob ASGI
+    response = StreamingHttpResponse(_aread(tmp), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Length'] = os.fstat(tmp.fileno()).st_size
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def export_response(queryset, columns, basename, file_format, asynchronous=False):
+    """
+    `asynchronous` indica que a resposta será servida pelo handler ASGI: o conteúdo
+    passa a ser um iterador async (a montagem do XLSX continua síncrona).
+    """
+    if file_format == 'xlsx':
+        return stream_xlsx(queryset, columns, basename, asynchronous)
+    return stream_csv(queryset, columns, basename, asynchronous)
@@ -0,0 +1,159 @@
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def _param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _date_param(params, name):
+    try:
+        return parse_date(_param(params, name) or '')
+    except ValueError:
+        return None
+
+
+def _datetime_param(params, name, end_of_day=False):
+    """Aceita data-hora ISO ou só a data (início/fim do dia no fuso do projeto)."""
+    raw = _param(params, name)
+    if not raw:
+        return None
+    try:
+        value = parse_datetime(raw)
+        if value is None:
+            day = parse_date(raw)
+            if day is None:
+                return None
+            value = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def filter_items(queryset, params):
+    """
+    Filtros server-side da listagem de itens (?nf_number=&sender=&location=&responsible=
+    &receipt_date_from=&receipt_date_to=&closet=&shelf=&slot=). Todos usam igualdade/intervalo para
+    aproveitar os índices compostos definidos em PhysicalControl.Meta; ?search= usa o
+    índice GIN da busca textual (sem mudar a ordenação).
+    """
+    text = _param(params, 'search')
+    if text:
+        queryset = queryset.matching(text)
+
+    nf_number = _param(params, 'nf_number')
+    if nf_number:
+        queryset = queryset.filter(nf_number=nf_number)
+
+    sender = _param(params, 'sender')
+    if sender:
+        queryset = queryset.filter(sender=sender)
+
+    location = _param(params, 'location')
+    if location and location.isdigit():
+        queryset = queryset.filter(location_id=int(location))
+
+    physical_location = _param(params, 'physical_location')
+    if physical_location:
+        queryset = queryset.filter(physical_location=physical_location)
+
+    # Posição no mapa (valores gravados em maiúsculas por parse_map_coordinates)
+    for field in ('closet', 'shelf', 'slot'):
+        value = _param(params, field)
+        if value:
+            queryset = queryset.filter(**{field: value.upper()})
+
+    responsible = _param(params, 'responsible')
+    if responsible and responsible.isdigit():
+        queryset = queryset.filter(current_responsible_id=int(responsible))
+
+    date_from = _date_param(params, 'receipt_date_from')
+    if date_from:
+        queryset = queryset.filter(receipt_date__gte=date_from)
+
+    date_to = _date_param(params, 'receipt_date_to')
+    if date_to:
+        queryset = queryset.filter(receipt_date__lte=date_to)
+
+    return queryset
+
+
+def filter_movements(queryset, params):
+    """
+    Filtros da consulta global de movimentações (?location=&item=&action=&since=&until=).
+    """
+    location = _param(params, 'location')
+    if location and location.isdigit():
+        queryset = queryset.filter(location_id=int(location))
+
+    item = _param(params, 'item')
+    if item and item.isdigit():
+        queryset = queryset.filter(item_id=int(item))
+
+    action = _param(params, 'action')
+    if action:
+        queryset = queryset.filter(action=action)
+
+    since = _datetime_param(params, 'since')
+    if since:
+        queryset = queryset.filter(timestamp__gte=since)
+
+    until = _datetime_param(params, 'until', end_of_day=True)
+    if until:
+        queryset = queryset.filter(timestamp__lte=until)
+
+    return queryset
+
+
+def filter_processing(queryset, params, user=None):
+    """
+    Filtros da fila de processamento (?status=&nf_number=&sender=&location=&claimed_by=).
+    `status` aceita vários valores separados por vírgula; `claimed_by=me` usa o usuário logado.
+    """
+    status = _param(params, 'status')
+    if status:
+        queryset = queryset.filter(status__in=[value.strip() for value in status.split(',')])
+
+    claimed_by = _param(params, 'claimed_by')
+    if claimed_by == 'me' and user is not None:
+        queryset = queryset.filter(claimed_by=user)
+    elif claimed_by and claimed_by.isdigit():
+        queryset = queryset.filter(claimed_by_id=int(claimed_by))
+
+    nf_number = _param(params, 'nf_number')
+    if nf_number:
+        queryset = queryset.filter(item__nf_number=nf_number)
+
+    sender = _param(params, 'sender')
+    if sender:
+        queryset = queryset.filter(item__sender=sender)
+
+    location = _param(params, 'location')
+    if location and location.isdigit():
+        queryset = queryset.filter(item__location_id=int(location))
+
+    return queryset
+
+
+def filter_changes(queryset, params, field='updated_at'):
+    """
+    Feed incremental (?since=<data-hora ISO>&since_id=): linhas alteradas depois do
+    cursor, da mais antiga para a mais nova. Devolve None se `since` for inválido.
+    """
+    since = _datetime_param(params, 'since')
+    if since is None:
+        return None
+    since_id = _param(params, 'since_id')
+    since_id = int(since_id) if since_id and since_id.isdigit() else 0
+    return queryset.filter(
+        Q(**{f'{field}__gt': since}) | Q(**{field: since, 'id__gt': since_id})
+    ).order_by(field, 'id')
@@ -0,0 +1,131 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+PHOTO_FIELDS = ('photo_top', 'photo_front', 'photo_side', 'photo_iso')
+
+# Nome da versão -> maior lado em pixels
+RENDITIONS = {
+    'thumb': 320,
+    'medium': 1280,
+}
+
+RENDITION_QUALITY = 80
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PHOTO_RENDITION_WORKERS', 2),
+            thread_name_prefix='photo-renditions',
+        )
+    return _executor
+
+
+def _output_format():
+    # WebP quando o Pillow foi compilado com libwebp; senão JPEG
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def rendition_path(source_name, rendition, extension):
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'renditions', f'{stem}_{rendition}.{extension}')
+
+
+def stale_photo_fields(item):
+    """Fotos cujo arquivo atual ainda não tem versões reduzidas geradas."""
+    renditions = item.photo_renditions or {}
+    stale = []
+    for field in PHOTO_FIELDS:
+        photo = getattr(item, field)
+        if photo and renditions.get(field, {}).get('source') != photo.name:
+            stale.append(field)
+    return stale
+
+
+def build_renditions(source_name):
+    """
+    Abre o original, corrige a orientação pelo EXIF e grava cada versão reduzida
+    sem metadados (o EXIF não é repassado ao salvar).
+    """
+    image_format, extension = _output_format()
+    result = {'source': source_name}
+    with default_storage.open(source_name, 'rb') as source:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'RGBA') or image_format == 'JPEG':
+                image = image.convert('RGB')
+            for rendition, max_side in RENDITIONS.items():
+                resized = image.copy()
+                resized.thumbnail((max_side, max_side), Image.LANCZOS)
+                buffer = BytesIO()
+                resized.save(buffer, format=image_format, quality=RENDITION_QUALITY, optimize=True)
+                path = rendition_path(source_name, rendition, extension)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                result[rendition] = default_storage.save(path, ContentFile(buffer.getvalue()))
+    return result
+
+
+def generate_renditions(item_id):
+    """Gera as versões pendentes de um item e grava só a coluna photo_renditions."""
+    from .models import PhysicalControl
+
+    item = PhysicalControl.objects.filter(pk=item_id).only('photo_renditions', *PHOTO_FIELDS).first()
+    if item is None:
+        return None
+    renditions = dict(item.photo_renditions or {})
+    for field in stale_photo_fields(item):
+        source_name = getattr(item, field).name
+        try:
+            renditions[field] = build_renditions(source_name)
+        except Exception:
+            logger.exception("Falha ao gerar miniaturas de %s (%s)", source_name, field)
+    # Remove entradas de fotos que foram apagadas
+    for field in list(renditions):
+        if not getattr(item, field, None):
+            renditions.pop(field)
+    PhysicalControl.objects.filter(pk=item_id).update(photo_renditions=renditions)
+    return renditions
+
+
+def _run(item_ids):
+    close_old_connections()
+    try:
+        for item_id in item_ids:
+            generate_renditions(item_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(item_ids):
+    """
+    Agenda a geração das miniaturas para depois do commit, em um pool de threads,
+    para que o upload responda assim que os originais estiverem gravados.
+    Com PHOTO_RENDITIONS_ASYNC = False (testes/scripts) roda na própria thread.
+    """
+    item_ids = list(item_ids)
+    if not item_ids:
+        return
+
+    def submit():
+        if getattr(settings, 'PHOTO_RENDITIONS_ASYNC', True):
+            _get_executor().submit(_run, item_ids)
+        else:
+            for item_id in item_ids:
+                generate_renditions(item_id)
+
+    transaction.on_commit(submit)
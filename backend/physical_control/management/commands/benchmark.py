@@ -0,0 +1,249 @@
+import json
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from physical_control.models import Location, PhysicalControl
+
+# Variação (%) acima da qual o --compare marca a métrica como regressão
+DEFAULT_THRESHOLD = 10.0
+
+
+class Endpoint:
+    """Uma chamada medida; `write` roda dentro de uma transação desfeita ao final."""
+
+    def __init__(self, name, method, path, data=None, write=False, format=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.write = write
+        self.format = format
+
+    def call(self, client):
+        data = self.data() if callable(self.data) else self.data
+        request = getattr(client, self.method.lower())
+        extra = {'format': self.format} if self.format else {}
+        if not self.write:
+            return request(self.path, data, **extra)
+        with transaction.atomic():
+            response = request(self.path, data, **extra)
+            transaction.set_rollback(True)
+        return response
+
+
+def _consume(response):
+    # Respostas em streaming só terminam quando o conteúdo é lido
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _jpeg():
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (1600, 1200), 'gray').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede os endpoints principais em processo (sem servidor HTTP) sobre os dados do banco "
+        "configurado: latência p50/p95, queries e pico de memória por requisição. "
+        "Use --json para salvar e --compare para comparar com outra execução (ex.: outro commit)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Execuções medidas por endpoint")
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--user', help="Usuário das requisições (padrão: o primeiro superusuário ou usuário)")
+        parser.add_argument('--only', help="Endpoints separados por vírgula")
+        parser.add_argument('--json', dest='json_path', help="Grava os resultados neste arquivo")
+        parser.add_argument('--compare', help="Resultado anterior (JSON) para comparar")
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        endpoints = self.build_endpoints()
+        if options['only']:
+            wanted = {name.strip() for name in options['only'].split(',')}
+            unknown = wanted - {endpoint.name for endpoint in endpoints}
+            if unknown:
+                raise CommandError(f"Endpoint(s) desconhecido(s): {', '.join(sorted(unknown))}")
+            endpoints = [endpoint for endpoint in endpoints if endpoint.name in wanted]
+
+        client = APIClient()
+        client.force_authenticate(user)
+        media_root = tempfile.mkdtemp()
+        try:
+            # Uploads do create-batch vão para um diretório descartável; miniaturas não são geradas
+            with override_settings(MEDIA_ROOT=media_root, PHOTO_RENDITIONS_ASYNC=True):
+                results = {
+                    endpoint.name: self.measure(client, endpoint, options['repeat'], options['warmup'])
+                    for endpoint in endpoints
+                }
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            'commit': _git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'dataset': {
+                'items': PhysicalControl.objects.count(),
+                'locations': Location.objects.count(),
+                'users': User.objects.count(),
+            },
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as file:
+                json.dump(report, file, indent=2)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.print_comparison(json.load(file), report, options['threshold'])
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"Usuário inexistente: {username}")
+        user = User.objects.order_by('-is_superuser', 'id').first()
+        if user is None:
+            raise CommandError("Nenhum usuário no banco; rode o seed_inventory antes.")
+        return user
+
+    def build_endpoints(self):
+        item = PhysicalControl.objects.order_by('-created_at', '-id').only('id', 'product').first()
+        location = Location.objects.order_by('id').first()
+        if item is None or location is None:
+            raise CommandError("Banco sem itens/locais; rode o seed_inventory antes.")
+        word = item.product.split()[0]
+        pallet = list(PhysicalControl.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:1000])
+        processing = list(PhysicalControl.objects.order_by('-created_at', '-id').values_list('processing', flat=True)[:1000])
+        photo = _jpeg()
+        api = '/api/physical-control'
+
+        def batch():
+            from django.core.files.uploadedfile import SimpleUploadedFile
+
+            data = {'nf_number': 'BENCH', 'receipt_date': '2025-01-10', 'sender': 'Benchmark'}
+            for i in range(5):
+                data[f'items[{i}][product]'] = f'Bench {i}'
+                data[f'items[{i}][location]'] = str(location.id)
+                data[f'items[{i}][physical_location]'] = f'Armario 1-{i}-A'
+                data[f'items[{i}][photo_top]'] = SimpleUploadedFile(f'foto{i}.jpg', photo, 'image/jpeg')
+            return data
+
+        return [
+            Endpoint('items-list', 'GET', f'{api}/items/'),
+            Endpoint('items-list-filtered', 'GET', f'{api}/items/', {'location': location.id}),
+            Endpoint('items-detail', 'GET', f'{api}/items/{item.id}/'),
+            Endpoint('items-history', 'GET', f'{api}/items/{item.id}/history/'),
+            Endpoint('search', 'GET', f'{api}/search/', {'q': word}),
+            Endpoint('processing-list', 'GET', f'{api}/processing/', {'status': 'Pendente'}),
+            Endpoint('stats', 'GET', f'{api}/stats/'),
+            Endpoint('locations-list', 'GET', f'{api}/locations/'),
+            Endpoint('locations-map', 'GET', f'{api}/locations/{location.id}/map/'),
+            Endpoint('users-list', 'GET', f'{api}/users/'),
+            Endpoint('items-create-batch', 'POST', f'{api}/items/create-batch/', batch, write=True, format='multipart'),
+            Endpoint('items-bulk-transfer', 'POST', f'{api}/items/bulk-transfer/',
+                     {'items': pallet, 'location': location.id, 'physical_location': 'Armario 99-1-A'},
+                     write=True, format='json'),
+            Endpoint('processing-bulk-status', 'POST', f'{api}/processing/bulk-status/',
+                     {'ids': processing, 'status': 'Em andamento'}, write=True, format='json'),
+            Endpoint('user-profile', 'GET', '/api/user/me/'),
+            Endpoint('preferences-me', 'GET', '/api/userprefs/me/'),
+            Endpoint('preferences-me-patch', 'PATCH', '/api/userprefs/me/',
+                     {'ops': [{'op': 'set', 'path': ['bench', 'value'], 'value': 1}]}, write=True, format='json'),
+        ]
+
+    def measure(self, client, endpoint, repeat, warmup):
+        for _ in range(warmup):
+            _consume(endpoint.call(client))
+
+        timings, queries, status = [], [], None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = endpoint.call(client)
+                _consume(response)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(ctx.captured_queries))
+            status = response.status_code
+
+        # Memória numa execução à parte: o tracemalloc distorce o tempo
+        tracemalloc.start()
+        try:
+            _consume(endpoint.call(client))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'status': status,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def print_report(self, report):
+        dataset = report['dataset']
+        self.stdout.write(
+            f"commit {report['commit'] or '?'} | {dataset['items']} itens, {dataset['locations']} locais, "
+            f"{dataset['users']} usuários | {report['repeat']} execuções"
+        )
+        self.stdout.write(f"{'endpoint':<22} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'pico KiB':>10}")
+        for name, row in report['results'].items():
+            self.stdout.write(
+                f"{name:<22} {row['status']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['queries']:>8} {row['peak_kib']:>10.1f}"
+            )
+
+    def print_comparison(self, baseline, report, threshold):
+        self.stdout.write(f"\nComparação com {baseline.get('commit') or 'a execução anterior'} (limite {threshold:.0f}%):")
+        regressions = 0
+        for name, row in report['results'].items():
+            old = baseline.get('results', {}).get(name)
+            if old is None:
+                self.stdout.write(f"  {name:<22} (novo)")
+                continue
+            parts, flagged = [], False
+            for metric, label in (('p50_ms', 'p50'), ('queries', 'queries'), ('peak_kib', 'memória')):
+                before, after = old[metric], row[metric]
+                change = ((after - before) / before * 100) if before else (100.0 if after else 0.0)
+                worse = change > threshold
+                flagged |= worse
+                parts.append(f"{label} {before}->{after} ({change:+.0f}%){' !' if worse else ''}")
+            regressions += flagged
+            self.stdout.write(f"  {name:<22} " + '  '.join(parts))
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} endpoint(s) acima do limite."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Nenhuma regressão acima do limite."))
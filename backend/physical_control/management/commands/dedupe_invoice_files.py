@@ -0,0 +1,82 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from physical_control.models import InvoiceDocument, PhysicalControl, get_invoice_upload_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula o SHA-256 dos arquivos de NF ainda sem hash, une documentos com o mesmo "
+        "conteúdo (repontando os itens) e move o arquivo para o caminho endereçado por conteúdo, "
+        "apagando as cópias repetidas do disco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Só relata o que seria feito.")
+
+    def hash_file(self, document):
+        digest = hashlib.sha256()
+        with document.file.open('rb') as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        merged = relocated = missing = 0
+        freed = 0
+        # No --dry-run nada é gravado; guarda os hashes vistos para simular a união
+        seen = set()
+
+        for document in InvoiceDocument.objects.filter(sha256__isnull=True).order_by('id').iterator():
+            storage = document.file.storage
+            old_name = document.file.name
+            if not storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f"Arquivo ausente: {old_name}")
+                continue
+
+            sha256 = self.hash_file(document)
+            size = storage.size(old_name)
+            if dry_run and sha256 in seen:
+                self.stdout.write(f"{old_name} (duplicado)")
+                merged += 1
+                freed += size
+                continue
+            seen.add(sha256)
+            canonical = InvoiceDocument.objects.filter(sha256=sha256).first()
+
+            if canonical:
+                self.stdout.write(f"{old_name} = {canonical.file.name}")
+                merged += 1
+                freed += size
+                if dry_run:
+                    continue
+                with transaction.atomic():
+                    PhysicalControl.objects.filter(invoice=document).update(invoice=canonical)
+                    document.delete()
+                if old_name != canonical.file.name:
+                    storage.delete(old_name)
+                continue
+
+            document.sha256 = sha256
+            document.size = size
+            new_name = get_invoice_upload_path(document, old_name)
+            self.stdout.write(f"{old_name} -> {new_name}")
+            relocated += 1
+            if dry_run:
+                continue
+            if new_name != old_name:
+                with storage.open(old_name, 'rb') as source:
+                    new_name = storage.save(new_name, source)
+            document.file.name = new_name
+            document.save(update_fields=['sha256', 'size', 'file'])
+            if new_name != old_name:
+                storage.delete(old_name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{merged} duplicado(s) removido(s) ({freed / (1024 * 1024):.1f} MB), "
+            f"{relocated} arquivo(s) movido(s), {missing} ausente(s)."
+        ))
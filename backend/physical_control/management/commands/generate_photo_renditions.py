@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from physical_control.images import PHOTO_FIELDS, generate_renditions, stale_photo_fields
+from physical_control.models import PhysicalControl
+
+
+class Command(BaseCommand):
+    help = "Gera miniaturas/versões médias pendentes das fotos dos itens (ou todas com --force)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regera mesmo as versões já existentes.")
+
+    def handle(self, *args, **options):
+        has_photo = Q()
+        for field in PHOTO_FIELDS:
+            has_photo |= ~Q(**{field: ''}) & Q(**{f'{field}__isnull': False})
+        items = PhysicalControl.objects.filter(has_photo).only('photo_renditions', *PHOTO_FIELDS).order_by('id')
+
+        processed = 0
+        for item in items.iterator(chunk_size=500):
+            if options['force']:
+                PhysicalControl.objects.filter(pk=item.pk).update(photo_renditions={})
+            elif not stale_photo_fields(item):
+                continue
+            generate_renditions(item.pk)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} item(ns) processado(s)."))
@@ -0,0 +1,232 @@
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+API = '/api/physical-control'
+
+SCENARIOS = ('list', 'export', 'upload')
+
+
+def percentile(values, pct):
+    """Percentil por posição (nearest-rank) de uma lista já ordenada."""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def parse_mix(value):
+    """'list=4,upload=1' -> {'list': 4, 'upload': 1}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise CommandError(f"Cenário desconhecido: {name} (use {', '.join(SCENARIOS)})")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def make_photo(size_kb):
+    """JPEG de ruído (não comprime) com aproximadamente size_kb."""
+    from PIL import Image
+
+    side = max(16, int((size_kb * 1024 * 1.5) ** 0.5))
+    buffer = BytesIO()
+    Image.effect_noise((side, side), 64).convert('RGB').save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Target:
+    """Uma conexão keep-alive por thread com o servidor avaliado."""
+
+    def __init__(self, base_url, token, timeout):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.netloc, timeout=timeout)
+        self.prefix = url.path.rstrip('/')
+        self.token = token
+
+    def request(self, method, path, body=None, content_type=None, upload_kbps=None):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        try:
+            if upload_kbps and body:
+                self._send_throttled(method, self.prefix + path, body, headers, upload_kbps)
+            else:
+                self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            # Lê o corpo inteiro: a exportação só termina quando o último byte chega
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        return response.status, content
+
+    def _send_throttled(self, method, path, body, headers, upload_kbps):
+        # Simula um cliente em rede lenta (o caso que prende um worker sync)
+        self.connection.putrequest(method, path)
+        for name, value in headers.items():
+            self.connection.putheader(name, value)
+        self.connection.putheader('Content-Length', str(len(body)))
+        self.connection.endheaders()
+        chunk = max(1024, upload_kbps * 1024 // 10)
+        for start in range(0, len(body), chunk):
+            self.connection.send(body[start:start + chunk])
+            time.sleep(0.1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga contra um ou mais servidores em execução (ex.: perfis WSGI e ASGI), "
+        "com listagem, exportação CSV e upload em lote; informa vazão e latências p50/p95/p99. "
+        "O cenário de upload cria itens reais: use um banco de homologação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help="nome=url base, ex.: asgi=http://localhost:8000 (repetível)",
+        )
+        auth = parser.add_mutually_exclusive_group(required=True)
+        auth.add_argument('--token', help="Access token JWT")
+        auth.add_argument('--user', help="Gera o token localmente (requer o mesmo SECRET_KEY do servidor)")
+        parser.add_argument('--location', type=int, help="Local dos itens enviados (padrão: o primeiro)")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=30.0, help="Segundos por alvo")
+        parser.add_argument('--mix', type=parse_mix, default=parse_mix('list=6,export=1,upload=3'))
+        parser.add_argument('--batch-items', type=int, default=3, help="Itens por upload")
+        parser.add_argument('--photo-kb', type=int, default=500, help="Tamanho de cada foto enviada")
+        parser.add_argument('--upload-kbps', type=int, help="Limita a velocidade de envio dos uploads")
+        parser.add_argument('--timeout', type=float, default=120.0)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        targets = []
+        for value in options['target']:
+            name, sep, url = value.partition('=')
+            if not sep or not url.startswith(('http://', 'https://')):
+                raise CommandError(f"Alvo inválido: {value} (use nome=http://host:porta)")
+            targets.append((name, url))
+
+        token = options['token']
+        if not token:
+            try:
+                token = str(AccessToken.for_user(User.objects.get(username=options['user'])))
+            except User.DoesNotExist:
+                raise CommandError(f"Usuário inexistente: {options['user']}")
+
+        photo = make_photo(options['photo_kb']) if 'upload' in options['mix'] else b''
+        summary = []
+        for name, url in targets:
+            results, elapsed = self.run_target(url, token, photo, options)
+            summary.append((name, self.report(name, results, elapsed)))
+
+        if len(summary) > 1:
+            self.stdout.write("\nComparação (todas as requisições):")
+            for name, (throughput, p99) in summary:
+                self.stdout.write(f"  {name:<10} {throughput:8.1f} req/s   p99 {p99 * 1000:8.0f} ms")
+
+    def location_id(self, url, token, options):
+        if options['location']:
+            return options['location']
+        status, content = Target(url, token, options['timeout']).request('GET', f'{API}/locations/')
+        locations = json.loads(content) if status == 200 else []
+        if not locations:
+            raise CommandError(f"Nenhum local disponível em {url} (HTTP {status}); informe --location.")
+        return locations[0]['id']
+
+    def upload_body(self, location, photo, options):
+        fields = {'nf_number': 'LOADTEST', 'receipt_date': time.strftime('%Y-%m-%d'), 'sender': 'Teste de carga'}
+        files = {}
+        for index in range(options['batch_items']):
+            fields[f'items[{index}][product]'] = f'Carga {index}'
+            fields[f'items[{index}][quantity]'] = 1
+            fields[f'items[{index}][location]'] = location
+            files[f'items[{index}][photo_top]'] = (f'foto{index}.jpg', photo, 'image/jpeg')
+        return encode_multipart(fields, files)
+
+    def run_target(self, url, token, photo, options):
+        location = self.location_id(url, token, options) if 'upload' in options['mix'] else None
+        upload = self.upload_body(location, photo, options) if location else None
+        names = list(options['mix'])
+        weights = [options['mix'][name] for name in names]
+        results = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            target = Target(url, token, options['timeout'])
+            local = []
+            while time.monotonic() < deadline:
+                scenario = rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    if scenario == 'list':
+                        status, _ = target.request('GET', f'{API}/items/')
+                    elif scenario == 'export':
+                        status, _ = target.request('GET', f'{API}/items/export/')
+                    else:
+                        status, _ = target.request(
+                            'POST', f'{API}/items/create-batch/', upload[0], upload[1], options['upload_kbps']
+                        )
+                    ok = status < 300
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                local.append((scenario, time.perf_counter() - start, ok))
+            with lock:
+                results.extend(local)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+    def report(self, name, results, elapsed):
+        self.stdout.write(f"\n== {name} ({elapsed:.1f}s) ==")
+        self.stdout.write(f"  {'cenário':<8} {'req':>6} {'erros':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}")
+        groups = {}
+        for scenario, latency, ok in results:
+            groups.setdefault(scenario, []).append((latency, ok))
+        groups['total'] = [(latency, ok) for _, latency, ok in results]
+
+        for scenario, rows in groups.items():
+            latencies = sorted(latency for latency, _ in rows)
+            errors = sum(1 for _, ok in rows if not ok)
+            ms = [percentile(latencies, pct) * 1000 for pct in (50, 95, 99)]
+            self.stdout.write(
+                f"  {scenario:<8} {len(rows):>6} {errors:>6} {len(rows) / elapsed:>8.1f} "
+                f"{ms[0]:>8.0f} {ms[1]:>8.0f} {ms[2]:>8.0f} {(latencies[-1] if latencies else 0) * 1000:>8.0f}"
+            )
+        total = sorted(latency for latency, _ in groups['total'])
+        return len(total) / elapsed, percentile(total, 99)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from physical_control.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Remove os uploads retomáveis abandonados (sem blocos novos há UPLOAD_STAGING_TTL_HOURS)."
+
+    def handle(self, *args, **options):
+        removed = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{removed} upload(s) expirado(s) removido(s)."))
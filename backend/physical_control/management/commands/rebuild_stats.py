@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from physical_control.models import DashboardRollup
+from physical_control.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores do dashboard a partir dos itens e processamentos."
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{DashboardRollup.objects.count()} contador(es) recalculado(s)."))
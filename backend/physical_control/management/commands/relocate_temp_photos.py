@@ -0,0 +1,68 @@
+import os
+from functools import partial
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from physical_control.images import PHOTO_FIELDS, generate_renditions
+from physical_control.models import PhysicalControl, get_photo_upload_path
+
+TEMP_SEGMENT = f'{os.sep}TEMP{os.sep}'
+
+
+class Command(BaseCommand):
+    help = "Move as fotos gravadas em NF_<nf>/TEMP/ para a pasta final de cada item (NF_<nf>/<control_id>/)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Só lista o que seria movido.")
+
+    def handle(self, *args, **options):
+        in_temp = Q()
+        for field in PHOTO_FIELDS:
+            in_temp |= Q(**{f'{field}__contains': TEMP_SEGMENT})
+        items = PhysicalControl.objects.filter(in_temp).only(
+            'control_id', 'nf_number', 'photo_renditions', *PHOTO_FIELDS
+        ).order_by('id')
+
+        moved = 0
+        for item in items.iterator(chunk_size=500):
+            updates, obsolete = {}, []
+            for field_name in PHOTO_FIELDS:
+                photo = getattr(item, field_name)
+                if not photo or TEMP_SEGMENT not in photo.name:
+                    continue
+                target = get_photo_upload_path(item, os.path.basename(photo.name))
+                self.stdout.write(f"{item.control_id}: {photo.name} -> {target}")
+                if options['dry_run']:
+                    continue
+                storage = photo.storage
+                if not storage.exists(photo.name):
+                    self.stderr.write(f"  arquivo ausente, ignorado: {photo.name}")
+                    continue
+                with storage.open(photo.name, 'rb') as source:
+                    updates[field_name] = storage.save(target, source)
+                # O original e as miniaturas antigas só saem depois que a linha aponta para a cópia
+                renditions = (item.photo_renditions or {}).get(field_name, {})
+                obsolete.append(photo.name)
+                obsolete.extend(name for key, name in renditions.items() if key != 'source' and name)
+
+            if updates:
+                try:
+                    with transaction.atomic():
+                        PhysicalControl.objects.filter(pk=item.pk).update(**updates)
+                        transaction.on_commit(partial(_delete_files, default_storage, obsolete))
+                except Exception:
+                    _delete_files(default_storage, updates.values())
+                    raise
+                # As miniaturas apontam para o caminho antigo; regera a partir do novo
+                generate_renditions(item.pk)
+                moved += len(updates)
+
+        self.stdout.write(self.style.SUCCESS(f"{moved} foto(s) movida(s)."))
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
@@ -0,0 +1,260 @@
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from physical_control.images import build_renditions
+from physical_control.models import (
+    ControlIdSequence, ItemProcessing, Location, MovementEvent, PhysicalControl,
+)
+from physical_control.reference import LOCATIONS, USERS, invalidate
+from physical_control.stats import rebuild
+from userprefs.models import UserPreferences
+
+# Marcadores dos dados gerados (usados pelo --clear)
+SEED_LOCATION_PREFIX = 'Seed '
+SEED_USER_PREFIX = 'seed_'
+SEED_PHOTO_DIR = 'physical_control/seed'
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+LOCATION_NAMES = ['Almoxarifado', 'Laboratório', 'Oficina', 'Depósito', 'Sala Técnica', 'Expedição', 'Bancada']
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Davi', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Íris', 'João', 'Lara', 'Marcos']
+LAST_NAMES = ['Silva', 'Souza', 'Oliveira', 'Pereira', 'Costa', 'Rodrigues', 'Almeida', 'Nascimento', 'Lima']
+PRODUCTS = ['Motor elétrico', 'Bomba centrífuga', 'Válvula esfera', 'Rolamento', 'Sensor de pressão',
+            'Inversor de frequência', 'Cabo PP', 'Disjuntor', 'Contator', 'Redutor', 'Acoplamento',
+            'Transmissor de nível', 'Placa controladora', 'Fonte chaveada', 'Termopar', 'Mangueira hidráulica']
+SPECS = ['5cv', '10cv', '1/2"', '3/4"', '24V', '220V', '380V', 'inox', 'aço carbono', 'tipo K', '4-20mA', 'DN50']
+SENDER_WORDS = ['Alfa', 'Beta', 'Sul', 'Norte', 'Metal', 'Tec', 'Indústria', 'Hidráulica', 'Elétrica', 'Automação']
+NOTES = ['Embalagem avariada', 'Conferido com a NF', 'Aguardando laudo', 'Peça de reposição', 'Item devolvido']
+
+# Distribuição dos status de processamento
+STATUS_WEIGHTS = [
+    (ItemProcessing.Status.PENDING, 60),
+    (ItemProcessing.Status.IN_PROGRESS, 15),
+    (ItemProcessing.Status.DONE, 25),
+]
+MONTHS_OF_HISTORY = 24
+
+
+def parse_scale(value):
+    value = value.strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError(f"Escala inválida: {value} (use 10k, 100k, 1m ou um número)")
+
+
+@contextmanager
+def explicit_created_at():
+    """bulk_create com created_at informado (o auto_now_add sobrescreveria com agora)."""
+    field = PhysicalControl._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def make_seed_photo(rng, index):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (1200, 900), tuple(rng.randrange(40, 220) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(1100), rng.randrange(800)
+        draw.rectangle([x, y, x + rng.randrange(20, 300), y + rng.randrange(20, 300)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return ContentFile(buffer.getvalue(), name=f'foto_{index}.jpg')
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos (locais, usuários, preferências, itens, processamentos e "
+        "histórico) em lote para benchmarks. Escalas: 10k, 100k, 1m ou um número de itens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=parse_scale, default=SCALES['10k'], help="Quantidade de itens")
+        parser.add_argument('--locations', type=int, default=20)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--photos', type=int, default=6, help="Fotos distintas reaproveitadas pelos itens")
+        parser.add_argument('--photo-ratio', type=float, default=0.3, help="Fração dos itens com fotos")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help="Remove os dados gerados antes (--scale 0 só remove)")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        if options['clear']:
+            self.clear()
+        if options['scale'] <= 0:
+            return
+
+        users = self.create_users(options['users'])
+        locations = self.create_locations(options['locations'], users)
+        photos = self.create_photos(options['photos']) if options['photo_ratio'] > 0 else []
+        senders = [
+            f"{self.rng.choice(SENDER_WORDS)} {self.rng.choice(SENDER_WORDS)} {i} Ltda" for i in range(200)
+        ]
+
+        created = 0
+        batch_size = options['batch_size']
+        while created < options['scale']:
+            count = min(batch_size, options['scale'] - created)
+            self.create_items(count, locations, users, senders, photos, options['photo_ratio'])
+            created += count
+            self.stdout.write(f"  {created}/{options['scale']} itens")
+
+        # bulk_create não dispara signals: contadores e listas em cache são refeitos aqui
+        rebuild()
+        invalidate(LOCATIONS, USERS)
+        with connection.cursor() as cursor:
+            for model in (PhysicalControl, ItemProcessing, MovementEvent):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} item(ns), {len(locations)} local(is) e {len(users)} usuário(s) gerados."
+        ))
+
+    def clear(self):
+        seed_items = PhysicalControl.objects.filter(location__name__startswith=SEED_LOCATION_PREFIX)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # DELETE direto: o delete() do ORM carregaria cada item para os signals
+            sql, params = seed_items.values('id').query.sql_with_params()
+            for model, column in ((MovementEvent, 'item_id'), (ItemProcessing, 'item_id'), (PhysicalControl, 'id')):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({sql})", params)
+            Location.objects.filter(name__startswith=SEED_LOCATION_PREFIX).delete()
+            User.objects.filter(username__startswith=SEED_USER_PREFIX).delete()
+            rebuild()
+        invalidate(LOCATIONS, USERS)
+        self.stdout.write("Dados gerados anteriormente removidos.")
+
+    def create_users(self, count):
+        start = User.objects.filter(username__startswith=SEED_USER_PREFIX).count()
+        password = make_password('seed')
+        users = User.objects.bulk_create([
+            User(
+                username=f'{SEED_USER_PREFIX}{start + i}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                email=f'{SEED_USER_PREFIX}{start + i}@example.com',
+                password=password,
+            )
+            for i in range(count)
+        ])
+        UserPreferences.objects.bulk_create([
+            UserPreferences(user=user, data={
+                'theme': self.rng.choice(['light', 'dark']),
+                'lang': 'pt-br',
+                'tables': {'items': {
+                    'columns': self.rng.sample(['control_id', 'product', 'sender', 'nf_number', 'location'], 4),
+                    'page_size': self.rng.choice([20, 50, 100]),
+                }},
+            })
+            for user in users
+        ])
+        return users
+
+    def create_locations(self, count, users):
+        start = Location.objects.filter(name__startswith=SEED_LOCATION_PREFIX).count()
+        locations = Location.objects.bulk_create([
+            Location(name=f'{SEED_LOCATION_PREFIX}{LOCATION_NAMES[i % len(LOCATION_NAMES)]} {start + i}')
+            for i in range(count)
+        ])
+        Through = Location.responsibles.through
+        Through.objects.bulk_create([
+            Through(location_id=location.id, user_id=user.id)
+            for location in locations
+            for user in self.rng.sample(users, min(len(users), self.rng.randint(1, 3)))
+        ])
+        return locations
+
+    def create_photos(self, count):
+        photos = []
+        for index in range(count):
+            name = default_storage.save(f'{SEED_PHOTO_DIR}/foto_{index}.jpg', make_seed_photo(self.rng, index))
+            photos.append((name, build_renditions(name)))
+        return photos
+
+    def random_receipt(self):
+        today = timezone.localdate()
+        receipt = today - timedelta(days=self.rng.randrange(MONTHS_OF_HISTORY * 30))
+        created_at = timezone.make_aware(datetime.combine(receipt, time(self.rng.randrange(7, 19), self.rng.randrange(60))))
+        return receipt, created_at
+
+    def physical_location(self):
+        if self.rng.random() < 0.1:
+            # Fora do padrão do mapa
+            return self.rng.choice(['Bancada de testes', 'Chão, ao lado da porta', ''])
+        return (f"Armario {self.rng.randint(1, 12)}-{self.rng.randint(1, 6)}-"
+                f"{self.rng.choice('ABCDEFGH')}{self.rng.choice(['', '1', '2'])}")
+
+    def create_items(self, count, locations, users, senders, photos, photo_ratio):
+        rng = self.rng
+        items = []
+        while len(items) < count:
+            # Uma NF traz de 1 a 8 itens com os mesmos dados de nota
+            receipt, created_at = self.random_receipt()
+            nf = {
+                'nf_number': str(rng.randrange(1000, 999999)),
+                'receipt_date': receipt,
+                'sender': rng.choice(senders),
+                'nf_notes': rng.choice(NOTES) if rng.random() < 0.2 else None,
+                'current_responsible': rng.choice(users),
+                'created_at': created_at,
+            }
+            for _ in range(min(rng.randint(1, 8), count - len(items))):
+                item = PhysicalControl(
+                    product=f"{rng.choice(PRODUCTS)} {rng.choice(SPECS)}",
+                    quantity=rng.randint(1, 50),
+                    location=rng.choice(locations),
+                    physical_location=self.physical_location(),
+                    item_notes=rng.choice(NOTES) if rng.random() < 0.15 else None,
+                    **nf,
+                )
+                item.set_map_coordinates()
+                if photos and rng.random() < photo_ratio:
+                    for field in ('photo_top', 'photo_front'):
+                        name, renditions = rng.choice(photos)
+                        setattr(item, field, name)
+                        item.photo_renditions[field] = renditions
+                items.append(item)
+
+        # control_id do mês de recebimento, reservados no mesmo contador da API
+        by_prefix = defaultdict(list)
+        for item in items:
+            by_prefix[f"DUR-{item.receipt_date:%m%y}"].append(item)
+        with transaction.atomic(), explicit_created_at():
+            for prefix, group in by_prefix.items():
+                for item, seq in zip(group, ControlIdSequence.reserve(prefix, len(group))):
+                    item.control_id = f"{prefix}-{str(seq).zfill(4)}"
+            PhysicalControl.objects.bulk_create(items)
+            ItemProcessing.objects.bulk_create([self.build_processing(item, users) for item in items])
+            MovementEvent.objects.bulk_create([self.build_receipt(item) for item in items])
+
+    def build_processing(self, item, users):
+        status = self.rng.choices([s for s, _ in STATUS_WEIGHTS], [w for _, w in STATUS_WEIGHTS])[0]
+        processing = ItemProcessing(item=item, status=status)
+        if status == ItemProcessing.Status.IN_PROGRESS:
+            processing.claimed_by = self.rng.choice(users)
+            processing.claimed_at = item.created_at + timedelta(days=self.rng.randint(0, 10))
+        return processing
+
+    def build_receipt(self, item):
+        event = item.build_movement_event(MovementEvent.Action.INITIAL_RECEIPT)
+        event.timestamp = item.created_at
+        return event
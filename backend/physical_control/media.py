@@ -0,0 +1,97 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'MEDIA_WRITE_WORKERS', 5),
+            thread_name_prefix='media-writes',
+        )
+    return _executor
+
+
+def submit(fn, *args):
+    """Executa uma gravação avulsa no mesmo pool (ex.: InvoiceDocument.store_upload)."""
+    return _get_executor().submit(_run_closing_connection, fn, *args)
+
+
+def _run_closing_connection(fn, *args):
+    # A thread do pool abre a própria conexão; fecha ao terminar para não vazar
+    try:
+        return fn(*args)
+    finally:
+        connection.close()
+
+
+def _store(instance, field_name, upload):
+    field = instance._meta.get_field(field_name)
+    name = field.generate_filename(instance, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length)
+
+
+def store_uploads(jobs):
+    """
+    Grava os arquivos enviados direto no caminho final, em paralelo.
+    `jobs` é uma lista de (instância, campo, upload); a instância já precisa ter
+    control_id/nf_number para o upload_to montar o caminho. Devolve os nomes
+    gravados, na mesma ordem. Se algum falhar, apaga os que já foram gravados.
+    """
+    if not jobs:
+        return []
+    futures = [_get_executor().submit(_store, *job) for job in jobs]
+    names, error = [], None
+    for future in futures:
+        try:
+            names.append(future.result())
+        except Exception as exc:
+            names.append(None)
+            error = error or exc
+    if error:
+        delete_stored(jobs, names)
+        raise error
+    return names
+
+
+def delete_stored(jobs, names):
+    for (instance, field_name, _), name in zip(jobs, names):
+        if not name:
+            continue
+        try:
+            instance._meta.get_field(field_name).storage.delete(name)
+        except Exception:
+            logger.exception("Falha ao remover %s após erro no lote", name)
+
+
+# --- LEITURA ---
+
+def owning_items(name):
+    """Itens donos de um arquivo de MEDIA: foto, miniatura de foto ou PDF da NF."""
+    from .images import PHOTO_FIELDS
+    from .models import PhysicalControl
+
+    match = Q(invoice__file=name)
+    for field in PHOTO_FIELDS:
+        match |= Q(**{field: name})
+    directory, renditions, _ = name.rpartition('/renditions/')
+    if not renditions:
+        return list(PhysicalControl.objects.filter(match).distinct())
+
+    # As miniaturas ficam em <pasta da foto>/renditions/; confirma pelo photo_renditions
+    in_directory = Q()
+    for field in PHOTO_FIELDS:
+        in_directory |= Q(**{f'{field}__startswith': f'{directory}/'})
+    return [
+        item for item in PhysicalControl.objects.filter(in_directory)
+        if any(name in versions.values() for versions in (item.photo_renditions or {}).values())
+    ]
+
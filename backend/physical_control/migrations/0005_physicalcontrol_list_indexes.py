@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0004_alter_itemprocessing_observation_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['-created_at', '-id'], name='pc_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['nf_number', '-created_at', '-id'], name='pc_nf_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='pc_sender_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['location', '-created_at', '-id'], name='pc_location_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['current_responsible', '-created_at', '-id'], name='pc_resp_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['location', 'physical_location'], name='pc_location_physical_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['receipt_date'], name='pc_receipt_date_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    # Inicializa o contador de cada mês com o maior número já emitido
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    ControlIdSequence = apps.get_model('physical_control', 'ControlIdSequence')
+    last_values = {}
+    for control_id in PhysicalControl.objects.values_list('control_id', flat=True).iterator():
+        prefix, _, seq = control_id.rpartition('-')
+        if not prefix or not seq.isdigit():
+            continue
+        last_values[prefix] = max(last_values.get(prefix, 0), int(seq))
+    ControlIdSequence.objects.bulk_create([
+        ControlIdSequence(prefix=prefix, last_value=value) for prefix, value in last_values.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0005_physicalcontrol_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ControlIdSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:46
+
+from datetime import datetime, timezone as dt_timezone
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+HISTORY_DATE_FORMAT = '%d/%m/%Y %H:%M'
+ACTIONS = {'Initial Receipt', 'Location Transfer'}
+
+
+def _friendly_name(user):
+    full_name = f"{user.first_name} {user.last_name}".strip()
+    return full_name or user.username
+
+
+def _user_index(User):
+    """
+    {texto gravado em 'responsible': id}. Vale o username ou o id; o nome amigável só
+    quando um único usuário o tem (nomes repetidos ficam sem responsável).
+    """
+    index, by_name, ambiguous = {}, {}, set()
+    for user in User.objects.only('username', 'first_name', 'last_name'):
+        name = _friendly_name(user)
+        if name in by_name:
+            ambiguous.add(name)
+        by_name[name] = user.id
+    index.update((name, user_id) for name, user_id in by_name.items() if name not in ambiguous)
+    for user_id, username in User.objects.values_list('id', 'username'):
+        index[str(user_id)] = user_id
+        index[username] = user_id
+    return index
+
+
+def backfill_movement_events(apps, schema_editor):
+    """
+    Converte o JSON movement_history em linhas de MovementEvent. As datas foram
+    gravadas com timezone.now().strftime() (USE_TZ=True), ou seja, em UTC.
+    """
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    Location = apps.get_model('physical_control', 'Location')
+    MovementEvent = apps.get_model('physical_control', 'MovementEvent')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    locations = dict(Location.objects.values_list('name', 'id'))
+    users = _user_index(User)
+
+    batch = []
+    items = PhysicalControl.objects.values_list('id', 'movement_history', 'created_at')
+    for item_id, history, created_at in items.iterator(chunk_size=2000):
+        for entry in history or []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                timestamp = datetime.strptime(entry.get('date', ''), HISTORY_DATE_FORMAT).replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                timestamp = created_at
+            location_name, _, physical = (entry.get('location') or '').rpartition(' (')
+            physical = physical.rstrip(')').strip()
+            action = entry.get('action')
+            batch.append(MovementEvent(
+                item_id=item_id,
+                timestamp=timestamp,
+                action=action if action in ACTIONS else 'Location Transfer',
+                location_id=locations.get(location_name),
+                physical_location=None if physical in ('', 'N/I') else physical,
+                responsible_id=users.get(entry.get('responsible')),
+            ))
+        if len(batch) >= 5000:
+            MovementEvent.objects.bulk_create(batch)
+            batch = []
+    MovementEvent.objects.bulk_create(batch)
+
+
+def rebuild_movement_history(apps, schema_editor):
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    MovementEvent = apps.get_model('physical_control', 'MovementEvent')
+
+    histories = {}
+    events = MovementEvent.objects.select_related('location', 'responsible').order_by('item_id', 'timestamp', 'id')
+    for event in events.iterator(chunk_size=2000):
+        location_name = event.location.name if event.location else 'N/I'
+        histories.setdefault(event.item_id, []).append({
+            'date': event.timestamp.astimezone(dt_timezone.utc).strftime(HISTORY_DATE_FORMAT),
+            'location': f"{location_name} ({event.physical_location or 'N/I'})",
+            'responsible': _friendly_name(event.responsible) if event.responsible else 'N/I',
+            'action': event.action,
+        })
+    for item_id, history in histories.items():
+        PhysicalControl.objects.filter(pk=item_id).update(movement_history=history)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0006_controlidsequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovementEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(choices=[('Initial Receipt', 'Entrada inicial'), ('Location Transfer', 'Transferência de local')], max_length=30)),
+                ('physical_location', models.CharField(blank=True, max_length=255, null=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='physical_control.physicalcontrol')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='physical_control.location')),
+                ('responsible', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['timestamp', 'id'],
+                'indexes': [models.Index(fields=['item', 'timestamp'], name='mv_item_ts_idx'), models.Index(fields=['location', '-timestamp', '-id'], name='mv_location_ts_idx'), models.Index(fields=['-timestamp', '-id'], name='mv_ts_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_movement_events, rebuild_movement_history),
+        migrations.RemoveField(
+            model_name='physicalcontrol',
+            name='movement_history',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0007_movementevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='physicalcontrol',
+            name='photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:51
+
+import os
+
+import django.db.models.deletion
+import physical_control.models
+from django.db import migrations, models
+
+
+def link_invoice_documents(apps, schema_editor):
+    """
+    Cria um InvoiceDocument por caminho de nf_file já existente, sem ler nem mover
+    arquivos (sha256 fica vazio). O comando dedupe_invoice_files calcula os hashes,
+    une os documentos repetidos e apaga as cópias do disco.
+    """
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    InvoiceDocument = apps.get_model('physical_control', 'InvoiceDocument')
+
+    paths = (
+        PhysicalControl.objects.exclude(nf_file__isnull=True).exclude(nf_file='')
+        .values_list('nf_file', flat=True).distinct()
+    )
+    for path in paths.iterator():
+        document = InvoiceDocument.objects.create(file=path, original_name=os.path.basename(path)[:255])
+        PhysicalControl.objects.filter(nf_file=path).update(invoice=document)
+
+
+def restore_nf_files(apps, schema_editor):
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    InvoiceDocument = apps.get_model('physical_control', 'InvoiceDocument')
+    for document in InvoiceDocument.objects.iterator():
+        PhysicalControl.objects.filter(invoice=document).update(nf_file=document.file.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0008_physicalcontrol_photo_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('file', models.FileField(max_length=255, upload_to=physical_control.models.get_invoice_upload_path)),
+                ('original_name', models.CharField(blank=True, max_length=255)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='physicalcontrol',
+            name='invoice',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='items', to='physical_control.invoicedocument'),
+        ),
+        migrations.RunPython(link_invoice_documents, restore_nf_files),
+        migrations.RemoveField(
+            model_name='physicalcontrol',
+            name='nf_file',
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:58
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def parse_map_coordinates(physical_location):
+    # Cópia da regra de physical_control.models na época desta migração (não importar
+    # código da app: a migração precisa continuar igual se a regra mudar)
+    if not physical_location:
+        return '', '', ''
+    text = unicodedata.normalize('NFKD', physical_location).encode('ascii', 'ignore').decode('ascii')
+    parts = [part for part in re.split(r'[^A-Za-z0-9]+', text.upper()) if part]
+    if len(parts) >= 4 and 'ARMARIO' in parts[0]:
+        parts = parts[1:]
+    elif len(parts) < 3:
+        return '', '', ''
+    closet, shelf, slot = parts[:3]
+    if max(len(closet), len(shelf), len(slot)) > 20:
+        return '', '', ''
+    return closet, shelf, slot
+
+
+def backfill_map_coordinates(apps, schema_editor):
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    batch = []
+    items = PhysicalControl.objects.exclude(physical_location__isnull=True).exclude(physical_location='')
+    for item_id, physical_location in items.values_list('id', 'physical_location').iterator(chunk_size=2000):
+        closet, shelf, slot = parse_map_coordinates(physical_location)
+        if closet:
+            batch.append(PhysicalControl(id=item_id, closet=closet, shelf=shelf, slot=slot))
+        if len(batch) >= 2000:
+            PhysicalControl.objects.bulk_update(batch, ['closet', 'shelf', 'slot'])
+            batch = []
+    PhysicalControl.objects.bulk_update(batch, ['closet', 'shelf', 'slot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0009_invoicedocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='physicalcontrol',
+            name='closet',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='physicalcontrol',
+            name='shelf',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='physicalcontrol',
+            name='slot',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_map_coordinates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=models.Index(fields=['location', 'closet', 'shelf', 'slot'], name='pc_location_map_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:01
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+TRIGRAM_INDEXES = {
+    'pc_product_trgm_idx': 'product',
+    'pc_sender_trgm_idx': 'sender',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm faz parte do contrib; em servidores sem ele a busca usa só o tsvector
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, column in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "physical_control_physicalcontrol" '
+                f'USING gin ("{column}" gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name in TRIGRAM_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0010_map_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='physicalcontrol',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector(django.db.models.functions.text.Replace('control_id', models.Value('-'), models.Value(' ')), 'nf_number', config='portuguese', weight='A'), '||', django.contrib.postgres.search.SearchVector('product', config='portuguese', weight='B'), django.contrib.postgres.search.SearchConfig('portuguese')), '||', django.contrib.postgres.search.SearchVector('sender', config='portuguese', weight='C'), django.contrib.postgres.search.SearchConfig('portuguese')), '||', django.contrib.postgres.search.SearchVector('item_notes', 'nf_notes', config='portuguese', weight='D'), django.contrib.postgres.search.SearchConfig('portuguese')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='physicalcontrol',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pc_search_vector_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
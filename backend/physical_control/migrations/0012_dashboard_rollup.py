@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+# Cópia de physical_control.stats.REBUILD_SQL na época desta migração
+REBUILD_SQL = [
+    "DELETE FROM physical_control_dashboardrollup",
+    """
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT 'items_by_location', location_id::text, COUNT(*)
+    FROM physical_control_physicalcontrol GROUP BY location_id
+    """,
+    """
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT 'items_by_month', to_char(receipt_date, 'YYYY-MM'), COUNT(*)
+    FROM physical_control_physicalcontrol WHERE receipt_date IS NOT NULL
+    GROUP BY to_char(receipt_date, 'YYYY-MM')
+    """,
+    """
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT 'items_by_sender', sender, COUNT(*)
+    FROM physical_control_physicalcontrol WHERE sender <> ''
+    GROUP BY sender
+    """,
+    """
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT 'processing_by_status', status, COUNT(*)
+    FROM physical_control_itemprocessing GROUP BY status
+    """,
+]
+
+
+def seed_rollups(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0011_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=40)),
+                ('bucket', models.CharField(max_length=255)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', '-value'], name='rollup_metric_value_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardrollup',
+            constraint=models.UniqueConstraint(fields=('metric', 'bucket'), name='rollup_metric_bucket_uniq'),
+        ),
+        migrations.RunPython(seed_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0012_dashboard_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemprocessing',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='itemprocessing',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_processing', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='itemprocessing',
+            name='status',
+            field=models.CharField(choices=[('Pendente', 'Pendente'), ('Em andamento', 'Em andamento'), ('Concluído', 'Concluído')], default='Pendente', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='itemprocessing',
+            index=models.Index(fields=['status', '-updated_at', '-id'], name='ip_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemprocessing',
+            index=models.Index(fields=['updated_at', 'id'], name='ip_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemprocessing',
+            index=models.Index(condition=models.Q(('status', 'Pendente')), fields=['id'], name='ip_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:09
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def restore_processing_copies(apps, schema_editor):
+    PhysicalControl = apps.get_model('physical_control', 'PhysicalControl')
+    ItemProcessing = apps.get_model('physical_control', 'ItemProcessing')
+    item = PhysicalControl.objects.filter(pk=OuterRef('item_id'))
+    ItemProcessing.objects.update(
+        control_id=Subquery(item.values('control_id')[:1]),
+        nf_number=Subquery(item.values('nf_number')[:1]),
+        sender=Subquery(item.values('sender')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('physical_control', '0013_processing_queue'),
+    ]
+
+    operations = [
+        # Anuláveis antes de remover: na volta as colunas são recriadas vazias,
+        # preenchidas a partir do item e só então voltam a ser NOT NULL
+        migrations.AlterField(
+            model_name='itemprocessing',
+            name='control_id',
+            field=models.CharField(max_length=25, null=True),
+        ),
+        migrations.AlterField(
+            model_name='itemprocessing',
+            name='nf_number',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='itemprocessing',
+            name='sender',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_processing_copies),
+        migrations.RemoveField(
+            model_name='itemprocessing',
+            name='control_id',
+        ),
+        migrations.RemoveField(
+            model_name='itemprocessing',
+            name='nf_number',
+        ),
+        migrations.RemoveField(
+            model_name='itemprocessing',
+            name='sender',
+        ),
+    ]
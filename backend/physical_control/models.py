@@ -1,8 +1,20 @@
+import copy
+import hashlib
 import os
-from django.db import models
+import uuid
+from contextlib import nullcontext
+import re
+import unicodedata
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField, TrigramWordSimilarity,
+)
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Greatest, Replace
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 # --- FUNÇÕES DE AUXÍLIO (Devem vir antes das Classes) ---
@@ -14,14 +26,215 @@ def get_nf_upload_path(instance, filename):
     safe_nf = sanitize_path(instance.nf_number)
     return os.path.join('physical_control', f'NF_{safe_nf}', filename)
 
+def get_invoice_upload_path(instance, filename):
+    # Endereçado por conteúdo: o mesmo PDF sempre cai no mesmo caminho
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join('physical_control', 'invoices', instance.sha256[:2], f'{instance.sha256}{ext}')
+
 def get_photo_upload_path(instance, filename):
     safe_nf = sanitize_path(instance.nf_number)
     # Se o control_id ainda não existir (na criação), gera um temporário ou usa o prefixo
     cid = sanitize_path(instance.control_id) if instance.control_id else "TEMP"
     return os.path.join('physical_control', f'NF_{safe_nf}', cid, filename)
 
+def _comparable(value):
+    # Cópia estável de um valor de campo: nome do arquivo e JSON copiado (mutações no lugar)
+    if isinstance(value, FieldFile):
+        return value.name
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+def parse_map_coordinates(physical_location):
+    """
+    Converte "Armario 1-2-B" (ou "1-2-B") em ('1', '2', 'B'), na mesma regra do mapa
+    do frontend. Devolve ('', '', '') quando a posição não segue o padrão.
+    """
+    if not physical_location:
+        return '', '', ''
+    text = unicodedata.normalize('NFKD', physical_location).encode('ascii', 'ignore').decode('ascii')
+    parts = [part for part in re.split(r'[^A-Za-z0-9]+', text.upper()) if part]
+    if len(parts) >= 4 and 'ARMARIO' in parts[0]:
+        parts = parts[1:]
+    elif len(parts) < 3:
+        return '', '', ''
+    closet, shelf, slot = parts[:3]
+    if max(len(closet), len(shelf), len(slot)) > 20:
+        return '', '', ''
+    return closet, shelf, slot
+
+# --- BUSCA ---
+
+SEARCH_CONFIG = 'portuguese'
+
+# Peso da similaridade por trigramas (0..1) somada ao ts_rank
+SEARCH_TRIGRAM_WEIGHT = 0.3
+
+_trigram_available = {}
+
+def trigram_available():
+    """pg_trgm é do contrib do Postgres; sem ele a busca usa só o tsvector."""
+    if connection.alias not in _trigram_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[connection.alias] = cursor.fetchone() is not None
+    return _trigram_available[connection.alias]
+
+def build_search_query(text):
+    """
+    Cada palavra vira um prefixo ("parafu" encontra "parafuso") e todas precisam
+    aparecer. Devolve None se não sobrar nenhum termo.
+    """
+    terms = re.findall(r'\w+', text or '')
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), config=SEARCH_CONFIG, search_type='raw')
+
+# --- QUERYSETS ---
+
+# Colunas do responsável usadas pelos serializers (nome amigável)
+RESPONSIBLE_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+class PhysicalControlQuerySet(models.QuerySet):
+    def for_api(self):
+        """
+        Carrega local, responsável e processamento no mesmo SELECT, trazendo do
+        usuário apenas as colunas que o PhysicalControlSerializer lê. O histórico
+        de movimentações vem num único SELECT adicional (prefetch).
+        """
+        own_fields = [f.attname for f in self.model._meta.concrete_fields if f.name != 'search_vector']
+        return self.select_related('location', 'current_responsible', 'processing', 'invoice').only(
+            *own_fields,
+            'location__name',
+            'invoice__file',
+            *[f'current_responsible__{f}' for f in RESPONSIBLE_FIELDS],
+            'processing__id',
+        ).prefetch_related(
+            models.Prefetch('movements', queryset=MovementEvent.objects.for_history())
+        )
+
+    def search(self, text):
+        """
+        Busca textual ranqueada: tsvector armazenado (índice GIN) para palavras e
+        prefixos, mais pg_trgm em produto/remetente para tolerar erros de digitação.
+        """
+        query = build_search_query(text)
+        if query is None:
+            return self.none()
+        rank = SearchRank(models.F('search_vector'), query)
+        if trigram_available():
+            text = text.strip()
+            rank = rank + Greatest(
+                TrigramWordSimilarity(text, 'product'),
+                TrigramWordSimilarity(text, 'sender'),
+            ) * SEARCH_TRIGRAM_WEIGHT
+        return self.matching(text).annotate(rank=rank).order_by('-rank', '-id')
+
+    def matching(self, text):
+        """Mesmo critério de search(), sem rank nem ordenação (ex.: listagem paginada por cursor)."""
+        query = build_search_query(text)
+        if query is None:
+            return self.none()
+        condition = models.Q(search_vector=query)
+        if trigram_available():
+            text = text.strip()
+            condition |= models.Q(product__trigram_word_similar=text) | models.Q(sender__trigram_word_similar=text)
+        return self.filter(condition)
+
+class MovementEventQuerySet(models.QuerySet):
+    def for_history(self):
+        return self.select_related('location', 'responsible').only(
+            'id', 'item', 'timestamp', 'action', 'physical_location',
+            'location__name', *[f'responsible__{f}' for f in RESPONSIBLE_FIELDS],
+        )
+
+class ItemProcessingQuerySet(models.QuerySet):
+    def for_api(self):
+        """
+        Projeção usada pelo ItemProcessingSerializer (item, local e responsável via JOIN).
+        As colunas do item saem do próprio serializer, então um campo novo lá não vira
+        uma query extra por linha.
+        """
+        from .serializers import ItemProcessingSerializer
+
+        related = ('item__location', 'item__current_responsible', 'item__invoice')
+        return self.select_related(*related).only(
+            *[f.attname for f in self.model._meta.concrete_fields],
+            *related,
+            *ItemProcessingSerializer.item_paths(),
+        )
+
 # --- MODELOS ---
 
+class ControlIdSequence(models.Model):
+    """
+    Contador por mês (prefixo DUR-MMYY) usado para gerar os control_id.
+    A reserva é um único UPSERT ... RETURNING: o Postgres trava a linha do mês
+    até o fim da transação, então workers concorrentes nunca recebem o mesmo número.
+    """
+    prefix = models.CharField(max_length=20, primary_key=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, prefix, count=1):
+        """Reserva `count` números consecutivos e devolve o range reservado."""
+        if count < 1:
+            return range(0)
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (prefix, last_value) VALUES (%s, %s)
+                ON CONFLICT (prefix) DO UPDATE SET last_value = {table}.last_value + EXCLUDED.last_value
+                RETURNING last_value
+                """,
+                [prefix, count],
+            )
+            last_value = cursor.fetchone()[0]
+        return range(last_value - count + 1, last_value + 1)
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
+
+class DashboardRollup(models.Model):
+    """
+    Contadores pré-agregados do dashboard (métrica, chave) -> valor, atualizados
+    incrementalmente pelos signals de PhysicalControl/ItemProcessing (ver stats.py).
+    """
+    metric = models.CharField(max_length=40)
+    bucket = models.CharField(max_length=255)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'bucket'], name='rollup_metric_bucket_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['metric', '-value'], name='rollup_metric_value_idx'),
+        ]
+
+    @classmethod
+    def add(cls, deltas):
+        """Soma {(metric, bucket): delta} num único UPSERT."""
+        # Ordenado para que transações concorrentes travem as linhas na mesma ordem
+        rows = sorted((key, delta) for key, delta in deltas.items() if delta)
+        if not rows:
+            return
+        table = connection.ops.quote_name(cls._meta.db_table)
+        values = ', '.join(['(%s, %s, %s)'] * len(rows))
+        params = [part for (metric, bucket), delta in rows for part in (metric, bucket, delta)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (metric, bucket, value) VALUES {values}
+                ON CONFLICT (metric, bucket) DO UPDATE SET value = {table}.value + EXCLUDED.value
+                """,
+                params,
+            )
+
+    def __str__(self):
+        return f"{self.metric}[{self.bucket}] = {self.value}"
+
 class Location(models.Model):
     name = models.CharField(max_length=100, unique=True)
     responsibles = models.ManyToManyField(User, related_name='managed_locations')
@@ -29,6 +242,63 @@ class Location(models.Model):
     def __str__(self):
         return self.name
 
+class InvoiceDocument(models.Model):
+    """
+    Arquivo da NF guardado uma única vez, identificado pelo SHA-256 do conteúdo.
+    Todos os itens da nota (e reenvios do mesmo PDF) apontam para o mesmo registro.
+    """
+    sha256 = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    file = models.FileField(upload_to=get_invoice_upload_path, max_length=255)
+    original_name = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def hash_upload(upload):
+        digest = hashlib.sha256()
+        for chunk in upload.chunks():
+            digest.update(chunk)
+        upload.seek(0)
+        return digest.hexdigest()
+
+    @classmethod
+    def from_upload(cls, upload):
+        """Devolve o documento com o mesmo conteúdo ou grava um novo."""
+        return cls.store_upload(upload).save_stored()
+
+    @classmethod
+    def store_upload(cls, upload):
+        """
+        Documento já existente com o mesmo conteúdo ou um novo com o arquivo gravado e a
+        linha ainda por criar (save_stored), para a gravação poder correr fora da transação.
+        """
+        sha256 = cls.hash_upload(upload)
+        existing = cls.objects.filter(sha256=sha256).first()
+        if existing:
+            return existing
+        document = cls(sha256=sha256, original_name=os.path.basename(upload.name)[:255], size=upload.size or 0)
+        document.file.save(upload.name, upload, save=False)
+        return document
+
+    def save_stored(self):
+        """Cria a linha de um documento de store_upload e devolve o registro que vale."""
+        if self.pk:
+            return self
+        try:
+            with transaction.atomic():
+                self.save()
+        except IntegrityError:
+            # Outro worker gravou o mesmo conteúdo ao mesmo tempo: descarta a cópia
+            self.file.delete(save=False)
+            return type(self).objects.get(sha256=self.sha256)
+        return self
+
+    def __str__(self):
+        return self.original_name or self.file.name
+
+# Colunas que alimentam os contadores do dashboard (stats.py)
+ITEM_STATS_FIELDS = ('location_id', 'receipt_date', 'sender')
+
 class PhysicalControl(models.Model):
     control_id = models.CharField(max_length=25, unique=True, editable=False)
     
@@ -37,13 +307,17 @@ class PhysicalControl(models.Model):
     receipt_date = models.DateField(default=timezone.now)
     sender = models.CharField(max_length=255)
     nf_notes = models.TextField(blank=True, null=True)
-    nf_file = models.FileField(upload_to=get_nf_upload_path, blank=True, null=True)
+    invoice = models.ForeignKey(InvoiceDocument, on_delete=models.PROTECT, blank=True, null=True, related_name='items')
     
     # Item Data
     product = models.CharField(max_length=255)
     quantity = models.IntegerField()
     location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='items')
     physical_location = models.CharField(max_length=255, blank=True, null=True) # Ex: Armario 1-1-A
+    # Coordenadas do mapa extraídas de physical_location na gravação (vazias se fora do padrão)
+    closet = models.CharField(max_length=20, blank=True, default='', editable=False)
+    shelf = models.CharField(max_length=20, blank=True, default='', editable=False)
+    slot = models.CharField(max_length=20, blank=True, default='', editable=False)
     item_notes = models.TextField(blank=True, null=True)
     
     # Photos
@@ -51,90 +325,373 @@ class PhysicalControl(models.Model):
     photo_front = models.ImageField(upload_to=get_photo_upload_path, blank=True, null=True)
     photo_side = models.ImageField(upload_to=get_photo_upload_path, blank=True, null=True)
     photo_iso = models.ImageField(upload_to=get_photo_upload_path, blank=True, null=True)
+    # Versões reduzidas geradas em segundo plano (images.py): {campo: {source, thumb, medium}}
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     
     # Control Fields
     current_responsible = models.ForeignKey(User, on_delete=models.PROTECT)
-    movement_history = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Vetor de busca mantido pelo próprio Postgres (coluna gerada), inclusive em bulk_create
+    search_vector = models.GeneratedField(
+        expression=(
+            # "DUR-0125-0001" viraria "dur", "-0125", "-0001" (números com sinal) sem o Replace
+            SearchVector(
+                Replace('control_id', models.Value('-'), models.Value(' ')), 'nf_number',
+                weight='A', config=SEARCH_CONFIG,
+            )
+            + SearchVector('product', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('sender', weight='C', config=SEARCH_CONFIG)
+            + SearchVector('item_notes', 'nf_notes', weight='D', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = PhysicalControlQuerySet.as_manager()
+
+    class Meta:
+        # Índices alinhados à paginação por cursor (created_at, id) e aos filtros da API
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='pc_created_id_idx'),
+            models.Index(fields=['nf_number', '-created_at', '-id'], name='pc_nf_created_idx'),
+            models.Index(fields=['sender', '-created_at', '-id'], name='pc_sender_created_idx'),
+            models.Index(fields=['location', '-created_at', '-id'], name='pc_location_created_idx'),
+            models.Index(fields=['current_responsible', '-created_at', '-id'], name='pc_resp_created_idx'),
+            models.Index(fields=['location', 'physical_location'], name='pc_location_physical_idx'),
+            models.Index(fields=['receipt_date'], name='pc_receipt_date_idx'),
+            models.Index(fields=['location', 'closet', 'shelf', 'slot'], name='pc_location_map_idx'),
+            GinIndex(fields=['search_vector'], name='pc_search_vector_idx'),
+            # Índices gin_trgm_ops de product/sender: criados na migração 0011 quando o
+            # pg_trgm está disponível no servidor (ver trigram_available)
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda a posição carregada para detectar transferências sem reler o registro no save()
+        loaded = dict(zip(field_names, values))
+        if 'location_id' in loaded and 'physical_location' in loaded:
+            # Com campos adiados (only/defer) a posição não é conhecida: o save() relê o registro
+            instance._loaded_position = (loaded['location_id'], loaded['physical_location'])
+        if all(field in loaded for field in ITEM_STATS_FIELDS):
+            instance._loaded_stats = tuple(loaded[field] for field in ITEM_STATS_FIELDS)
+        # Valores lidos, para o save() só emitir o evento em tempo real quando algo mudou
+        instance._loaded_values = {name: _comparable(value) for name, value in loaded.items()}
+        return instance
+
+    def _saved_fields(self, update_fields=None):
+        fields = [field for field in self._meta.concrete_fields if not field.generated and not field.primary_key]
+        if update_fields is not None:
+            fields = [field for field in fields if field.name in update_fields or field.attname in update_fields]
+        # Campos adiados e não tocados ficam fora (o save() também não os grava)
+        return [field for field in fields if field.attname in self.__dict__]
+
+    def changed_fields(self, update_fields=None):
+        """attnames que o save() vai gravar com valor diferente do lido; None sem leitura anterior."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {
+            field.attname for field in self._saved_fields(update_fields)
+            if field.attname not in loaded or _comparable(self.__dict__[field.attname]) != loaded[field.attname]
+        }
+
     def save(self, *args, **kwargs):
         # 1. Gera o ID customizado se for novo
         if not self.control_id:
             self.control_id = self.generate_id()
-        
-        # 2. Captura o Nome Completo do usuário para o histórico
-        user = self.current_responsible
-        friendly_name = user.get_full_name() if user.get_full_name().strip() else user.username
-        
-        # 3. Formata a string de localização para o histórico
-        loc_display = f"{self.location.name} ({self.physical_location or 'N/I'})"
-
-        if not self.pk:
+        self.set_map_coordinates()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'physical_location' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'closet', 'shelf', 'slot'}
+
+        adding = self._state.adding
+        if adding:
             # Entrada Inicial
-            self.movement_history = [{
-                'date': timezone.now().strftime('%d/%m/%Y %H:%M'),
-                'location': loc_display,
-                'responsible': friendly_name,
-                'action': 'Initial Receipt'
-            }]
+            action = MovementEvent.Action.INITIAL_RECEIPT
+        elif update_fields is not None and not {'location', 'location_id', 'physical_location'} & set(update_fields):
+            # O save não grava a posição: não há transferência a detectar
+            action = None
         else:
-            try:
-                old_instance = PhysicalControl.objects.get(pk=self.pk)
-                # Verifica se houve mudança de local ou posição no armário
-                if old_instance.location_id != self.location_id or old_instance.physical_location != self.physical_location:
-                    self.movement_history.append({
-                        'date': timezone.now().strftime('%d/%m/%Y %H:%M'),
-                        'location': loc_display,
-                        'responsible': friendly_name,
-                        'action': 'Location Transfer'
-                    })
-            except PhysicalControl.DoesNotExist:
-                pass
-        
-        super().save(*args, **kwargs)
+            old_position = getattr(self, '_loaded_position', None)
+            if old_position is None:
+                old_position = PhysicalControl.objects.filter(pk=self.pk).values_list(
+                    'location_id', 'physical_location'
+                ).first()
+            # Verifica se houve mudança de local ou posição no armário
+            moved = old_position is not None and old_position != (self.location_id, self.physical_location)
+            action = MovementEvent.Action.LOCATION_TRANSFER if moved else None
+        # Tipo do evento em tempo real emitido no post_save (events.py); None se nada mudou
+        if adding or action:
+            self._event_type = 'item.created' if adding else 'item.moved'
+        else:
+            self._event_type = None if self.changed_fields(kwargs.get('update_fields')) == set() else 'item.updated'
+
+        with transaction.atomic() if adding else nullcontext():
+            super().save(*args, **kwargs)
+            if adding:
+                # O processamento nasce junto com o item, sem o SELECT do antigo get_or_create.
+                # bulk_create não dispara signals: o contador de status entra em update_item_stats
+                ItemProcessing.objects.bulk_create([ItemProcessing(item=self)])
+            if action:
+                self.build_movement_event(action).save()
+        self._loaded_position = (self.location_id, self.physical_location)
+        loaded = getattr(self, '_loaded_values', {})
+        self._loaded_values = {
+            **loaded,
+            **{field.attname: _comparable(self.__dict__[field.attname]) for field in self._saved_fields(kwargs.get('update_fields'))},
+        }
+
+    def stats_dimensions(self):
+        return tuple(getattr(self, field) for field in ITEM_STATS_FIELDS)
+
+    def set_map_coordinates(self):
+        self.closet, self.shelf, self.slot = parse_map_coordinates(self.physical_location)
+
+    def build_movement_event(self, action):
+        return MovementEvent(
+            item=self,
+            action=action,
+            location_id=self.location_id,
+            physical_location=self.physical_location,
+            responsible_id=self.current_responsible_id,
+        )
+
+    @classmethod
+    def reserve_control_ids(cls, count):
+        """Reserva `count` IDs sequenciais do mês atual no ControlIdSequence."""
+        prefix = f"DUR-{timezone.now().strftime('%m%y')}"
+        return [f"{prefix}-{str(seq).zfill(4)}" for seq in ControlIdSequence.reserve(prefix, count)]
 
     def generate_id(self):
-        now = timezone.now()
-        prefix = f"DUR-{now.strftime('%m%y')}"
-        # Busca o último registro que comece com o prefixo do mês atual
-        last = PhysicalControl.objects.filter(control_id__startswith=prefix).order_by('id').last()
-        if last:
-            try:
-                last_parts = last.control_id.split('-')
-                last_seq = int(last_parts[-1])
-                new_seq = last_seq + 1
-            except (ValueError, IndexError):
-                new_seq = 1
-        else:
-            new_seq = 1
-        return f"{prefix}-{str(new_seq).zfill(4)}"
+        return self.reserve_control_ids(1)[0]
 
     def __str__(self):
         return self.control_id
 
+class MovementEvent(models.Model):
+    """Histórico de movimentações (append-only): uma linha por entrada/transferência."""
+
+    class Action(models.TextChoices):
+        INITIAL_RECEIPT = 'Initial Receipt', 'Entrada inicial'
+        LOCATION_TRANSFER = 'Location Transfer', 'Transferência de local'
+
+    item = models.ForeignKey(PhysicalControl, on_delete=models.CASCADE, related_name='movements')
+    timestamp = models.DateTimeField(default=timezone.now)
+    action = models.CharField(max_length=30, choices=Action.choices)
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    physical_location = models.CharField(max_length=255, blank=True, null=True)
+    responsible = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+
+    objects = MovementEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['timestamp', 'id']
+        indexes = [
+            models.Index(fields=['item', 'timestamp'], name='mv_item_ts_idx'),
+            models.Index(fields=['location', '-timestamp', '-id'], name='mv_location_ts_idx'),
+            models.Index(fields=['-timestamp', '-id'], name='mv_ts_idx'),
+        ]
+
+    def as_history_entry(self):
+        """Formato legado do antigo JSON movement_history, consumido pelo frontend."""
+        responsible = self.responsible
+        if responsible is None:
+            friendly_name = 'N/I'
+        else:
+            friendly_name = responsible.get_full_name() if responsible.get_full_name().strip() else responsible.username
+        location_name = self.location.name if self.location else 'N/I'
+        return {
+            'date': timezone.localtime(self.timestamp).strftime('%d/%m/%Y %H:%M'),
+            'location': f"{location_name} ({self.physical_location or 'N/I'})",
+            'responsible': friendly_name,
+            'action': self.action
+        }
+
+    def __str__(self):
+        return f"{self.item_id} - {self.action} ({self.timestamp:%d/%m/%Y %H:%M})"
+
 class ItemProcessing(models.Model):
+    # ID de controle, NF e remetente são lidos do item (JOIN em for_api)
     item = models.OneToOneField(PhysicalControl, on_delete=models.CASCADE, related_name='processing')
-    control_id = models.CharField(max_length=25)
-    nf_number = models.CharField(max_length=50)
-    sender = models.CharField(max_length=255)
     reason = models.CharField(max_length=255, blank=True, null=True)
     observation = models.TextField(blank=True, null=True)
-    status = models.CharField(max_length=50, default="Pendente") 
+
+    class Status(models.TextChoices):
+        PENDING = 'Pendente', 'Pendente'
+        IN_PROGRESS = 'Em andamento', 'Em andamento'
+        DONE = 'Concluído', 'Concluído'
+
+    status = models.CharField(max_length=50, choices=Status.choices, default=Status.PENDING)
+    # Operador que pegou o item na fila (claim); liberado ao concluir ou devolver
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_processing')
+    claimed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ItemProcessingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-updated_at', '-id'], name='ip_status_updated_idx'),
+            models.Index(fields=['updated_at', 'id'], name='ip_updated_idx'),
+            # Fila do claim: só as linhas pendentes, na ordem de chegada
+            models.Index(fields=['id'], condition=models.Q(status='Pendente'), name='ip_pending_idx'),
+        ]
+
+    @classmethod
+    def claim_next(cls, user, stale_after=None):
+        """
+        Pega o próximo item pendente (o mais antigo) para `user`. O SELECT ... FOR UPDATE
+        SKIP LOCKED pula linhas travadas por outro operador, então claims simultâneos
+        nunca recebem o mesmo item. Claims mais antigos que `stale_after` voltam à fila.
+        Devolve o pk reservado ou None se a fila está vazia.
+        """
+        available = models.Q(status=cls.Status.PENDING)
+        if stale_after is not None:
+            available |= models.Q(status=cls.Status.IN_PROGRESS, claimed_at__lt=timezone.now() - stale_after)
+        with transaction.atomic():
+            pk = cls.objects.select_for_update(skip_locked=True).filter(available).order_by('id').values_list(
+                'pk', flat=True
+            ).first()
+            if pk is None:
+                return None
+            processing = cls.objects.get(pk=pk)
+            processing.status = cls.Status.IN_PROGRESS
+            processing.claimed_by = user
+            processing.claimed_at = timezone.now()
+            processing.save(update_fields=['status', 'claimed_by', 'claimed_at', 'updated_at'])
+        return pk
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+
     def __str__(self):
-        return f"Processamento: {self.control_id}"
+        return f"Processamento: {self.item.control_id}"
+
+class StagedUpload(models.Model):
+    """
+    Arquivo enviado em partes (retomável) e guardado em UPLOAD_STAGING_DIR até ser
+    usado pelo create-batch. `offset` é quantos bytes já chegaram (ver uploads.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='staged_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Informado pelo cliente na criação (opcional) e conferido quando o último byte chega
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='su_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
 
 # --- SIGNALS ---
 
 @receiver(post_save, sender=PhysicalControl)
-def create_item_processing(sender, instance, created, **kwargs):
+def schedule_photo_renditions(sender, instance, **kwargs):
+    from .images import schedule_renditions, stale_photo_fields
+    if stale_photo_fields(instance):
+        schedule_renditions([instance.pk])
+
+# --- CONTADORES DO DASHBOARD ---
+
+@receiver(pre_save, sender=PhysicalControl)
+def remember_item_stats(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_loaded_stats'):
+        return
+    # Instância sem os valores originais (ex.: .only()): lê o estado atual do banco
+    instance._loaded_stats = PhysicalControl.objects.filter(pk=instance.pk).values_list(
+        *ITEM_STATS_FIELDS
+    ).first()
+
+@receiver(post_save, sender=PhysicalControl)
+def update_item_stats(sender, instance, created, **kwargs):
+    from .stats import record_item_change, record_new_items
+    new = instance.stats_dimensions()
     if created:
-        ItemProcessing.objects.get_or_create(
-            item=instance,
-            defaults={
-                'control_id': instance.control_id, 
-                'nf_number': instance.nf_number, 
-                'sender': instance.sender
-            }
-        )
\ No newline at end of file
+        # Item e processamento (criado em PhysicalControl.save) num único UPSERT
+        record_new_items([instance], ItemProcessing.Status.PENDING)
+    else:
+        record_item_change(getattr(instance, '_loaded_stats', None), new)
+    instance._loaded_stats = new
+
+@receiver(post_delete, sender=PhysicalControl)
+def remove_item_stats(sender, instance, **kwargs):
+    from .stats import record_item_change
+    record_item_change(getattr(instance, '_loaded_stats', instance.stats_dimensions()), None)
+
+@receiver(pre_save, sender=ItemProcessing)
+def remember_processing_status(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_loaded_status'):
+        return
+    instance._loaded_status = ItemProcessing.objects.filter(pk=instance.pk).values_list(
+        'status', flat=True
+    ).first()
+
+@receiver(post_save, sender=ItemProcessing)
+def update_processing_stats(sender, instance, created, **kwargs):
+    from .stats import record_status_change
+    old = None if created else getattr(instance, '_loaded_status', None)
+    record_status_change(old, instance.status)
+    instance._loaded_status = instance.status
+
+@receiver(post_delete, sender=ItemProcessing)
+def remove_processing_stats(sender, instance, **kwargs):
+    from .stats import record_status_change
+    record_status_change(getattr(instance, '_loaded_status', instance.status), None)
+
+# --- EVENTOS EM TEMPO REAL (events.py) ---
+
+@receiver(post_save, sender=PhysicalControl)
+def publish_item_event(sender, instance, created, **kwargs):
+    from .events import item_event, publish
+    event_type = getattr(instance, '_event_type', 'item.created' if created else 'item.updated')
+    if event_type:
+        publish(item_event(instance, event_type))
+
+@receiver(post_delete, sender=PhysicalControl)
+def publish_item_deleted(sender, instance, **kwargs):
+    from .events import item_event, publish
+    publish(item_event(instance, 'item.deleted'))
+
+@receiver(post_save, sender=ItemProcessing)
+def publish_processing_event(sender, instance, created, **kwargs):
+    from .events import processing_event, publish
+    publish(processing_event(instance))
+
+# --- LISTAS DE REFERÊNCIA EM CACHE (reference.py) ---
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_locations_list(sender, **kwargs):
+    from .reference import LOCATIONS, invalidate
+    invalidate(LOCATIONS)
+
+@receiver(m2m_changed, sender=Location.responsibles.through)
+def invalidate_location_responsibles(sender, action, **kwargs):
+    from .reference import LOCATIONS, invalidate
+    if action.startswith('post_'):
+        invalidate(LOCATIONS)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_lists(sender, **kwargs):
+    from .reference import LOCATIONS, USERS, invalidate
+    # O login só grava last_login, que as listas não mostram
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Os locais trazem nome/usuário dos responsáveis
+    invalidate(USERS, LOCATIONS)
@@ -0,0 +1,173 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre (ordering_field, id), do mais novo para o mais antigo.
+    Cada página é um "WHERE (campo, id) < (cursor)" + LIMIT, então o custo
+    não cresce com a posição na lista (sem OFFSET).
+    """
+    ordering_field = 'created_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = parse_datetime(payload['c'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, pk, reverse
+
+    def encode_cursor(self, obj, reverse=False):
+        payload = {'c': getattr(obj, self.ordering_field).isoformat(), 'i': obj.pk}
+        if reverse:
+            payload['r'] = True
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        encoded = base64.urlsafe_b64encode(raw).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size_value = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        field = self.ordering_field
+        queryset = queryset.order_by()
+        if cursor is None:
+            reverse = False
+            page_qs = queryset.order_by(f'-{field}', '-id')
+        else:
+            position, pk, reverse = cursor
+            if reverse:
+                # Volta uma página: itens mais novos que o cursor, em ordem crescente
+                page_qs = queryset.filter(
+                    Q(**{f'{field}__gt': position}) | Q(**{field: position, 'id__gt': pk})
+                ).order_by(field, 'id')
+            else:
+                page_qs = queryset.filter(
+                    Q(**{f'{field}__lt': position}) | Q(**{field: position, 'id__lt': pk})
+                ).order_by(f'-{field}', '-id')
+
+        # Busca um item extra para saber se existe próxima página
+        rows = list(page_qs[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = (cursor is not None) if not reverse else has_more
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class MovementPagination(KeysetPagination):
+    ordering_field = 'timestamp'
+    page_size = 100
+
+
+class RankedPagination(BasePagination):
+    """
+    Paginação por página para resultados ordenados por relevância (busca), onde não
+    há chave estável para cursor. Sem COUNT(*): busca um item a mais para saber se
+    existe próxima página, e limita a profundidade para não varrer a tabela inteira.
+    """
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 100
+    max_page = 50
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size_value = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            raise NotFound('Página inválida.')
+        if not 1 <= self.page_number <= self.max_page:
+            raise NotFound('Página inválida.')
+
+        offset = (self.page_number - 1) * self.page_size_value
+        rows = list(queryset[offset:offset + self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value and self.page_number < self.max_page
+        return rows[:self.page_size_value]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        return replace_query_param(self.base_url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,88 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+# Listas de referência (locais e usuários): lidas em quase toda página e raramente
+# alteradas. Cada lista tem no cache compartilhado um carimbo de versão, o instante (µs)
+# da última alteração, trocado pelos signals. ETag e Last-Modified saem só do carimbo,
+# então o 304 não consulta o banco nem serializa; o corpo já serializado fica em cache
+# sob a versão, e um rebuild concorrente com dados antigos cai numa chave obsoleta.
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+LOCATIONS = 'locations'
+USERS = 'users'
+
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+def _version_key(name):
+    return f'reference:{name}:version'
+
+
+def _version(name):
+    version = cache.get(_version_key(name))
+    if version is None:
+        # Cache vazio (reinício/limpeza): começa uma versão nova
+        cache.add(_version_key(name), time.time_ns() // 1000, None)
+        version = cache.get(_version_key(name))
+    return version
+
+
+def invalidate(*names):
+    """Troca o carimbo agora e de novo no commit (leitura concorrente antes do commit)."""
+    def bump():
+        now = time.time_ns() // 1000
+        for name in names:
+            cache.set(_version_key(name), now, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def locations_queryset():
+    from .models import Location
+
+    return Location.objects.prefetch_related(
+        Prefetch('responsibles', queryset=User.objects.only(*USER_FIELDS).order_by('id'))
+    )
+
+
+def _build_locations():
+    from .serializers import LocationSerializer
+
+    return LocationSerializer(locations_queryset().order_by('id'), many=True).data
+
+
+def _build_users():
+    from .serializers import UserSimpleSerializer
+
+    users = User.objects.only(*USER_FIELDS).order_by('username')
+    return UserSimpleSerializer(users, many=True).data
+
+
+BUILDERS = {LOCATIONS: _build_locations, USERS: _build_users}
+
+
+def cached_list_response(request, name):
+    """Resposta da lista `name` com ETag/Last-Modified e 304 condicional."""
+    version = _version(name)
+    etag = f'"{name}-{version}"'
+    last_modified = version // 1_000_000
+    headers = {'ETag': etag, 'Last-Modified': http_date(last_modified), 'Cache-Control': 'private, no-cache'}
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        # 304 (ou 412 para If-Match) sem tocar no banco
+        return Response(status=conditional.status_code, headers=headers)
+
+    key = f'reference:{name}:{version}'
+    data = cache.get(key)
+    if data is None:
+        data = BUILDERS[name]()
+        cache.set(key, data, REFERENCE_CACHE_TIMEOUT)
+    return Response(data, headers=headers)
@@ -1,6 +1,21 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import ItemProcessing, Location, PhysicalControl
+from django.core.files.storage import default_storage
+from .models import (
+    RESPONSIBLE_FIELDS, InvoiceDocument, ItemProcessing, Location, MovementEvent, PhysicalControl, StagedUpload,
+)
+
+def rendition_urls(renditions, request=None):
+    """Converte os caminhos de photo_renditions em URLs (absolutas quando há request)."""
+    urls = {}
+    for field, versions in (renditions or {}).items():
+        urls[field] = {}
+        for name, path in versions.items():
+            if name == 'source':
+                continue
+            url = default_storage.url(path)
+            urls[field][name] = request.build_absolute_uri(url) if request else url
+    return urls
 
 class UserSimpleSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
@@ -20,66 +35,138 @@ class LocationSerializer(serializers.ModelSerializer):
 class ItemProcessingSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='item.product')
     control_id = serializers.ReadOnlyField(source='item.control_id')
+    nf_number = serializers.ReadOnlyField(source='item.nf_number')
+    sender = serializers.ReadOnlyField(source='item.sender')
     location_name = serializers.ReadOnlyField(source='item.location.name')
     responsible_name = serializers.SerializerMethodField()
     receipt_date = serializers.ReadOnlyField(source='item.receipt_date')
     item_notes = serializers.ReadOnlyField(source='item.item_notes')
-    nf_file = serializers.FileField(source='item.nf_file', read_only=True)
+    nf_file = serializers.FileField(source='item.invoice.file', read_only=True)
     photo_top = serializers.ImageField(source='item.photo_top', read_only=True)
     photo_front = serializers.ImageField(source='item.photo_front', read_only=True)
     photo_side = serializers.ImageField(source='item.photo_side', read_only=True)
     photo_iso = serializers.ImageField(source='item.photo_iso', read_only=True)
+    photo_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ItemProcessing
         fields = '__all__'
+        read_only_fields = ['claimed_by', 'claimed_at']
+
+    @classmethod
+    def item_paths(cls):
+        """Caminhos item__... que o serializer lê, para o only() de ItemProcessingQuerySet.for_api."""
+        paths = {
+            field.source.replace('.', '__') for field in cls._declared_fields.values()
+            if field.source and field.source.startswith('item.')
+        }
+        # Lidos por get_photo_renditions e get_responsible_name
+        paths.add('item__photo_renditions')
+        paths.update(f'item__current_responsible__{field}' for field in RESPONSIBLE_FIELDS)
+        return sorted(paths)
+
+    def update(self, instance, validated_data):
+        # Mesma regra de set_processing_status: só "Em andamento" mantém a reserva
+        if validated_data.get('status', ItemProcessing.Status.IN_PROGRESS) != ItemProcessing.Status.IN_PROGRESS:
+            validated_data.update(claimed_by=None, claimed_at=None)
+        return super().update(instance, validated_data)
 
     def get_responsible_name(self, obj):
         user = obj.item.current_responsible
         return user.get_full_name() or user.username
 
+    def get_photo_renditions(self, obj):
+        return rendition_urls(obj.item.photo_renditions, self.context.get('request'))
+
+class MovementEventSerializer(serializers.ModelSerializer):
+    control_id = serializers.ReadOnlyField(source='item.control_id')
+    location_name = serializers.ReadOnlyField(source='location.name')
+    responsible_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MovementEvent
+        fields = ['id', 'item', 'control_id', 'timestamp', 'action', 'location', 'location_name',
+                  'physical_location', 'responsible', 'responsible_name']
+
+    def get_responsible_name(self, obj):
+        if obj.responsible is None:
+            return None
+        return obj.responsible.get_full_name() or obj.responsible.username
+
 class PhysicalControlSerializer(serializers.ModelSerializer):
     location_name = serializers.ReadOnlyField(source='location.name')
     responsible_name = serializers.SerializerMethodField()
     processing = serializers.SerializerMethodField()
+    movement_history = serializers.SerializerMethodField()
+    photo_renditions = serializers.SerializerMethodField()
+    # A NF fica no InvoiceDocument (deduplicado); o campo continua se chamando nf_file na API
+    nf_file = serializers.FileField(source='invoice.file', required=False, allow_null=True)
 
     class Meta:
         model = PhysicalControl
-        fields = '__all__'
-        read_only_fields = ['control_id', 'created_at', 'movement_history']
+        exclude = ['invoice', 'search_vector']
+        read_only_fields = ['control_id', 'created_at']
+
+    def _set_invoice(self, validated_data):
+        invoice_data = validated_data.pop('invoice', None)
+        if invoice_data is not None:
+            upload = invoice_data.get('file')
+            validated_data['invoice'] = InvoiceDocument.from_upload(upload) if upload else None
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self._set_invoice(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self._set_invoice(validated_data))
 
     def get_responsible_name(self, obj):
         return obj.current_responsible.get_full_name() or obj.current_responsible.username
 
+    def get_photo_renditions(self, obj):
+        return rendition_urls(obj.photo_renditions, self.context.get('request'))
+
+    def get_movement_history(self, obj):
+        # Usa o prefetch de for_api(); .all() não gera query extra quando o cache existe
+        return [event.as_history_entry() for event in obj.movements.all()]
+
     def get_processing(self, obj):
         try:
             return {'id': obj.processing.id}
         except:
             return None
-    def get_map_coordinates(self, obj):
-        """
-        Converte "Armario 1-2-B" em { closet: 1, shelf: 2, slot: 'B' }
-        """
-        if not obj.physical_location:
-            return None
-        try:
-            # Tira a palavra "Armario" e separa pelos hífens
-            clean_loc = obj.physical_location.upper().replace('ARMARIO', '').strip()
-            parts = clean_loc.split('-')
-            if len(parts) >= 3:
-                return {
-                    'closet': parts[0].strip(),
-                    'shelf': parts[1].strip(),
-                    'slot': parts[2].strip()
-                }
-        except:
-            pass
-        return None
-
-def to_representation(self, instance):
-        rep = super().to_representation(instance)
-        # Padroniza para maiúsculas para o filtro do mapa ser exato
-        rep['physical_location'] = (instance.physical_location or "").strip().upper()
-        rep['nf_notes'] = instance.nf_notes or ""
-        rep['item_notes'] = instance.item_notes or ""
-        return rep
\ No newline at end of file
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    location_name = serializers.ReadOnlyField(source='location.name')
+    processing_status = serializers.ReadOnlyField(source='processing.status')
+    nf_file = serializers.FileField(source='invoice.file', read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = PhysicalControl
+        fields = ['id', 'control_id', 'product', 'sender', 'nf_number', 'receipt_date', 'quantity',
+                  'location', 'location_name', 'physical_location', 'processing_status', 'nf_file', 'rank']
+
+
+# Limite de itens por operação em lote (um SELECT ... FOR UPDATE por requisição)
+BULK_MAX_ITEMS = 5000
+
+class BulkTransferSerializer(serializers.Serializer):
+    items = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS)
+    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all())
+    physical_location = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+
+class BulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS)
+    status = serializers.ChoiceField(choices=ItemProcessing.Status.choices)
+    observation = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+class StagedUploadSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+
+    class Meta:
+        model = StagedUpload
+        fields = ['id', 'filename', 'size', 'sha256', 'offset', 'completed', 'expires_at']
+        read_only_fields = ['id', 'offset', 'completed', 'expires_at']
@@ -0,0 +1,221 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .images import PHOTO_FIELDS, schedule_renditions, stale_photo_fields
+from .media import delete_stored, store_uploads, submit
+from .models import (
+    InvoiceDocument, ItemProcessing, Location, MovementEvent, PhysicalControl, parse_map_coordinates,
+)
+from .events import item_event, processing_event, publish
+from .stats import record_new_items, record_status_changes, record_transfers
+
+logger = logging.getLogger(__name__)
+
+
+def create_items_batch(nf_common, rows):
+    """
+    Cria todos os itens de uma NF em poucos statements: uma reserva de IDs,
+    um SELECT de locais e INSERTs em lote de PhysicalControl, ItemProcessing e MovementEvent.
+    `rows` são dicts com os campos de item (product, quantity, location_id, ...).
+
+    Os control_id são reservados antes de qualquer arquivo ser gravado, então as
+    fotos e a NF vão direto para a pasta final do item, gravadas em paralelo e
+    fora da transação. Se o INSERT falhar, os arquivos gravados são removidos.
+    A reserva tem commit próprio (não segura a trava da sequência durante as
+    gravações): um lote que falha deixa os números reservados sem uso, como uma
+    sequence do Postgres.
+    """
+    if not rows:
+        return []
+
+    location_ids = {int(row['location_id']) for row in rows}
+    locations = Location.objects.in_bulk(location_ids)
+    missing = location_ids - set(locations)
+    if missing:
+        raise ValueError(f"Local inexistente: {', '.join(str(pk) for pk in sorted(missing))}")
+
+    common = dict(nf_common)
+    nf_upload = common.pop('nf_file', None)
+
+    control_ids = PhysicalControl.reserve_control_ids(len(rows))
+    items, jobs = [], []
+    for control_id, row in zip(control_ids, rows):
+        fields = dict(row)
+        location = locations[int(fields.pop('location_id'))]
+        uploads = {field: fields.pop(field, None) for field in PHOTO_FIELDS}
+        item = PhysicalControl(control_id=control_id, location=location, **common, **fields)
+        item.set_map_coordinates()
+        jobs.extend((item, field, upload) for field, upload in uploads.items() if upload)
+        items.append(item)
+
+    # A NF é a mesma para todos os itens: um único InvoiceDocument (por hash). O arquivo
+    # é gravado em paralelo com as fotos; a linha só é criada dentro da transação
+    invoice_future = submit(InvoiceDocument.store_upload, nf_upload) if nf_upload else None
+
+    try:
+        names = store_uploads(jobs)
+    except Exception:
+        if invoice_future is not None:
+            _discard_invoice(invoice_future)
+        raise
+    for (item, field, _), name in zip(jobs, names):
+        setattr(item, field, name)
+
+    invoice = None
+    if invoice_future is not None:
+        try:
+            invoice = invoice_future.result()
+        except Exception:
+            delete_stored(jobs, names)
+            raise
+    # Só o arquivo de um documento novo é removido se o lote falhar
+    new_invoice_file = invoice.file.name if invoice is not None and invoice.pk is None else None
+
+    try:
+        with transaction.atomic():
+            if invoice is not None:
+                invoice = invoice.save_stored()
+                for item in items:
+                    item.invoice = invoice
+            # bulk_create não dispara post_save, então o processamento é criado aqui no mesmo lote
+            PhysicalControl.objects.bulk_create(items)
+            ItemProcessing.objects.bulk_create([
+                ItemProcessing(item=item) for item in items
+            ])
+            MovementEvent.objects.bulk_create([
+                item.build_movement_event(MovementEvent.Action.INITIAL_RECEIPT) for item in items
+            ])
+            record_new_items(items, ItemProcessing.Status.PENDING)
+            publish(*[item_event(item, 'item.created') for item in items])
+            # Miniaturas só depois do commit, fora da requisição
+            schedule_renditions(item.pk for item in items if stale_photo_fields(item))
+    except Exception:
+        delete_stored(jobs, names)
+        if new_invoice_file:
+            _delete_invoice_file(new_invoice_file)
+        raise
+    return items
+
+
+def _delete_invoice_file(name):
+    try:
+        InvoiceDocument._meta.get_field('file').storage.delete(name)
+    except Exception:
+        logger.exception("Falha ao remover %s após erro no lote", name)
+
+
+def _discard_invoice(future):
+    try:
+        document = future.result()
+    except Exception:
+        return
+    if document.pk is None:
+        _delete_invoice_file(document.file.name)
+
+
+def _missing(requested, found):
+    missing = set(requested) - set(found)
+    if missing:
+        return ', '.join(str(pk) for pk in sorted(missing))
+    return None
+
+
+def transfer_items(item_ids, location, physical_location):
+    """
+    Move vários itens para `location`/`physical_location` em statements de conjunto:
+    um SELECT ... FOR UPDATE das posições atuais, um UPDATE, um INSERT em lote do
+    histórico e um UPSERT dos contadores (sem o save() e os signals por item).
+    Itens que já estão na posição de destino não geram evento.
+    Devolve (movidos, inalterados) como listas de pk.
+    """
+    closet, shelf, slot = parse_map_coordinates(physical_location)
+    with transaction.atomic():
+        rows = list(
+            PhysicalControl.objects.select_for_update().filter(pk__in=item_ids).order_by('pk').values_list(
+                'pk', 'control_id', 'location_id', 'physical_location', 'current_responsible_id', named=True,
+            )
+        )
+        missing = _missing(item_ids, (row.pk for row in rows))
+        if missing:
+            raise ValueError(f"Item inexistente: {missing}")
+
+        moved = [row for row in rows if (row.location_id, row.physical_location) != (location.pk, physical_location)]
+        if moved:
+            PhysicalControl.objects.filter(pk__in=[row.pk for row in moved]).update(
+                location=location, physical_location=physical_location, closet=closet, shelf=shelf, slot=slot,
+            )
+            now = timezone.now()
+            MovementEvent.objects.bulk_create([
+                MovementEvent(
+                    item_id=row.pk,
+                    timestamp=now,
+                    action=MovementEvent.Action.LOCATION_TRANSFER,
+                    location=location,
+                    physical_location=physical_location,
+                    responsible_id=row.current_responsible_id,
+                )
+                for row in moved
+            ])
+            record_transfers((row.location_id for row in moved), location.pk)
+            publish(*[
+                item_event(
+                    PhysicalControl(pk=row.pk, control_id=row.control_id, location=location,
+                                    physical_location=physical_location),
+                    'item.moved',
+                )
+                for row in moved
+            ])
+    moved_ids = {row.pk for row in moved}
+    return [row.pk for row in moved], [row.pk for row in rows if row.pk not in moved_ids]
+
+
+def _may_change(row, user):
+    if row.status == ItemProcessing.Status.DONE:
+        return False
+    if row.status == ItemProcessing.Status.IN_PROGRESS and row.claimed_by_id not in (None, user.pk):
+        return user.is_staff
+    return True
+
+
+def set_processing_status(processing_ids, new_status, user, observation=None):
+    """
+    Muda o status de vários processamentos num único UPDATE, seguindo as regras das
+    rotas individuais: concluídos não mudam (como no PATCH) e um item "Em andamento"
+    reservado por outro operador só muda pela mão de staff (como no release).
+    "Em andamento" reserva para `user`; os demais status liberam a reserva.
+    Devolve (alterados, ignorados) como listas de pk.
+    """
+    if new_status == ItemProcessing.Status.IN_PROGRESS:
+        changes = {'claimed_by': user, 'claimed_at': timezone.now()}
+    else:
+        changes = {'claimed_by': None, 'claimed_at': None}
+    if observation is not None:
+        changes['observation'] = observation
+
+    with transaction.atomic():
+        locked = list(
+            ItemProcessing.objects.select_for_update().filter(pk__in=processing_ids).order_by('pk').values_list(
+                'pk', 'item_id', 'status', 'claimed_by_id', named=True,
+            )
+        )
+        missing = _missing(processing_ids, (row.pk for row in locked))
+        if missing:
+            raise ValueError(f"Processamento inexistente: {missing}")
+
+        rows = [row for row in locked if _may_change(row, user)]
+        if rows:
+            ItemProcessing.objects.filter(pk__in=[row.pk for row in rows]).update(
+                status=new_status, updated_at=timezone.now(), **changes,
+            )
+            record_status_changes((row.status for row in rows), new_status)
+            publish(*[
+                processing_event(ItemProcessing(
+                    pk=row.pk, item_id=row.item_id, status=new_status,
+                    claimed_by=changes['claimed_by'],
+                ))
+                for row in rows
+            ])
+    changed = {row.pk for row in rows}
+    return [row.pk for row in rows], [row.pk for row in locked if row.pk not in changed]
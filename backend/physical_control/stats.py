@@ -0,0 +1,174 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Métricas mantidas em DashboardRollup
+ITEMS_BY_LOCATION = 'items_by_location'
+ITEMS_BY_MONTH = 'items_by_month'
+ITEMS_BY_SENDER = 'items_by_sender'
+PROCESSING_BY_STATUS = 'processing_by_status'
+
+TOP_SENDERS = 10
+MONTHS = 12
+
+
+def item_buckets(location_id, receipt_date, sender):
+    buckets = [(ITEMS_BY_LOCATION, str(location_id))]
+    if receipt_date:
+        # Antes do refresh a data pode ainda ser a string ISO vinda do formulário
+        month = receipt_date[:7] if isinstance(receipt_date, str) else f'{receipt_date:%Y-%m}'
+        buckets.append((ITEMS_BY_MONTH, month))
+    if sender:
+        buckets.append((ITEMS_BY_SENDER, sender))
+    return buckets
+
+
+def item_deltas(dimensions, sign):
+    return Counter({bucket: sign for bucket in item_buckets(*dimensions)})
+
+
+def record_item_change(old, new):
+    """old/new = (location_id, receipt_date, sender) ou None (criação/remoção)."""
+    from .models import DashboardRollup
+
+    if old == new:
+        return
+    deltas = Counter()
+    if old is not None:
+        deltas.update(item_deltas(old, -1))
+    if new is not None:
+        deltas.update(item_deltas(new, 1))
+    DashboardRollup.add(deltas)
+
+
+def record_status_change(old, new, count=1):
+    from .models import DashboardRollup
+
+    if old == new:
+        return
+    deltas = Counter()
+    if old is not None:
+        deltas[(PROCESSING_BY_STATUS, old)] -= count
+    if new is not None:
+        deltas[(PROCESSING_BY_STATUS, new)] += count
+    DashboardRollup.add(deltas)
+
+
+def record_transfers(old_location_ids, new_location_id):
+    """Caminho do bulk-transfer: só o contador por local muda."""
+    from .models import DashboardRollup
+
+    deltas = Counter()
+    for location_id in old_location_ids:
+        deltas[(ITEMS_BY_LOCATION, str(location_id))] -= 1
+        deltas[(ITEMS_BY_LOCATION, str(new_location_id))] += 1
+    DashboardRollup.add(deltas)
+
+
+def record_status_changes(old_statuses, new):
+    """Caminho do bulk-status: vários processamentos passando para `new`."""
+    from .models import DashboardRollup
+
+    deltas = Counter()
+    for old in old_statuses:
+        if old != new:
+            deltas[(PROCESSING_BY_STATUS, old)] -= 1
+            deltas[(PROCESSING_BY_STATUS, new)] += 1
+    DashboardRollup.add(deltas)
+
+
+def record_new_items(items, status):
+    """Caminho do bulk_create (sem signals): itens novos e seus processamentos."""
+    from .models import DashboardRollup
+
+    deltas = Counter()
+    for item in items:
+        deltas.update(item_deltas(item.stats_dimensions(), 1))
+    deltas[(PROCESSING_BY_STATUS, status)] += len(items)
+    DashboardRollup.add(deltas)
+
+
+# Recalcula tudo a partir das tabelas de origem (seed da migração e comando rebuild_stats)
+REBUILD_SQL = [
+    "DELETE FROM physical_control_dashboardrollup",
+    f"""
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT '{ITEMS_BY_LOCATION}', location_id::text, COUNT(*)
+    FROM physical_control_physicalcontrol GROUP BY location_id
+    """,
+    f"""
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT '{ITEMS_BY_MONTH}', to_char(receipt_date, 'YYYY-MM'), COUNT(*)
+    FROM physical_control_physicalcontrol WHERE receipt_date IS NOT NULL
+    GROUP BY to_char(receipt_date, 'YYYY-MM')
+    """,
+    f"""
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT '{ITEMS_BY_SENDER}', sender, COUNT(*)
+    FROM physical_control_physicalcontrol WHERE sender <> ''
+    GROUP BY sender
+    """,
+    f"""
+    INSERT INTO physical_control_dashboardrollup (metric, bucket, value)
+    SELECT '{PROCESSING_BY_STATUS}', status, COUNT(*)
+    FROM physical_control_itemprocessing GROUP BY status
+    """,
+]
+
+
+def rebuild(conn=connection):
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        # Trava a tabela para que signals concorrentes não se percam no meio do recálculo
+        cursor.execute("LOCK TABLE physical_control_dashboardrollup IN EXCLUSIVE MODE")
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+
+
+def last_months(today=None, count=MONTHS):
+    """Os `count` meses corridos (YYYY-MM) terminando no mês de `today`, do mais antigo ao atual."""
+    today = today or timezone.localdate()
+    index = today.year * 12 + today.month - 1
+    return [f'{i // 12:04d}-{i % 12 + 1:02d}' for i in range(index - count + 1, index + 1)]
+
+
+def dashboard_stats():
+    """Monta o payload do dashboard só com leituras da tabela de contadores."""
+    from .models import DashboardRollup, ItemProcessing, Location
+
+    rows = DashboardRollup.objects.filter(
+        metric__in=[ITEMS_BY_LOCATION, ITEMS_BY_MONTH, PROCESSING_BY_STATUS], value__gt=0
+    ).values_list('metric', 'bucket', 'value')
+    by_metric = {ITEMS_BY_LOCATION: {}, ITEMS_BY_MONTH: {}, PROCESSING_BY_STATUS: {}}
+    for metric, bucket, value in rows:
+        by_metric[metric][bucket] = value
+
+    location_counts = {int(pk): value for pk, value in by_metric[ITEMS_BY_LOCATION].items()}
+    names = dict(Location.objects.filter(pk__in=location_counts).values_list('id', 'name'))
+    by_location = sorted(
+        ({'location': pk, 'name': names.get(pk), 'count': value} for pk, value in location_counts.items()),
+        key=lambda row: -row['count'],
+    )
+
+    top_senders = DashboardRollup.objects.filter(metric=ITEMS_BY_SENDER, value__gt=0).order_by(
+        '-value', 'bucket'
+    ).values_list('bucket', 'value')[:TOP_SENDERS]
+
+    # Meses sem recebimento entram com zero
+    months = [(month, by_metric[ITEMS_BY_MONTH].get(month, 0)) for month in last_months()]
+    statuses = by_metric[PROCESSING_BY_STATUS]
+    total_processing = sum(statuses.values())
+    done = statuses.get(ItemProcessing.Status.DONE, 0)
+
+    return {
+        'items_total': sum(location_counts.values()),
+        'items_by_location': by_location,
+        'processing': {
+            'total': total_processing,
+            'done': done,
+            'pending': total_processing - done,
+            'by_status': statuses,
+        },
+        'receipts_by_month': [{'month': month, 'count': value} for month, value in months],
+        'top_senders': [{'sender': sender, 'count': value} for sender, value in top_senders],
+    }
@@ -1,3 +1,1155 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from functools import partial
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    ControlIdSequence, DashboardRollup, InvoiceDocument, ItemProcessing, Location, MovementEvent, PhysicalControl,
+    StagedUpload, parse_map_coordinates, trigram_available,
+)
+from .events import hub
+from .images import generate_renditions
+from .serializers import ItemProcessingSerializer
+from .stats import dashboard_stats, last_months, rebuild
+from .uploads import append_chunk
+
+
+class PhysicalControlTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(username='operador', password='x', first_name='Operador')
+        self.location = Location.objects.create(name='Almoxarifado')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_item(self, **kwargs):
+        data = {
+            'nf_number': '1001',
+            'sender': 'Fornecedor A',
+            'product': 'Peça',
+            'quantity': 1,
+            'location': self.location,
+            'current_responsible': self.user,
+        }
+        data.update(kwargs)
+        return PhysicalControl.objects.create(**data)
+
+
+class ItemListPaginationTests(PhysicalControlTestMixin, TestCase):
+    def test_cursor_walks_every_item_once(self):
+        created = [self.make_item(product=f'Peça {i}') for i in range(7)]
+
+        seen = []
+        url = '/api/physical-control/items/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [item.id for item in reversed(created)])
+
+    def test_previous_link_returns_prior_page(self):
+        for i in range(5):
+            self.make_item(product=f'Peça {i}')
+        first = self.client.get('/api/physical-control/items/?page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']],
+        )
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/api/physical-control/items/?cursor=lixo')
+        self.assertEqual(response.status_code, 404)
+
+    def test_filters(self):
+        other = Location.objects.create(name='Laboratório')
+        match = self.make_item(nf_number='2002', sender='Fornecedor B', location=other)
+        self.make_item()
+
+        for query in ('nf_number=2002', 'sender=Fornecedor B', f'location={other.id}'):
+            response = self.client.get(f'/api/physical-control/items/?{query}')
+            self.assertEqual([row['id'] for row in response.data['results']], [match.id], query)
+
+        response = self.client.get(f'/api/physical-control/items/?responsible={self.user.id}')
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class QueryBudgetTests(PhysicalControlTestMixin, TestCase):
+    """Listagens e detalhes devem custar um número fixo de queries, qualquer que seja o volume."""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            self.make_item(product=f'Peça {i}')
+        other_user = User.objects.create_user(username='outro', password='x')
+        other_location = Location.objects.create(name='Laboratório')
+        for i in range(3):
+            self.make_item(product=f'Outra {i}', current_responsible=other_user, location=other_location)
+        self.item = PhysicalControl.objects.first()
+
+    def assertBudget(self, url, budget, client=None):
+        client = client or self.client
+        with self.assertNumQueries(budget):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_items_list(self):
+        # 1 SELECT com JOINs + 1 prefetch do histórico
+        response = self.assertBudget('/api/physical-control/items/', 2)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertTrue(all(row['processing'] for row in response.data['results']))
+
+    def test_items_retrieve(self):
+        response = self.assertBudget(f'/api/physical-control/items/{self.item.id}/', 2)
+        self.assertEqual(response.data['location_name'], self.item.location.name)
+
+    def test_processing_list(self):
+        response = self.assertBudget('/api/physical-control/processing/', 1)
+        self.assertEqual(len(response.data), 6)
+        self.assertTrue(all(row['responsible_name'] for row in response.data))
+
+    def test_processing_projection_covers_serializer(self):
+        PhysicalControl.objects.update(invoice=InvoiceDocument.objects.create(file='physical_control/nota.pdf'))
+        # Uma query para a lista inteira: nenhum campo do serializer fica adiado
+        with self.assertNumQueries(1):
+            rows = ItemProcessingSerializer(ItemProcessing.objects.for_api(), many=True).data
+        self.assertEqual(len(rows), 6)
+        self.assertNotIn('search_vector', str(ItemProcessing.objects.for_api().query))
+        # A projeção não muda o formato da API
+        self.assertEqual(set(rows[0]), {
+            'id', 'item', 'reason', 'observation', 'status', 'claimed_by', 'claimed_at', 'updated_at',
+            'product_name', 'control_id', 'nf_number', 'sender', 'location_name', 'responsible_name',
+            'receipt_date', 'item_notes', 'nf_file', 'photo_top', 'photo_front', 'photo_side', 'photo_iso',
+            'photo_renditions',
+        })
+
+    def test_processing_retrieve_is_public(self):
+        processing = self.item.processing
+        response = self.assertBudget(
+            f'/api/physical-control/processing/{processing.id}/', 1, client=APIClient()
+        )
+        self.assertEqual(response.data['location_name'], self.item.location.name)
+
+
+class CreateBatchTests(PhysicalControlTestMixin, TestCase):
+    def post_batch(self, count):
+        data = {'nf_number': '3003', 'receipt_date': '2025-01-10', 'sender': 'Fornecedor C'}
+        for i in range(count):
+            data[f'items[{i}][product]'] = f'Peça {i}'
+            data[f'items[{i}][quantity]'] = '2'
+            data[f'items[{i}][location]'] = str(self.location.id)
+            data[f'items[{i}][physical_location]'] = f'Armario 1-{i}-A'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.json())
+        return response, len(ctx.captured_queries)
+
+    def test_creates_items_with_history_and_processing(self):
+        response, _ = self.post_batch(3)
+        ids = response.json()['ids']
+        self.assertEqual(len(set(ids)), 3)
+        items = PhysicalControl.objects.filter(control_id__in=ids)
+        self.assertEqual(items.count(), 3)
+        for item in items:
+            self.assertEqual(list(item.movements.values_list('action', flat=True)), ['Initial Receipt'])
+            self.assertEqual(item.quantity, 2)
+            self.assertEqual((item.closet, item.slot), ('1', 'A'))
+        self.assertEqual(ItemProcessing.objects.filter(item__in=items).count(), 3)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        _, small = self.post_batch(2)
+        _, large = self.post_batch(25)
+        self.assertEqual(small, large)
+
+    def test_unknown_location_rolls_back(self):
+        data = {'nf_number': '3003', 'receipt_date': '2025-01-10', 'sender': 'X',
+                'items[0][product]': 'Peça', 'items[0][location]': '999999'}
+        response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PhysicalControl.objects.exists())
+
+    async def test_batch_under_asgi_with_bearer_token(self):
+        data = {'nf_number': '3004', 'receipt_date': '2025-01-10', 'sender': 'Fornecedor C',
+                'items[0][product]': 'Peça', 'items[0][location]': str(self.location.id)}
+        path = '/api/physical-control/items/create-batch/'
+        self.assertEqual((await self.async_client.post(path, data)).status_code, 401)
+
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.post(path, data, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 201, response.json())
+        item = await PhysicalControl.objects.aget(control_id=response.json()['ids'][0])
+        self.assertEqual(item.current_responsible_id, self.user.id)
+
+
+class ReferenceListCacheTests(PhysicalControlTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_unchanged_lists_return_304_without_queries(self):
+        for path in ('/api/physical-control/locations/', '/api/physical-control/users/'):
+            first = self.client.get(path)
+            self.assertEqual(first.status_code, 200)
+            self.assertTrue(first['Last-Modified'])
+
+            with self.assertNumQueries(0):
+                not_modified = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(not_modified.status_code, 304)
+            with self.assertNumQueries(0):
+                cached = self.client.get(path)
+            self.assertEqual(cached.data, first.data)
+
+    def test_locations_are_prefetched(self):
+        for i in range(5):
+            location = Location.objects.create(name=f'Local {i}')
+            location.responsibles.add(User.objects.create_user(username=f'resp{i}'))
+        # Locais + responsáveis, independente da quantidade
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/physical-control/locations/')
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[-1]['responsibles_details'][0]['username'], 'resp4')
+
+    def test_changes_invalidate_lists(self):
+        locations = self.client.get('/api/physical-control/locations/')
+        users = self.client.get('/api/physical-control/users/')
+
+        self.location.responsibles.add(self.user)
+        response = self.client.get('/api/physical-control/locations/', HTTP_IF_NONE_MATCH=locations['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['responsibles'], [self.user.id])
+
+        self.user.first_name = 'Renomeado'
+        self.user.save()
+        response = self.client.get('/api/physical-control/users/', HTTP_IF_NONE_MATCH=users['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['first_name'], 'Renomeado')
+        locations = self.client.get('/api/physical-control/locations/')
+        self.assertEqual(locations.data[0]['responsibles_details'][0]['full_name'], 'Renomeado')
+
+    def test_login_keeps_lists_cached(self):
+        users = self.client.get('/api/physical-control/users/')
+        update_last_login(None, self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/physical-control/users/', HTTP_IF_NONE_MATCH=users['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class WarehouseMapTests(PhysicalControlTestMixin, TestCase):
+    def test_parse_map_coordinates(self):
+        self.assertEqual(parse_map_coordinates('Armario 1-2-b'), ('1', '2', 'B'))
+        self.assertEqual(parse_map_coordinates('Armário 10 / 3 / C'), ('10', '3', 'C'))
+        self.assertEqual(parse_map_coordinates('2-1-A'), ('2', '1', 'A'))
+        self.assertEqual(parse_map_coordinates('Bancada'), ('', '', ''))
+        self.assertEqual(parse_map_coordinates(None), ('', '', ''))
+
+    def test_coordinates_follow_transfers(self):
+        item = self.make_item(physical_location='Armario 1-1-A')
+        self.assertEqual((item.closet, item.shelf, item.slot), ('1', '1', 'A'))
+        response = self.client.patch(f'/api/physical-control/items/{item.id}/', {'physical_location': '3-2-c'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['closet'], response.data['shelf'], response.data['slot']), ('3', '2', 'C'))
+
+    def test_map_aggregates_occupancy(self):
+        self.make_item(physical_location='Armario 1-1-A', quantity=2)
+        self.make_item(physical_location='armario 1-1-a', quantity=3)
+        self.make_item(physical_location='Armario 10-1-A')
+        self.make_item(physical_location='Armario 2-1-A')
+        self.make_item(physical_location='Bancada')
+        self.make_item(location=Location.objects.create(name='Outro'), physical_location='Armario 1-1-A')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/physical-control/locations/{self.location.id}/map/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_items'], 5)
+        self.assertEqual(response.data['unmapped'], 1)
+        self.assertEqual(
+            [(s['closet'], s['shelf'], s['slot'], s['items'], s['quantity']) for s in response.data['slots']],
+            [('1', '1', 'A', 2, 5), ('2', '1', 'A', 1, 1), ('10', '1', 'A', 1, 1)],
+        )
+
+        slot_items = self.client.get('/api/physical-control/items/', {
+            'location': self.location.id, 'closet': '1', 'shelf': '1', 'slot': 'a',
+        })
+        self.assertEqual(len(slot_items.data['results']), 2)
+
+
+class SearchTests(PhysicalControlTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.bolt = self.make_item(product='Parafuso sextavado M8', sender='Metalúrgica Souza', nf_number='7788')
+        self.valve = self.make_item(product='Válvula de esfera', sender='Hidro Peças', item_notes='lote com parafusos extras')
+        self.make_item(product='Cabo elétrico', sender='Eletro Norte')
+
+    def search(self, q, **params):
+        return self.client.get('/api/physical-control/search/', {'q': q, **params})
+
+    def ids(self, response):
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefix_match_ranked_by_field_weight(self):
+        response = self.search('parafu')
+        self.assertEqual(response.status_code, 200)
+        # Produto (peso B) vem antes da observação (peso D)
+        self.assertEqual(self.ids(response), [self.bolt.id, self.valve.id])
+
+    def test_nf_and_control_id(self):
+        self.assertEqual(self.ids(self.search('7788')), [self.bolt.id])
+        self.assertEqual(self.ids(self.search(self.valve.control_id)), [self.valve.id])
+
+    def test_typo_tolerance(self):
+        if not trigram_available():
+            self.skipTest('pg_trgm não instalado neste servidor')
+        self.assertEqual(self.ids(self.search('parafuzo')), [self.bolt.id])
+        self.assertIn(self.bolt.id, self.ids(self.search('metalurgica souza')))
+
+    def test_pagination_and_filters(self):
+        for i in range(3):
+            self.make_item(product=f'Parafuso {i}')
+        first = self.search('parafuso', page_size=2)
+        self.assertEqual(len(first.data['results']), 2)
+        self.assertIsNotNone(first.data['next'])
+        self.assertEqual(self.search('parafuso', nf_number='7788').data['results'][0]['id'], self.bolt.id)
+        self.assertEqual(self.search('x').status_code, 400)
+
+    def test_item_list_search_keeps_cursor_order(self):
+        url = '/api/physical-control/items/?search=parafu&page_size=1'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        # Mais novo primeiro, como a listagem sem busca
+        self.assertEqual(seen, [self.valve.id, self.bolt.id])
+
+
+class DashboardStatsTests(PhysicalControlTestMixin, TestCase):
+    def snapshot(self):
+        return sorted(DashboardRollup.objects.filter(value__gt=0).values_list('metric', 'bucket', 'value'))
+
+    def test_rollups_follow_changes_and_match_rebuild(self):
+        other = Location.objects.create(name='Laboratório')
+        first = self.make_item(sender='Fornecedor A', receipt_date=date(2025, 1, 5))
+        self.make_item(sender='Fornecedor A', receipt_date=date(2025, 2, 5))
+        moved = self.make_item(sender='Fornecedor B', receipt_date=date(2025, 2, 9))
+        removed = self.make_item(sender='Fornecedor C')
+
+        self.client.patch(f'/api/physical-control/items/{moved.id}/', {'location': other.id})
+        self.client.patch(f'/api/physical-control/processing/{first.processing.id}/', {'status': 'Concluído'})
+        removed.delete()
+        self.client.post('/api/physical-control/items/create-batch/', {
+            'nf_number': '3003', 'receipt_date': '2025-02-10', 'sender': 'Fornecedor B',
+            'items[0][product]': 'Peça', 'items[0][quantity]': '1', 'items[0][location]': str(other.id),
+        }, format='multipart')
+
+        with self.assertNumQueries(3), \
+                mock.patch('physical_control.stats.timezone.localdate', return_value=date(2025, 3, 20)):
+            response = self.client.get('/api/physical-control/stats/')
+        data = response.data
+        self.assertEqual(data['items_total'], 4)
+        self.assertEqual(
+            [(row['name'], row['count']) for row in data['items_by_location']],
+            [('Almoxarifado', 2), ('Laboratório', 2)],
+        )
+        self.assertEqual(data['processing'], {
+            'total': 4, 'done': 1, 'pending': 3, 'by_status': {'Pendente': 3, 'Concluído': 1},
+        })
+        # Os 12 meses corridos até o atual, com zero nos meses sem recebimento
+        self.assertEqual(data['receipts_by_month'], [
+            *({'month': f'2024-{month:02d}', 'count': 0} for month in range(4, 13)),
+            {'month': '2025-01', 'count': 1}, {'month': '2025-02', 'count': 3}, {'month': '2025-03', 'count': 0},
+        ])
+        self.assertEqual(data['top_senders'], [
+            {'sender': 'Fornecedor A', 'count': 2}, {'sender': 'Fornecedor B', 'count': 2},
+        ])
+
+        incremental = self.snapshot()
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_last_months_cross_the_year(self):
+        self.assertEqual(last_months(date(2025, 2, 28), count=4), ['2024-11', '2024-12', '2025-01', '2025-02'])
+        self.assertEqual(len(last_months(date(2025, 12, 1))), 12)
+        self.assertEqual(last_months(date(2025, 12, 1))[0], '2025-01')
+
+
+class ControlIdAllocatorTests(TestCase):
+    def test_reserve_returns_consecutive_blocks(self):
+        self.assertEqual(list(ControlIdSequence.reserve('DUR-0125', 3)), [1, 2, 3])
+        self.assertEqual(list(ControlIdSequence.reserve('DUR-0125', 2)), [4, 5])
+        self.assertEqual(list(ControlIdSequence.reserve('DUR-0225')), [1])
+
+    def test_control_id_format(self):
+        control_id = PhysicalControl.reserve_control_ids(1)[0]
+        self.assertRegex(control_id, r'^DUR-\d{4}-0001$')
+
+
+class ControlIdConcurrencyTests(PhysicalControlTestMixin, TransactionTestCase):
+    workers = 8
+    creates_per_worker = 15
+
+    def create_many(self, worker):
+        try:
+            ids = []
+            for i in range(self.creates_per_worker):
+                item = self.make_item(product=f'Peça {worker}-{i}')
+                ids.append(item.control_id)
+            return ids
+        finally:
+            connections.close_all()
+
+    def test_parallel_creates_never_collide(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.create_many, range(self.workers)))
+
+        control_ids = [cid for ids in results for cid in ids]
+        expected = self.workers * self.creates_per_worker
+        self.assertEqual(len(control_ids), expected)
+        self.assertEqual(len(set(control_ids)), expected)
+        self.assertEqual(PhysicalControl.objects.count(), expected)
+
+
+class ProcessingQueueTests(PhysicalControlTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = [self.make_item(product=f'Peça {i}') for i in range(3)]
+        # Fora da janela de espera do feed incremental
+        ItemProcessing.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+    def test_processing_reads_item_columns(self):
+        item = self.items[0]
+        response = self.client.get(f'/api/physical-control/processing/{item.processing.id}/')
+        self.assertEqual(
+            (response.data['control_id'], response.data['nf_number'], response.data['sender']),
+            (item.control_id, '1001', 'Fornecedor A'),
+        )
+        filtered = self.client.get('/api/physical-control/processing/', {'nf_number': '1001', 'sender': 'Fornecedor A'})
+        self.assertEqual(len(filtered.data), 3)
+
+    def test_create_writes_processing_without_lookup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            item = self.make_item(product='Nova')
+        statements = [query['sql'].lstrip().split()[0].upper() for query in ctx.captured_queries]
+        self.assertNotIn('SELECT', statements)
+        self.assertEqual(item.processing.status, 'Pendente')
+
+    def test_status_filter(self):
+        ItemProcessing.objects.filter(item=self.items[0]).update(status='Concluído')
+        response = self.client.get('/api/physical-control/processing/', {'status': 'Pendente'})
+        self.assertEqual(len(response.data), 2)
+
+    def test_since_feed_returns_only_changes(self):
+        first = self.client.get('/api/physical-control/processing/', {'since': '2000-01-01'})
+        self.assertEqual(len(first.data['results']), 3)
+        self.assertFalse(first.data['has_more'])
+        cursor = {'since': first.data['since'], 'since_id': first.data['since_id']}
+
+        self.assertEqual(self.client.get('/api/physical-control/processing/', cursor).data['results'], [])
+
+        changed = self.items[1].processing
+        self.client.patch(f'/api/physical-control/processing/{changed.id}/', {'observation': 'ok'})
+        # Ainda dentro da janela de espera: fica para o próximo sync
+        self.assertEqual(self.client.get('/api/physical-control/processing/', cursor).data['results'], [])
+
+        ItemProcessing.objects.filter(pk=changed.pk).update(updated_at=timezone.now() - timedelta(seconds=5))
+        delta = self.client.get('/api/physical-control/processing/', cursor)
+        self.assertEqual([row['id'] for row in delta.data['results']], [changed.id])
+
+        self.assertEqual(self.client.get('/api/physical-control/processing/', {'since': 'ontem'}).status_code, 400)
+
+    def test_claim_and_release(self):
+        claimed = self.client.post('/api/physical-control/processing/claim/')
+        self.assertEqual(claimed.status_code, 200)
+        self.assertEqual(claimed.data['id'], self.items[0].processing.id)
+        self.assertEqual(claimed.data['status'], 'Em andamento')
+        self.assertEqual(claimed.data['claimed_by'], self.user.id)
+
+        other = User.objects.create_user(username='outro')
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        self.assertEqual(other_client.post('/api/physical-control/processing/claim/').data['id'], self.items[1].processing.id)
+        forbidden = other_client.post(f'/api/physical-control/processing/{claimed.data["id"]}/release/')
+        self.assertEqual(forbidden.status_code, 403)
+
+        released = self.client.post(f'/api/physical-control/processing/{claimed.data["id"]}/release/')
+        self.assertEqual(released.data['status'], 'Pendente')
+        mine = self.client.get('/api/physical-control/processing/', {'claimed_by': 'me'})
+        self.assertEqual(mine.data, [])
+
+    def test_patch_to_done_releases_claim(self):
+        claimed = self.client.post('/api/physical-control/processing/claim/')
+        response = APIClient().patch(
+            f'/api/physical-control/processing/{claimed.data["id"]}/', {'status': 'Concluído'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['claimed_by'])
+        self.assertIsNone(response.data['claimed_at'])
+
+    def test_stale_claim_returns_to_queue(self):
+        ItemProcessing.objects.exclude(item=self.items[0]).update(status='Concluído')
+        self.client.post('/api/physical-control/processing/claim/')
+        self.assertEqual(self.client.post('/api/physical-control/processing/claim/').status_code, 204)
+
+        ItemProcessing.objects.filter(item=self.items[0]).update(claimed_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(self.client.post('/api/physical-control/processing/claim/').status_code, 200)
+
+
+class ProcessingClaimConcurrencyTests(PhysicalControlTestMixin, TransactionTestCase):
+    workers = 8
+
+    def claim_all(self, worker):
+        try:
+            user = User.objects.create_user(username=f'op{worker}')
+            claimed = []
+            while True:
+                pk = ItemProcessing.claim_next(user)
+                if pk is None:
+                    return claimed
+                claimed.append(pk)
+        finally:
+            connections.close_all()
+
+    def test_parallel_claims_never_collide(self):
+        for i in range(40):
+            self.make_item(product=f'Peça {i}')
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.claim_all, range(self.workers)))
+
+        claimed = [pk for pks in results for pk in pks]
+        self.assertEqual(len(claimed), 40)
+        self.assertEqual(len(set(claimed)), 40)
+        self.assertFalse(ItemProcessing.objects.filter(status='Pendente').exists())
+
+
+class EventStreamTests(PhysicalControlTestMixin, TransactionTestCase):
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/api/physical-control/events/').status_code, 401)
+
+    async def test_stream_pushes_committed_changes(self):
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get('/api/physical-control/events/', {'token': token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        async def next_chunk():
+            return (await asyncio.wait_for(anext(stream), 5)).decode()
+
+        try:
+            self.assertEqual(await next_chunk(), 'retry: 5000\n\n')
+            self.assertTrue((await next_chunk()).startswith('event: ready'))
+
+            item = await sync_to_async(self.make_item)(product='Nova')
+            created = await next_chunk()
+            self.assertTrue(created.startswith('event: item.created'))
+            self.assertIn(f'"control_id":"{item.control_id}"', created)
+
+            def conclude():
+                processing = ItemProcessing.objects.get(item=item)
+                processing.status = 'Concluído'
+                processing.save()
+            await sync_to_async(conclude)()
+            updated = await next_chunk()
+            self.assertTrue(updated.startswith('event: processing.updated'))
+            self.assertIn('"status":"Concluído"', updated)
+        finally:
+            await stream.aclose()
+
+    async def test_listen_timeout_returns_503(self):
+        def unavailable():
+            raise OSError('banco indisponível')
+
+        token = str(AccessToken.for_user(self.user))
+        with mock.patch.object(hub, '_connect', unavailable), mock.patch.object(hub, 'reconnect_delay', 0.05), \
+                mock.patch.object(hub, 'wait_listening', partial(hub.wait_listening, timeout=0.2)), \
+                self.assertLogs('physical_control.events', 'ERROR'):
+            response = await self.async_client.get('/api/physical-control/events/', {'token': token})
+            # Sem inscritos a thread do listener encerra sozinha
+            for _ in range(100):
+                if hub.thread is None:
+                    break
+                await asyncio.sleep(0.02)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(hub.subscribers, set())
+
+
+class MovementEventTests(PhysicalControlTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.lab = Location.objects.create(name='Laboratório')
+        self.item = self.make_item(physical_location='Armario 1-1-A')
+
+    def test_transfer_appends_event_without_rereading_item(self):
+        item = PhysicalControl.objects.get(pk=self.item.pk)
+        item.location = self.lab
+        # UPDATE do item + UPSERT dos contadores + INSERT do evento; o NOTIFY sai no commit
+        with self.assertNumQueries(3), self.captureOnCommitCallbacks() as callbacks:
+            item.save()
+        self.assertEqual(len(callbacks), 1)
+        item.item_notes = 'sem mudança de local'
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            item.save()
+        self.assertEqual(len(callbacks), 1)
+        # Nada mudou: nem evento em tempo real
+        with self.captureOnCommitCallbacks() as callbacks:
+            item.save()
+            PhysicalControl.objects.get(pk=item.pk).save(update_fields=['item_notes'])
+        self.assertEqual(callbacks, [])
+        actions = list(item.movements.values_list('action', 'location_id'))
+        self.assertEqual(actions, [('Initial Receipt', self.location.id), ('Location Transfer', self.lab.id)])
+
+    def test_deferred_position_is_not_a_transfer(self):
+        item = PhysicalControl.objects.only('id', 'item_notes').get(pk=self.item.pk)
+        item.item_notes = 'só a observação'
+        item.save(update_fields=['item_notes'])
+        item = PhysicalControl.objects.defer('physical_location').get(pk=self.item.pk)
+        item.item_notes = 'de novo'
+        item.save()
+        self.assertEqual(list(self.item.movements.values_list('action', flat=True)), ['Initial Receipt'])
+
+        item = PhysicalControl.objects.defer('physical_location').get(pk=self.item.pk)
+        item.location = self.lab
+        item.save()
+        self.assertEqual(self.item.movements.count(), 2)
+
+    def test_patch_records_history_in_legacy_format(self):
+        response = self.client.patch(
+            f'/api/physical-control/items/{self.item.id}/', {'physical_location': 'Armario 2-1-B'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        history = response.data['movement_history']
+        self.assertEqual([entry['action'] for entry in history], ['Initial Receipt', 'Location Transfer'])
+        self.assertEqual(history[-1]['location'], 'Almoxarifado (Armario 2-1-B)')
+        self.assertEqual(history[-1]['responsible'], 'Operador')
+
+    def test_history_endpoint(self):
+        response = self.client.get(f'/api/physical-control/items/{self.item.id}/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['control_id'], self.item.control_id)
+        self.assertEqual(response.data[0]['location_name'], 'Almoxarifado')
+
+    def test_global_query_by_location_and_period(self):
+        moved = self.make_item()
+        moved.location = self.lab
+        moved.save()
+        MovementEvent.objects.filter(item=self.item).update(timestamp='2024-01-05T10:00:00Z')
+
+        response = self.client.get(f'/api/physical-control/movements/?location={self.lab.id}')
+        self.assertEqual([row['item'] for row in response.data['results']], [moved.id])
+
+        response = self.client.get('/api/physical-control/movements/?since=2024-01-01&until=2024-01-31')
+        self.assertEqual([row['item'] for row in response.data['results']], [self.item.id])
+
+
+class MovementBackfillMigrationTests(TransactionTestCase):
+    """Migração 0007: o movement_history legado vira MovementEvent e volta igual no reverse."""
+    before = [('physical_control', '0006_controlidsequence')]
+    after = [('physical_control', '0007_movementevent')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_legacy_dates_are_utc(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='operador', first_name='Operador')
+        location = apps.get_model('physical_control', 'Location').objects.create(name='Almoxarifado')
+        history = [{
+            'date': '05/01/2024 13:45', 'location': 'Almoxarifado (Armario 1-1-A)',
+            'responsible': 'Operador', 'action': 'Initial Receipt',
+        }]
+        item = apps.get_model('physical_control', 'PhysicalControl').objects.create(
+            control_id='DUR-0124-0001', nf_number='1', sender='X', product='Peça', quantity=1,
+            location=location, current_responsible=user, movement_history=history,
+        )
+
+        apps = self.migrate(self.after)
+        event = apps.get_model('physical_control', 'MovementEvent').objects.get(item_id=item.pk)
+        self.assertEqual(event.timestamp, datetime(2024, 1, 5, 13, 45, tzinfo=dt_timezone.utc))
+        self.assertEqual((event.responsible_id, event.physical_location), (user.pk, 'Armario 1-1-A'))
+
+        apps = self.migrate(self.before)
+        item = apps.get_model('physical_control', 'PhysicalControl').objects.get(pk=item.pk)
+        self.assertEqual(item.movement_history, history)
+
+
+class BulkOperationTests(PhysicalControlTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.lab = Location.objects.create(name='Laboratório')
+
+    def rollups_match_rebuild(self):
+        incremental = sorted(DashboardRollup.objects.filter(value__gt=0).values_list('metric', 'bucket', 'value'))
+        rebuild()
+        self.assertEqual(sorted(DashboardRollup.objects.filter(value__gt=0).values_list('metric', 'bucket', 'value')), incremental)
+
+    def transfer(self, items, **data):
+        return self.client.post('/api/physical-control/items/bulk-transfer/', {
+            'items': [item.id for item in items], 'location': self.lab.id, **data,
+        }, format='json')
+
+    def test_bulk_transfer_records_history_and_counters(self):
+        items = [self.make_item(physical_location='Armario 1-1-A') for _ in range(3)]
+        already = self.make_item(location=self.lab, physical_location='Armario 2-3-B')
+
+        response = self.transfer(items + [already], physical_location='Armario 2-3-B')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'moved': [item.id for item in items], 'unchanged': [already.id]})
+
+        for item in items:
+            item.refresh_from_db()
+            self.assertEqual((item.location_id, item.closet, item.shelf, item.slot), (self.lab.id, '2', '3', 'B'))
+            self.assertEqual(
+                list(item.movements.values_list('action', 'location_id')),
+                [('Initial Receipt', self.location.id), ('Location Transfer', self.lab.id)],
+            )
+        self.assertEqual(already.movements.count(), 1)
+        self.assertEqual(dashboard_stats()['items_by_location'][0], {'location': self.lab.id, 'name': 'Laboratório', 'count': 4})
+        self.rollups_match_rebuild()
+
+    def test_bulk_transfer_query_count_does_not_grow(self):
+        few = [self.make_item() for _ in range(2)]
+        many = [self.make_item() for _ in range(30)]
+        with CaptureQueriesContext(connection) as small:
+            self.transfer(few)
+        with CaptureQueriesContext(connection) as large:
+            self.transfer(many)
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_transfer_unknown_item_changes_nothing(self):
+        item = self.make_item()
+        response = self.transfer([item, PhysicalControl(pk=999999)])
+        self.assertEqual(response.status_code, 400)
+        item.refresh_from_db()
+        self.assertEqual(item.location_id, self.location.id)
+        self.assertEqual(item.movements.count(), 1)
+
+    def test_bulk_status_follows_single_record_rules(self):
+        pending, done, mine, others = [self.make_item().processing for _ in range(4)]
+        other = User.objects.create_user(username='outro')
+        ItemProcessing.objects.filter(pk=done.pk).update(status='Concluído')
+        ItemProcessing.objects.filter(pk=mine.pk).update(status='Em andamento', claimed_by=self.user)
+        ItemProcessing.objects.filter(pk=others.pk).update(status='Em andamento', claimed_by=other)
+        rebuild()
+
+        ids = [pending.id, done.id, mine.id, others.id]
+        response = self.client.post('/api/physical-control/processing/bulk-status/', {
+            'ids': ids, 'status': 'Concluído', 'observation': 'Lote conferido',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': [pending.id, mine.id], 'skipped': [done.id, others.id]})
+        rows = dict(ItemProcessing.objects.filter(pk__in=ids).values_list('pk', 'status'))
+        self.assertEqual(rows, {pending.id: 'Concluído', done.id: 'Concluído', mine.id: 'Concluído', others.id: 'Em andamento'})
+        mine.refresh_from_db()
+        self.assertIsNone(mine.claimed_by_id)
+        self.assertEqual(mine.observation, 'Lote conferido')
+        self.assertEqual(dashboard_stats()['processing']['by_status'], {'Concluído': 3, 'Em andamento': 1})
+        self.rollups_match_rebuild()
+
+        invalid = self.client.post('/api/physical-control/processing/bulk-status/', {
+            'ids': [others.id], 'status': 'Arquivado',
+        }, format='json')
+        self.assertEqual(invalid.status_code, 400)
+
+
+class ExportTests(PhysicalControlTestMixin, TestCase):
+    def read_csv(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8').lstrip('\ufeff')
+        return [line.split(';') for line in content.strip().splitlines()]
+
+    def test_items_csv_respects_filters(self):
+        self.make_item(nf_number='1', product='Motor')
+        self.make_item(nf_number='2', product='Bomba')
+        response = self.client.get('/api/physical-control/items/export/?nf_number=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = self.read_csv(response)
+        self.assertEqual(rows[0][0], 'ID Controle')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][4], 'Bomba')
+        self.assertEqual(rows[1][8], 'Operador')
+
+    def test_processing_csv(self):
+        self.make_item()
+        response = self.client.get('/api/physical-control/processing/export/?status=Pendente')
+        rows = self.read_csv(response)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][5], 'Pendente')
+
+    def test_items_xlsx(self):
+        self.make_item()
+        response = self.client.get('/api/physical-control/items/export/?file_format=xlsx')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_invalid_format(self):
+        response = self.client.get('/api/physical-control/items/export/?file_format=pdf')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_asgi_export_uses_async_iterator(self):
+        await sync_to_async(self.make_item)(product='Motor')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        for file_format, prefix in (('csv', '\ufeffID Controle'.encode()), ('xlsx', b'PK')):
+            response = await self.async_client.get(
+                '/api/physical-control/items/export/', {'file_format': file_format}, headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+            # Sob ASGI um iterador síncrono seria lido inteiro para a memória
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertTrue(content.startswith(prefix))
+
+
+def make_jpeg(size=(1600, 900), orientation=None):
+    image = Image.new('RGB', size, 'red')
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, format='JPEG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class MediaRootMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root, PHOTO_RENDITIONS_ASYNC=False)
+        self.media_override.enable()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class PhotoRenditionTests(MediaRootMixin, PhysicalControlTestMixin, TestCase):
+    def test_batch_upload_generates_oriented_stripped_thumbnails(self):
+        data = {
+            'nf_number': '4004', 'receipt_date': '2025-01-10', 'sender': 'Fornecedor D',
+            'items[0][product]': 'Câmera', 'items[0][location]': str(self.location.id),
+            'items[0][photo_top]': SimpleUploadedFile('topo.jpg', make_jpeg(orientation=6), 'image/jpeg'),
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        item = PhysicalControl.objects.get(control_id=response.json()['ids'][0])
+        versions = item.photo_renditions['photo_top']
+        self.assertEqual(versions['source'], item.photo_top.name)
+        with default_storage.open(versions['thumb']) as f, Image.open(f) as thumb:
+            # Orientação 6 = girar 90°: a foto deitada (1600x900) vira em pé
+            self.assertEqual(thumb.size, (180, 320))
+            self.assertEqual(len(thumb.getexif()), 0)
+        with default_storage.open(versions['medium']) as f, Image.open(f) as medium:
+            self.assertEqual(max(medium.size), 1280)
+
+        detail = self.client.get(f'/api/physical-control/items/{item.id}/')
+        self.assertTrue(detail.data['photo_renditions']['photo_top']['thumb'].startswith('http://testserver/media/'))
+        # URL assinada: abre sem token (ex.: <img> da página pública de triagem)
+        self.assertTrue(urlsplit(detail.data['photo_top']).path.endswith('topo.jpg'))
+        self.assertEqual(APIClient().get(detail.data['photo_top']).status_code, 200)
+
+
+class MediaWriteTests(MediaRootMixin, PhysicalControlTestMixin, TestCase):
+    def test_batch_files_land_in_final_item_folder(self):
+        data = {
+            'nf_number': '5005', 'receipt_date': '2025-01-10', 'sender': 'Fornecedor E',
+            'nf_file': SimpleUploadedFile('nota.pdf', b'%PDF-1.4 nota', 'application/pdf'),
+        }
+        for i in range(2):
+            data[f'items[{i}][product]'] = f'Peça {i}'
+            data[f'items[{i}][location]'] = str(self.location.id)
+            data[f'items[{i}][photo_front]'] = SimpleUploadedFile('foto.jpg', make_jpeg((40, 40)), 'image/jpeg')
+        response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        items = list(PhysicalControl.objects.filter(nf_number='5005').order_by('id'))
+        for item in items:
+            self.assertEqual(item.photo_front.name, f'physical_control/NF_5005/{item.control_id}/foto.jpg')
+            self.assertTrue(default_storage.exists(item.photo_front.name))
+        # A NF é gravada uma única vez e compartilhada
+        self.assertEqual({item.invoice_id for item in items}, {items[0].invoice_id})
+        self.assertTrue(default_storage.exists(items[0].invoice.file.name))
+
+    def test_failed_insert_removes_written_files(self):
+        data = {
+            'nf_number': '5006', 'receipt_date': 'data-invalida', 'sender': 'X',
+            'items[0][product]': 'Peça', 'items[0][location]': str(self.location.id),
+            'items[0][photo_top]': SimpleUploadedFile('foto.jpg', make_jpeg((40, 40)), 'image/jpeg'),
+            'nf_file': SimpleUploadedFile('nota.pdf', b'%PDF-1.4 nota 5006', 'application/pdf'),
+        }
+        response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(InvoiceDocument.objects.exists())
+        written = [files for _, _, files in os.walk(os.path.join(self.media_root, 'physical_control'))]
+        self.assertEqual(sum(written, []), [])
+
+    def test_relocate_temp_photos_command(self):
+        item = self.make_item(nf_number='6006')
+        temp_name = default_storage.save('physical_control/NF_6006/TEMP/antiga.jpg', BytesIO(make_jpeg((40, 40))))
+        PhysicalControl.objects.filter(pk=item.pk).update(photo_iso=temp_name)
+        old_thumb = generate_renditions(item.pk)['photo_iso']['thumb']
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command('relocate_temp_photos', stdout=StringIO())
+            # Até o commit a linha ainda pode voltar a apontar para o arquivo antigo
+            self.assertTrue(default_storage.exists(temp_name))
+        for callback in callbacks:
+            callback()
+
+        item.refresh_from_db()
+        self.assertEqual(item.photo_iso.name, f'physical_control/NF_6006/{item.control_id}/antiga.jpg')
+        self.assertTrue(default_storage.exists(item.photo_iso.name))
+        self.assertFalse(default_storage.exists(temp_name))
+        self.assertFalse(default_storage.exists(old_thumb))
+        self.assertEqual(item.photo_renditions['photo_iso']['source'], item.photo_iso.name)
+
+
+class LoadTestCommandTests(MediaRootMixin, PhysicalControlTestMixin, LiveServerTestCase):
+    def test_reports_latency_per_scenario(self):
+        out = StringIO()
+        call_command(
+            'loadtest', '--target', f'local={self.live_server_url}', '--user', self.user.username,
+            '--duration', '1', '--concurrency', '2', '--batch-items', '1', '--photo-kb', '4', stdout=out,
+        )
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[3:] if line.strip()}
+        self.assertEqual(set(rows), {'list', 'export', 'upload', 'total'})
+        # Colunas: cenário, req, erros, req/s, p50, p95, p99, máx
+        self.assertEqual(rows['total'][2], '0')
+        self.assertTrue(PhysicalControl.objects.filter(nf_number='LOADTEST').exists())
+
+
+class SeedAndBenchmarkTests(MediaRootMixin, TestCase):
+    def test_seed_is_consistent_and_benchmark_compares_runs(self):
+        call_command(
+            'seed_inventory', '--scale', '120', '--locations', '3', '--users', '4',
+            '--photos', '1', '--batch-size', '50', stdout=StringIO(),
+        )
+        items = PhysicalControl.objects.filter(location__name__startswith='Seed ')
+        self.assertEqual(items.count(), 120)
+        self.assertEqual(ItemProcessing.objects.filter(item__in=items).count(), 120)
+        self.assertEqual(MovementEvent.objects.filter(item__in=items).count(), 120)
+        self.assertEqual(items.values('control_id').distinct().count(), 120)
+        self.assertTrue(items.exclude(photo_top='').filter(photo_renditions__has_key='photo_top').exists())
+        self.assertEqual(User.objects.filter(username__startswith='seed_', preferences__isnull=False).count(), 4)
+        self.assertEqual(dashboard_stats()['items_total'], 120)
+
+        baseline = os.path.join(self.media_root, 'baseline.json')
+        call_command('benchmark', '--repeat', '2', '--warmup', '0', '--json', baseline, stdout=StringIO())
+        with open(baseline) as file:
+            results = json.load(file)['results']
+        self.assertEqual(results['items-list']['status'], 200)
+        self.assertEqual(results['items-create-batch']['status'], 201)
+        self.assertGreater(results['items-list']['queries'], 0)
+        # Escritas do benchmark são desfeitas
+        self.assertFalse(PhysicalControl.objects.filter(nf_number='BENCH').exists())
+
+        out = StringIO()
+        call_command('benchmark', '--repeat', '1', '--warmup', '0', '--only', 'stats', '--compare', baseline, stdout=out)
+        self.assertIn('Comparação com', out.getvalue())
+
+        call_command('seed_inventory', '--clear', '--scale', '0', stdout=StringIO())
+        self.assertFalse(PhysicalControl.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='seed_').exists())
+
+
+class StagedUploadTests(MediaRootMixin, PhysicalControlTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.staging = tempfile.mkdtemp()
+        self.staging_override = override_settings(UPLOAD_STAGING_DIR=self.staging, UPLOAD_MAX_CHUNK_SIZE=64)
+        self.staging_override.enable()
+
+    def tearDown(self):
+        self.staging_override.disable()
+        shutil.rmtree(self.staging, ignore_errors=True)
+        super().tearDown()
+
+    def start(self, content, name='foto.jpg', **extra):
+        response = self.client.post('/api/physical-control/uploads/', {
+            'filename': name, 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest(), **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def send(self, upload_id, offset, chunk, **headers):
+        return self.client.generic(
+            'PATCH', f'/api/physical-control/uploads/{upload_id}/', chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **headers,
+        )
+
+    def upload(self, content, name='foto.jpg'):
+        upload_id = self.start(content, name)
+        for offset in range(0, len(content), 64):
+            self.assertEqual(self.send(upload_id, offset, content[offset:offset + 64]).status_code, 200)
+        return upload_id
+
+    def test_resume_sends_only_missing_chunks(self):
+        content = bytes(range(256)) * 2
+        upload_id = self.start(content)
+        self.assertEqual(self.send(upload_id, 0, content[:64]).data['offset'], 64)
+
+        # Bloco repetido (resposta perdida) ou fora de ordem: 409 com o offset para retomar
+        conflict = self.send(upload_id, 0, content[:64])
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict['Upload-Offset'], '64')
+
+        corrupted = self.send(upload_id, 64, b'x' * 64, HTTP_UPLOAD_CHECKSUM=hashlib.sha256(content[64:128]).hexdigest())
+        self.assertEqual(corrupted.status_code, 400)
+        self.assertEqual(self.client.get(f'/api/physical-control/uploads/{upload_id}/').data['offset'], 64)
+        # Bloco acima de UPLOAD_MAX_CHUNK_SIZE
+        self.assertEqual(self.send(upload_id, 64, content[64:]).status_code, 400)
+
+        for offset in range(64, len(content), 64):
+            response = self.send(upload_id, offset, content[offset:offset + 64])
+        self.assertTrue(response.data['completed'])
+        with open(os.path.join(self.staging, f'{upload_id}.part'), 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='outro'))
+        self.assertEqual(other.get(f'/api/physical-control/uploads/{upload_id}/').status_code, 404)
+
+    def test_whole_file_checksum_mismatch_restarts_upload(self):
+        upload_id = self.start(b'a' * 10, sha256=hashlib.sha256(b'b' * 10).hexdigest())
+        response = self.send(upload_id, 0, b'a' * 10)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(StagedUpload.objects.get(pk=upload_id).offset, 0)
+
+    def test_create_batch_uses_staged_files(self):
+        photo = make_jpeg((40, 40))
+        photo_id = self.upload(photo, 'topo.jpg')
+        nf_id = self.upload(b'%PDF-1.4 nota em partes', 'nota.pdf')
+        data = {
+            'nf_number': '8008', 'receipt_date': '2025-01-10', 'sender': 'Fornecedor F', 'nf_file_upload': nf_id,
+            'items[0][product]': 'Peça', 'items[0][location]': str(self.location.id),
+            'items[0][photo_top_upload]': photo_id,
+        }
+
+        missing = self.client.post('/api/physical-control/items/create-batch/', {
+            **data, 'items[0][photo_front_upload]': str(uuid.uuid4()),
+        }, format='multipart')
+        self.assertEqual(missing.status_code, 400)
+
+        response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        item = PhysicalControl.objects.get(control_id=response.json()['ids'][0])
+        self.assertTrue(item.photo_top.name.endswith('topo.jpg'))
+        with item.photo_top.open('rb') as file:
+            self.assertEqual(file.read(), photo)
+        self.assertEqual(item.invoice.original_name, 'nota.pdf')
+        self.assertFalse(StagedUpload.objects.exists())
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_chunk_is_read_before_locking_the_upload(self):
+        upload_id = self.start(b'abc')
+        test = self
+
+        class Stream(BytesIO):
+            def read(self, size=-1):
+                # A rede pode ser lenta: o lock na linha do upload só vem depois da leitura
+                test.assertFalse(any('FOR UPDATE' in q['sql'] for q in queries.captured_queries))
+                return super().read(size)
+
+        with CaptureQueriesContext(connection) as queries:
+            upload, checksum_ok = append_chunk(upload_id, self.user, 0, Stream(b'abc'), 3)
+        self.assertTrue(checksum_ok)
+        self.assertTrue(upload.completed)
+        self.assertTrue(any('FOR UPDATE' in q['sql'] for q in queries.captured_queries))
+
+    def test_abandoned_uploads_expire(self):
+        upload_id = self.start(b'abc')
+        StagedUpload.objects.filter(pk=upload_id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.send(upload_id, 0, b'abc').status_code, 404)
+        call_command('purge_staged_uploads', stdout=StringIO())
+        self.assertFalse(StagedUpload.objects.exists())
+        self.assertEqual(os.listdir(self.staging), [])
+
+
+class InvoiceDocumentTests(MediaRootMixin, PhysicalControlTestMixin, TestCase):
+    def post_invoice(self, nf_number, content):
+        data = {
+            'nf_number': nf_number, 'receipt_date': '2025-01-10', 'sender': 'Fornecedor F',
+            'nf_file': SimpleUploadedFile('nota.pdf', content, 'application/pdf'),
+        }
+        for i in range(3):
+            data[f'items[{i}][product]'] = f'Peça {i}'
+            data[f'items[{i}][location]'] = str(self.location.id)
+        response = self.client.post('/api/physical-control/items/create-batch/', data, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_same_content_is_stored_once(self):
+        self.post_invoice('7001', b'%PDF-1.4 mesma nota')
+        self.post_invoice('7002', b'%PDF-1.4 mesma nota')
+        self.post_invoice('7003', b'%PDF-1.4 outra nota')
+        self.assertEqual(InvoiceDocument.objects.count(), 2)
+        document = InvoiceDocument.objects.get(items__nf_number='7001', items__product='Peça 0')
+        self.assertEqual(document.items.count(), 6)
+        self.assertIn(document.sha256, document.file.name)
+
+        item = document.items.first()
+        response = self.client.get(f'/api/physical-control/items/{item.id}/')
+        self.assertTrue(urlsplit(response.data['nf_file']).path.endswith('.pdf'))
+        processing = self.client.get(f'/api/physical-control/processing/{item.processing.id}/')
+        self.assertEqual(processing.data['nf_file'], response.data['nf_file'])
+
+    def test_patch_uploads_through_invoice_document(self):
+        item = self.make_item()
+        response = self.client.patch(
+            f'/api/physical-control/items/{item.id}/',
+            {'nf_file': SimpleUploadedFile('nova.pdf', b'%PDF nova', 'application/pdf')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        item.refresh_from_db()
+        self.assertEqual(item.invoice.original_name, 'nova.pdf')
+
+    def test_dedupe_command_merges_legacy_copies(self):
+        names = [default_storage.save('physical_control/NF_8001/nota.pdf', BytesIO(b'%PDF legado')) for _ in range(3)]
+        documents = [InvoiceDocument.objects.create(file=name) for name in names]
+        items = [self.make_item(invoice=document) for document in documents]
+
+        call_command('dedupe_invoice_files', stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(InvoiceDocument.objects.count(), 1)
+        document = InvoiceDocument.objects.get()
+        self.assertEqual(len(document.sha256), 64)
+        self.assertEqual({item.invoice_id for item in PhysicalControl.objects.filter(pk__in=[i.pk for i in items])}, {document.id})
+        self.assertTrue(default_storage.exists(document.file.name))
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
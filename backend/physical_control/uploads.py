@@ -0,0 +1,210 @@
+"""
+Uploads em partes (retomáveis) para fotos e NF de lotes grandes.
+
+O cliente cria o upload (nome, tamanho e, opcionalmente, o SHA-256), envia blocos com
+o offset em que cada um começa e, se a conexão cair, consulta o offset atual e manda
+só o que falta. Cada bloco é lido da requisição em pedaços de tamanho fixo para um
+temporário e só então gravado no arquivo em UPLOAD_STAGING_DIR. Pronto o upload, o
+create-batch recebe o id no lugar do arquivo; uploads abandonados expiram (comando
+purge_staged_uploads).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StagedUpload
+
+BLOCK_SIZE = 64 * 1024
+# Blocos até este tamanho ficam em memória enquanto chegam; acima disso, em disco
+SPOOL_SIZE = 1024 * 1024
+
+
+class OffsetMismatch(ValueError):
+    """O bloco não começa onde o upload parou; o cliente deve retomar de `offset`."""
+
+    def __init__(self, offset):
+        super().__init__(f"Offset esperado: {offset}.")
+        self.offset = offset
+
+
+def _ttl():
+    return timedelta(hours=settings.UPLOAD_STAGING_TTL_HOURS)
+
+
+def staging_path(upload_id):
+    return os.path.join(settings.UPLOAD_STAGING_DIR, f'{upload_id}.part')
+
+
+def _remove(upload_id):
+    try:
+        os.remove(staging_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def active(user):
+    """Uploads de `user` ainda dentro da validade."""
+    return StagedUpload.objects.filter(owner=user, expires_at__gt=timezone.now())
+
+
+def create_upload(user, filename, size, sha256=''):
+    if size > settings.UPLOAD_MAX_FILE_SIZE:
+        raise ValueError(f"Arquivo maior que o limite de {settings.UPLOAD_MAX_FILE_SIZE} bytes.")
+    upload = StagedUpload.objects.create(
+        owner=user, filename=os.path.basename(filename)[:255], size=size,
+        sha256=(sha256 or '').lower(), expires_at=timezone.now() + _ttl(),
+    )
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    open(staging_path(upload.pk), 'wb').close()
+    return upload
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while block := file.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_chunk(upload, offset, length):
+    if upload.completed:
+        raise ValueError("Upload já concluído.")
+    if offset != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if offset + length > upload.size:
+        raise ValueError("O bloco ultrapassa o tamanho declarado do arquivo.")
+
+
+def _receive(stream, length):
+    """Lê até `length` bytes de `stream` para um arquivo temporário. Devolve (arquivo, recebidos, sha256)."""
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    digest = hashlib.sha256()
+    received = 0
+    while received < length:
+        block = stream.read(min(BLOCK_SIZE, length - received))
+        if not block:
+            break
+        buffer.write(block)
+        digest.update(block)
+        received += len(block)
+    buffer.seek(0)
+    return buffer, received, digest.hexdigest()
+
+
+def append_chunk(upload_id, user, offset, stream, length, checksum=None):
+    """
+    Grava `length` bytes de `stream` a partir de `offset`. Com `checksum` (SHA-256 do
+    bloco) um bloco corrompido é descartado; sem ele, um envio interrompido conta o
+    que chegou. O último bloco confere o SHA-256 do arquivo inteiro, se informado.
+    O bloco é lido da rede antes de travar a linha; só a conferência do offset e a
+    gravação no arquivo ficam sob o lock, e dois envios do mesmo upload se serializam.
+    Devolve (upload, checksum_ok); com False o arquivo foi zerado e deve ser reenviado.
+    """
+    if length > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise ValueError(f"Bloco maior que o limite de {settings.UPLOAD_MAX_CHUNK_SIZE} bytes.")
+    # Conferência sem lock: evita ler da rede um bloco que seria recusado
+    _check_chunk(active(user).get(pk=upload_id), offset, length)
+
+    buffer, received, chunk_sha256 = _receive(stream, length)
+    with buffer:
+        if checksum and (received != length or chunk_sha256 != checksum.lower()):
+            raise ValueError("Checksum do bloco não confere; reenvie o bloco.")
+
+        with transaction.atomic():
+            upload = active(user).select_for_update().get(pk=upload_id)
+            _check_chunk(upload, offset, received)
+            with open(staging_path(upload.pk), 'r+b') as file:
+                file.seek(offset)
+                shutil.copyfileobj(buffer, file, BLOCK_SIZE)
+                file.truncate(offset + received)
+
+            upload.offset = offset + received
+            upload.expires_at = timezone.now() + _ttl()
+            if upload.offset == upload.size:
+                sha256 = _file_sha256(staging_path(upload.pk))
+                if upload.sha256 and sha256 != upload.sha256:
+                    # Arquivo inteiro corrompido: recomeça do zero com o mesmo id
+                    open(staging_path(upload.pk), 'wb').close()
+                    upload.offset = 0
+                    upload.save(update_fields=['offset', 'expires_at'])
+                    return upload, False
+                upload.sha256 = sha256
+                upload.completed = True
+            upload.save(update_fields=['offset', 'expires_at', 'sha256', 'completed'])
+    return upload, True
+
+
+def discard(upload):
+    upload.delete()
+    _remove(upload.pk)
+
+
+# --- USO NO CREATE-BATCH ---
+
+def _is_uuid(value):
+    try:
+        return str(uuid.UUID(value)) == value.lower()
+    except ValueError:
+        return False
+
+
+def open_staged(upload_ids, user):
+    """
+    {id: File} dos uploads concluídos de `user`. Os arquivos são copiados em blocos
+    pelo storage, então o upload continua disponível se o lote falhar e o cliente
+    pode repetir o create-batch sem reenviar nada.
+    """
+    upload_ids = [str(pk) for pk in upload_ids if pk]
+    if not upload_ids:
+        return {}
+    if len(set(upload_ids)) != len(upload_ids):
+        # Cada campo lê o próprio arquivo (em paralelo na gravação)
+        raise ValueError("O mesmo upload foi usado em mais de um campo.")
+    upload_ids = set(upload_ids)
+    valid = {pk for pk in upload_ids if _is_uuid(pk)}
+    uploads = {str(upload.pk): upload for upload in active(user).filter(pk__in=valid, completed=True)}
+    missing = upload_ids - set(uploads)
+    if missing:
+        raise ValueError(f"Upload inexistente, expirado ou incompleto: {', '.join(sorted(missing))}")
+    return {pk: File(open(staging_path(upload.pk), 'rb'), name=upload.filename) for pk, upload in uploads.items()}
+
+
+def close_staged(files, consumed=False):
+    """Fecha os arquivos abertos por open_staged; com `consumed`, remove os uploads."""
+    for file in files.values():
+        file.close()
+    if consumed and files:
+        StagedUpload.objects.filter(pk__in=list(files)).delete()
+        for upload_id in files:
+            _remove(upload_id)
+
+
+# --- EXPIRAÇÃO ---
+
+def purge_expired(now=None):
+    """Remove uploads vencidos e arquivos sem registro. Devolve quantos uploads saíram."""
+    now = now or timezone.now()
+    expired = list(StagedUpload.objects.filter(expires_at__lte=now).values_list('pk', flat=True))
+    StagedUpload.objects.filter(pk__in=expired).delete()
+    for upload_id in expired:
+        _remove(upload_id)
+
+    directory = settings.UPLOAD_STAGING_DIR
+    if os.path.isdir(directory):
+        known = {f'{pk}.part' for pk in StagedUpload.objects.values_list('pk', flat=True)}
+        cutoff = (now - _ttl()).timestamp()
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            # Arquivo recém-criado pode ainda não ter o registro commitado
+            if filename not in known and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+    return len(expired)
@@ -1,14 +1,26 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ItemProcessingViewSet, LocationViewSet, PhysicalControlViewSet
-from .views import list_users
+from .views import (
+    ItemProcessingViewSet, LocationViewSet, MovementEventViewSet, PhysicalControlViewSet, StagedUploadViewSet,
+)
+from .views import create_batch, events, export_items, export_processing, list_users, search, stats
 
 router = DefaultRouter()
-router.register(r'locations', LocationViewSet)
-router.register(r'items', PhysicalControlViewSet)
-router.register(r'processing', ItemProcessingViewSet)
+# basename = prefixo da URL; vira o nome da rota nas métricas (items-list, processing-detail...)
+router.register(r'locations', LocationViewSet, basename='locations')
+router.register(r'items', PhysicalControlViewSet, basename='items')
+router.register(r'processing', ItemProcessingViewSet, basename='processing')
+router.register(r'movements', MovementEventViewSet, basename='movements')
+router.register(r'uploads', StagedUploadViewSet, basename='uploads')
 
 urlpatterns = [
     path('users/', list_users, name='list_users'),
+    path('search/', search, name='search'),
+    path('stats/', stats, name='stats'),
+    path('events/', events, name='events'),
+    # Views async; precisam vir antes do router (que leria "export" como pk)
+    path('items/create-batch/', create_batch, name='items-create-batch'),
+    path('items/export/', export_items, name='items-export'),
+    path('processing/export/', export_processing, name='processing-export'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,76 +1,450 @@
-from django.db import transaction
-from django.contrib.auth.models import User
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from .models import Location, PhysicalControl, ItemProcessing
-from .serializers import LocationSerializer, PhysicalControlSerializer, UserSimpleSerializer, ItemProcessingSerializer
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from .events import hub, stream_events
+from .exports import EXPORT_FORMATS, ITEM_COLUMNS, PROCESSING_COLUMNS, export_response
+from .filters import filter_changes, filter_items, filter_movements, filter_processing
+from .models import Location, MovementEvent, PhysicalControl, ItemProcessing, StagedUpload
+from .pagination import KeysetPagination, MovementPagination, RankedPagination
+from .serializers import (
+    BulkStatusSerializer,
+    BulkTransferSerializer,
+    ItemProcessingSerializer,
+    LocationSerializer,
+    MovementEventSerializer,
+    PhysicalControlSerializer,
+    SearchResultSerializer,
+    StagedUploadSerializer,
+)
+from .reference import LOCATIONS, USERS, cached_list_response, locations_queryset
+from .services import create_items_batch, set_processing_status, transfer_items
+from .stats import dashboard_stats
+from .uploads import OffsetMismatch, active, append_chunk, close_staged, create_upload, discard, open_staged
+
+def _natural_key(value):
+    # "2" < "10" e números antes de letras
+    return (0, int(value), '') if value.isdigit() else (1, 0, value)
 
 class LocationViewSet(viewsets.ModelViewSet):
-    queryset = Location.objects.all()
+    queryset = locations_queryset()
     serializer_class = LocationSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        if self.action == 'map':
+            # Não serializa os responsáveis
+            return Location.objects.all()
+        return super().get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        return cached_list_response(request, LOCATIONS)
+
+    @action(detail=True, methods=['GET'])
+    def map(self, request, pk=None):
+        """
+        Ocupação por posição (armário/prateleira/vão) agregada no banco. Os itens de um
+        vão são buscados depois em /api/physical-control/items/?location=&closet=&shelf=&slot=.
+        """
+        location = self.get_object()
+        rows = PhysicalControl.objects.filter(location=location).values(
+            'closet', 'shelf', 'slot'
+        ).annotate(items=Count('id'), quantity=Sum('quantity')).order_by()
+
+        slots, unmapped = [], 0
+        for row in rows:
+            if not row['closet']:
+                unmapped += row['items']
+            else:
+                slots.append(row)
+        slots.sort(key=lambda r: tuple(_natural_key(r[f]) for f in ('closet', 'shelf', 'slot')))
+
+        return Response({
+            'location': location.id,
+            'name': location.name,
+            'total_items': unmapped + sum(row['items'] for row in slots),
+            'unmapped': unmapped,
+            'slots': slots,
+        })
+
 class PhysicalControlViewSet(viewsets.ModelViewSet):
-    queryset = PhysicalControl.objects.all().order_by('-created_at')
+    queryset = PhysicalControl.objects.for_api().order_by('-created_at')
     serializer_class = PhysicalControlSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_items(queryset, self.request.query_params)
+        return queryset
 
-    @action(detail=False, methods=['POST'], url_path='create-batch')
-    def create_batch(self, request):
+    @action(detail=True, methods=['GET'])
+    def history(self, request, pk=None):
+        item = self.get_object()
+        serializer = MovementEventSerializer(item.movements.all(), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['POST'], url_path='bulk-transfer')
+    def bulk_transfer(self, request):
+        """Move vários itens (palete, armário) para o mesmo local/posição, com histórico de cada um."""
+        serializer = BulkTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
         try:
-            with transaction.atomic():
-                nf_common = {
-                    'nf_number': request.data.get('nf_number') or "S/NF",
-                    'receipt_date': request.data.get('receipt_date'),
-                    'sender': request.data.get('sender'),
-                    'nf_notes': request.data.get('general_notes'),
-                    'nf_file': request.FILES.get('nf_file'),
-                    'current_responsible': request.user
-                }
-                index = 0
-                created_ids = []
-                while f'items[{index}][product]' in request.data:
-                    p = f'items[{index}]'
-                    item = PhysicalControl.objects.create(
-                        **nf_common,
-                        product=request.data.get(f'{p}[product]'),
-                        quantity=request.data.get(f'{p}[quantity]', 1),
-                        location_id=request.data.get(f'{p}[location]'),
-                        physical_location=request.data.get(f'{p}[physical_location]'),
-                        item_notes=request.data.get(f'{p}[notes]'),
-                        photo_top=request.FILES.get(f'{p}[photo_top]'),
-                        photo_front=request.FILES.get(f'{p}[photo_front]'),
-                        photo_side=request.FILES.get(f'{p}[photo_side]'),
-                        photo_iso=request.FILES.get(f'{p}[photo_iso]'),
-                    )
-                    created_ids.append(item.control_id)
-                    index += 1
-                return Response({"ids": created_ids}, status=status.HTTP_201_CREATED)
-        except Exception as e:
+            moved, unchanged = transfer_items(data['items'], data['location'], data.get('physical_location'))
+        except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'moved': moved, 'unchanged': unchanged})
+
+class MovementEventViewSet(viewsets.ReadOnlyModelViewSet):
+    """Consulta global de movimentações, filtrável por local, item, ação e período."""
+    queryset = MovementEvent.objects.select_related('item', 'location', 'responsible').only(
+        'id', 'item__control_id', 'timestamp', 'action', 'physical_location',
+        'location__name', 'responsible__username', 'responsible__first_name', 'responsible__last_name',
+    )
+    serializer_class = MovementEventSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = MovementPagination
+
+    def get_queryset(self):
+        return filter_movements(super().get_queryset(), self.request.query_params)
 
 class ItemProcessingViewSet(viewsets.ModelViewSet):
-    queryset = ItemProcessing.objects.all().order_by('-updated_at')
+    queryset = ItemProcessing.objects.for_api().order_by('-updated_at')
     serializer_class = ItemProcessingSerializer
+    # Feed incremental: máximo de linhas por resposta e atraso para esperar commits em andamento
+    changes_page_size = 500
+    changes_settle = timedelta(seconds=2)
     
     def get_permissions(self):
         if self.action in ['retrieve', 'partial_update']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_processing(queryset, self.request.query_params, self.request.user)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if 'since' in request.query_params:
+            return self.changes(request)
+        return super().list(request, *args, **kwargs)
+
+    def changes(self, request):
+        """
+        ?since=<updated_at>&since_id=<id>: só o que mudou desde o último sync, em ordem
+        crescente. O cliente guarda since/since_id da resposta e repete enquanto has_more.
+        Com ?status= um item que saiu do filtro não volta no feed; para espelhar a fila,
+        sincronize sem status e filtre localmente.
+        """
+        queryset = filter_changes(self.get_queryset(), request.query_params)
+        if queryset is None:
+            return Response({"error": "Parâmetro 'since' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+        # Linhas muito recentes ficam para o próximo sync: uma transação ainda aberta pode
+        # gravar um updated_at anterior ao último já entregue
+        queryset = queryset.filter(updated_at__lte=timezone.now() - self.changes_settle)
+
+        rows = list(queryset[:self.changes_page_size + 1])
+        has_more = len(rows) > self.changes_page_size
+        rows = rows[:self.changes_page_size]
+        if rows:
+            since, since_id = rows[-1].updated_at.isoformat(), rows[-1].id
+        else:
+            since, since_id = request.query_params['since'], request.query_params.get('since_id')
+        return Response({
+            'results': self.get_serializer(rows, many=True).data,
+            'since': since,
+            'since_id': since_id,
+            'has_more': has_more,
+        })
+
+    @action(detail=False, methods=['POST'])
+    def claim(self, request):
+        """Reserva o próximo item pendente para o operador logado (204 se a fila está vazia)."""
+        timeout = timedelta(minutes=settings.PROCESSING_CLAIM_TIMEOUT_MINUTES)
+        pk = ItemProcessing.claim_next(request.user, stale_after=timeout)
+        if pk is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        instance = ItemProcessing.objects.for_api().get(pk=pk)
+        return Response(self.get_serializer(instance).data)
+
+    @action(detail=True, methods=['POST'])
+    def release(self, request, pk=None):
+        """Devolve à fila um item "Em andamento" (quem reservou ou staff)."""
+        instance = self.get_object()
+        if instance.status != ItemProcessing.Status.IN_PROGRESS:
+            return Response({"error": "Item não está em andamento."}, status=status.HTTP_409_CONFLICT)
+        if instance.claimed_by_id != request.user.id and not request.user.is_staff:
+            return Response({"error": "Reservado por outro operador."}, status=status.HTTP_403_FORBIDDEN)
+        instance.status = ItemProcessing.Status.PENDING
+        instance.claimed_by = None
+        instance.claimed_at = None
+        instance.save(update_fields=['status', 'claimed_by', 'claimed_at', 'updated_at'])
+        return Response(self.get_serializer(instance).data)
+
+    @action(detail=False, methods=['POST'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """Muda o status de vários processamentos; concluídos e reservas de outros são ignorados."""
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            updated, skipped = set_processing_status(
+                data['ids'], data['status'], request.user, data.get('observation'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'updated': updated, 'skipped': skipped})
+
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.status == "Concluído":
+        if instance.status == ItemProcessing.Status.DONE:
             return Response({"error": "Já finalizado."}, status=status.HTTP_403_FORBIDDEN)
         return super().partial_update(request, *args, **kwargs)
 
+class StagedUploadViewSet(viewsets.GenericViewSet):
+    """
+    Upload retomável (uploads.py). POST cria {filename, size, sha256?}; PATCH envia um
+    bloco cru com Upload-Offset (e Upload-Checksum, o SHA-256 do bloco, opcional); GET
+    devolve o offset para retomar. O id concluído vai no create-batch no lugar do arquivo.
+    """
+    serializer_class = StagedUploadSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = '[0-9a-fA-F-]{36}'
+
+    def get_queryset(self):
+        return active(self.request.user)
+
+    def offset_response(self, upload, status_code=status.HTTP_200_OK):
+        return Response(self.get_serializer(upload).data, status=status_code, headers={'Upload-Offset': str(upload.offset)})
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = create_upload(request.user, **serializer.validated_data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self.offset_response(upload, status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return self.offset_response(self.get_object())
+
+    def partial_update(self, request, pk=None):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response({"error": "Informe o cabeçalho Upload-Offset."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload, checksum_ok = append_chunk(
+                pk, request.user, offset, request.stream, length, request.headers.get('Upload-Checksum'),
+            )
+        except StagedUpload.DoesNotExist:
+            return Response({"error": "Upload inexistente ou expirado."}, status=status.HTTP_404_NOT_FOUND)
+        except OffsetMismatch as e:
+            return Response({"error": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT,
+                            headers={'Upload-Offset': str(e.offset)})
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not checksum_ok:
+            return Response(
+                {"error": "SHA-256 do arquivo não confere; reenvie desde o início.", "offset": 0},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY, headers={'Upload-Offset': '0'},
+            )
+        return self.offset_response(upload)
+
+    def destroy(self, request, pk=None):
+        discard(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 @api_view(['GET'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def list_users(request):
-    users = User.objects.all().order_by('username')
-    serializer = UserSimpleSerializer(users, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    return cached_list_response(request, USERS)
+
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def search(request):
+    """
+    Busca por produto, remetente, NF, observações e ID de controle (?q=), ranqueada e
+    paginada (?page=). Aceita os mesmos filtros da listagem de itens.
+    """
+    text = (request.query_params.get('q') or '').strip()
+    if len(text) < 2:
+        return Response({"detail": "Informe ao menos 2 caracteres em 'q'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = filter_items(PhysicalControl.objects.all(), request.query_params)
+    queryset = queryset.search(text).select_related('location', 'processing', 'invoice').only(
+        'control_id', 'product', 'sender', 'nf_number', 'receipt_date', 'quantity',
+        'physical_location', 'location__name', 'processing__status', 'invoice__file',
+    )
+    paginator = RankedPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = SearchResultSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def stats(request):
+    """Contadores do dashboard, lidos da tabela de rollup (tamanho fixo, não varre o inventário)."""
+    return Response(dashboard_stats())
+
+async def events(request):
+    """
+    Server-Sent Events com as mudanças de itens e processamentos (requer o servidor
+    ASGI). O EventSource do navegador não envia cabeçalhos, então o access token
+    JWT também é aceito em ?token=.
+    """
+    raw = request.GET.get('token')
+    header = request.headers.get('Authorization', '')
+    if not raw and header.startswith('Bearer '):
+        raw = header[len('Bearer '):]
+    try:
+        AccessToken(raw or '')
+    except TokenError:
+        return JsonResponse({"detail": "Token inválido ou expirado."}, status=401)
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI o stream infinito prenderia um worker inteiro
+        return JsonResponse({"detail": "Stream de eventos disponível apenas no servidor ASGI."}, status=501)
+
+    subscription = hub.subscribe()
+    if not await hub.wait_listening():
+        subscription.close()
+        response = JsonResponse({"detail": "Stream de eventos indisponível no momento."}, status=503)
+        response['Retry-After'] = '5'
+        return response
+    response = StreamingHttpResponse(stream_events(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Desliga o buffer do nginx para o evento sair na hora
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# --- VIEWS ASYNC (upload e exportação) ---
+# Sob o servidor ASGI o corpo do upload é recebido pelo event loop e o trabalho síncrono
+# (parse, gravação dos arquivos, ORM) roda na thread da própria requisição, então um
+# upload lento não prende o worker. As exportações devolvem iteradores async.
+
+def _authenticated(request):
+    """
+    Request do DRF (autenticação e parsers padrão) para views fora do APIView.
+    Devolve (request, None) ou (None, resposta de erro).
+    """
+    api_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = api_request.user
+    except APIException as exc:
+        return None, JsonResponse({"detail": exc.detail}, status=exc.status_code)
+    if not user.is_authenticated:
+        return None, JsonResponse({"detail": NotAuthenticated.default_detail}, status=NotAuthenticated.status_code)
+    return api_request, None
+
+def _create_batch(request):
+    request, denied = _authenticated(request)
+    if denied:
+        return denied
+    # Arquivos enviados antes pelo upload retomável: "<campo>_upload" com o id no lugar do arquivo
+    upload_ids = [value for key, value in request.data.items() if key.endswith(('_upload', '_upload]'))]
+    try:
+        staged = open_staged(upload_ids, request.user)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def upload(field):
+        if field in request.FILES:
+            return request.FILES[field]
+        key = f'{field[:-1]}_upload]' if field.endswith(']') else f'{field}_upload'
+        return staged.get(request.data.get(key))
+
+    try:
+        nf_common = {
+            'nf_number': request.data.get('nf_number') or "S/NF",
+            'receipt_date': request.data.get('receipt_date'),
+            'sender': request.data.get('sender'),
+            'nf_notes': request.data.get('general_notes'),
+            'nf_file': upload('nf_file'),
+            'current_responsible': request.user
+        }
+        index = 0
+        rows = []
+        while f'items[{index}][product]' in request.data:
+            p = f'items[{index}]'
+            rows.append({
+                'product': request.data.get(f'{p}[product]'),
+                'quantity': request.data.get(f'{p}[quantity]', 1),
+                'location_id': request.data.get(f'{p}[location]'),
+                'physical_location': request.data.get(f'{p}[physical_location]'),
+                'item_notes': request.data.get(f'{p}[notes]'),
+                'photo_top': upload(f'{p}[photo_top]'),
+                'photo_front': upload(f'{p}[photo_front]'),
+                'photo_side': upload(f'{p}[photo_side]'),
+                'photo_iso': upload(f'{p}[photo_iso]'),
+            })
+            index += 1
+        items = create_items_batch(nf_common, rows)
+    except Exception as e:
+        # Os uploads continuam disponíveis para repetir o lote
+        close_staged(staged)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    close_staged(staged, consumed=True)
+    return JsonResponse({"ids": [item.control_id for item in items]}, status=status.HTTP_201_CREATED)
+
+@csrf_exempt
+@require_POST
+async def create_batch(request):
+    return await sync_to_async(_create_batch)(request)
+
+def _export(request, build_queryset, columns, basename):
+    api_request, denied = _authenticated(request)
+    if denied:
+        return denied
+    file_format = api_request.query_params.get('file_format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": "Formato inválido."}, status=status.HTTP_400_BAD_REQUEST)
+    queryset = build_queryset(api_request)
+    return export_response(
+        queryset, columns, basename, file_format, asynchronous=isinstance(request, ASGIRequest)
+    )
+
+def _items_export_queryset(request):
+    return filter_items(PhysicalControl.objects.all(), request.query_params).order_by('-created_at', '-id')
+
+def _processing_export_queryset(request):
+    queryset = filter_processing(ItemProcessing.objects.all(), request.query_params, request.user)
+    return queryset.order_by('-updated_at', '-id')
+
+@require_GET
+async def export_items(request):
+    """Exporta o inventário filtrado em CSV (padrão) ou XLSX via ?file_format=."""
+    return await sync_to_async(_export)(request, _items_export_queryset, ITEM_COLUMNS, 'inventario')
+
+@require_GET
+async def export_processing(request):
+    return await sync_to_async(_export)(request, _processing_export_queryset, PROCESSING_COLUMNS, 'processamento')
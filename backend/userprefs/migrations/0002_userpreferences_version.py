@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+# jsonb_set só cria a última chave do caminho; esta versão cria os objetos
+# intermediários que faltarem (ex.: set em ["tables", "items", "columns"]).
+CREATE_JSONB_SET_DEEP = """
+CREATE OR REPLACE FUNCTION userprefs_jsonb_set_deep(target jsonb, path text[], val jsonb)
+RETURNS jsonb AS $$
+DECLARE
+    base jsonb := CASE WHEN jsonb_typeof(target) = 'object' THEN target ELSE '{}'::jsonb END;
+BEGIN
+    IF cardinality(path) = 0 THEN
+        RETURN val;
+    END IF;
+    IF cardinality(path) = 1 THEN
+        RETURN base || jsonb_build_object(path[1], val);
+    END IF;
+    RETURN base || jsonb_build_object(
+        path[1], userprefs_jsonb_set_deep(base -> path[1], path[2:], val)
+    );
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+"""
+
+DROP_JSONB_SET_DEEP = "DROP FUNCTION IF EXISTS userprefs_jsonb_set_deep(jsonb, text[], jsonb);"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprefs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpreferences',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunSQL(CREATE_JSONB_SET_DEEP, DROP_JSONB_SET_DEEP),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_from_first_superuser(apps, schema_editor):
+    # As configurações globais eram as preferências do superusuário de menor id
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserPreferences = apps.get_model('userprefs', 'UserPreferences')
+    SystemPreferences = apps.get_model('userprefs', 'SystemPreferences')
+
+    data = {}
+    admin = User.objects.filter(is_superuser=True).order_by('id').first()
+    if admin is not None:
+        prefs = UserPreferences.objects.filter(user=admin).first()
+        if prefs is not None and isinstance(prefs.data, dict):
+            data = prefs.data
+    SystemPreferences.objects.update_or_create(pk=1, defaults={'data': data})
+
+
+def copy_to_first_superuser(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserPreferences = apps.get_model('userprefs', 'UserPreferences')
+    SystemPreferences = apps.get_model('userprefs', 'SystemPreferences')
+
+    system = SystemPreferences.objects.filter(pk=1).first()
+    admin = User.objects.filter(is_superuser=True).order_by('id').first()
+    if system is None or admin is None:
+        return
+    prefs, _ = UserPreferences.objects.get_or_create(user=admin, defaults={'data': {}})
+    current = prefs.data if isinstance(prefs.data, dict) else {}
+    current.update(system.data or {})
+    prefs.data = current
+    prefs.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprefs', '0002_userpreferences_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemPreferences',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'System preferences',
+                'verbose_name_plural': 'System preferences',
+            },
+        ),
+        migrations.RunPython(copy_from_first_superuser, copy_to_first_superuser),
+    ]
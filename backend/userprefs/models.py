@@ -1,5 +1,52 @@
+import json
+
 from django.conf import settings
-from django.db import models
+from django.db import connection, models
+
+
+def _patch_row(table, key_column, key, merge, ops, expected_version):
+    """Monta e executa o UPDATE ... RETURNING compartilhado pelas preferências."""
+    expression = "COALESCE(data, '{}'::jsonb)"
+    params = []
+    if merge:
+        expression = f"({expression} || %s::jsonb)"
+        params.append(json.dumps(merge))
+    for op in ops or []:
+        if op['op'] == 'delete':
+            expression = f"({expression} #- %s::text[])"
+            params.append(list(op['path']))
+        else:
+            expression = f"userprefs_jsonb_set_deep({expression}, %s::text[], %s::jsonb)"
+            params.extend([list(op['path']), json.dumps(op.get('value'))])
+
+    sql = (
+        f"UPDATE {table} SET data = {expression}, version = version + 1, updated_at = NOW() "
+        f"WHERE {key_column} = %s"
+    )
+    params.append(key)
+    if expected_version is not None:
+        sql += " AND version = %s"
+        params.append(expected_version)
+    sql += " RETURNING data, version"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    data, version = row
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data, version
+
+
+class PreferencesConflict(Exception):
+    """A versão enviada pelo cliente não é mais a versão gravada."""
+
+    def __init__(self, data, version):
+        super().__init__(f"Preferências alteradas (versão atual {version}).")
+        self.data = data
+        self.version = version
 
 class UserPreferences(models.Model):
     user = models.OneToOneField(
@@ -8,9 +55,77 @@ class UserPreferences(models.Model):
         related_name="preferences"
     )
     data = models.JSONField(default=dict, blank=True)
+    # Incrementada a cada alteração; usada para controle otimista (409 em conflito)
+    version = models.PositiveIntegerField(default=1)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"UserPreferences(user_id={self.user_id})"
\ No newline at end of file
+        return f"UserPreferences(user_id={self.user_id})"
+
+    @classmethod
+    def apply_patch(cls, user_id, merge=None, ops=None, expected_version=None):
+        """
+        Aplica a alteração direto no banco, num único UPDATE ... RETURNING, sem
+        ler-modificar-gravar em Python: requisições concorrentes não perdem chaves.
+
+        - merge: dict mesclado no primeiro nível (data || merge)
+        - ops: [{"op": "set"|"delete", "path": ["a", "b"], "value": ...}] em caminhos aninhados
+        - expected_version: se informado, só grava se a versão ainda for essa
+
+        Devolve (data, version) ou None se o usuário ainda não tem registro.
+        Levanta PreferencesConflict quando expected_version não confere.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        row = _patch_row(table, 'user_id', user_id, merge, ops, expected_version)
+        if row is None:
+            current = cls.objects.filter(user_id=user_id).values_list('data', 'version').first()
+            if current is None:
+                return None
+            raise PreferencesConflict(*current)
+        return row
+
+
+class SystemPreferences(models.Model):
+    """
+    Configurações globais do sistema (registro único, id=1). Antes ficavam nas
+    preferências do primeiro superusuário.
+    """
+    SINGLETON_ID = 1
+
+    data = models.JSONField(default=dict, blank=True)
+    # Incrementada a cada alteração; serve de carimbo para o cache local dos workers
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "System preferences"
+        verbose_name_plural = "System preferences"
+
+    def __str__(self):
+        return f"SystemPreferences(version={self.version})"
+
+    def save(self, *args, **kwargs):
+        self.pk = self.SINGLETON_ID
+        if not self._state.adding:
+            self.version += 1
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def load(cls):
+        obj, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID, defaults={"data": {}})
+        return obj
+
+    @classmethod
+    def apply_patch(cls, merge=None, ops=None, expected_version=None):
+        """Mesma semântica de UserPreferences.apply_patch, sobre o registro único."""
+        table = connection.ops.quote_name(cls._meta.db_table)
+        row = _patch_row(table, 'id', cls.SINGLETON_ID, merge, ops, expected_version)
+        if row is None:
+            current = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('data', 'version').first()
+            if current is None:
+                cls.load()
+                return cls.apply_patch(merge, ops, expected_version)
+            raise PreferencesConflict(*current)
+        return row
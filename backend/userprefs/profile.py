@@ -0,0 +1,97 @@
+import hashlib
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserPreferences
+
+# O perfil de /api/user/me fica em cache por usuário. A chave inclui dois carimbos: um
+# global, trocado quando grupos/permissões mudam (afeta vários usuários de uma vez), e
+# um do usuário. Os carimbos são lidos antes de montar o perfil e nunca se repetem
+# (tempo em µs), então um cálculo concorrente com dados antigos grava numa chave que
+# ninguém mais lê, em vez de sobrescrever a invalidação.
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
+PROFILE_VERSION_KEY = 'user_profile:version'
+
+
+def _user_version_key(user_id):
+    return f'user_profile:version:{user_id}'
+
+
+def _new_stamp():
+    return time.time_ns() // 1000
+
+
+def _stamps(user_id):
+    keys = [PROFILE_VERSION_KEY, _user_version_key(user_id)]
+    stamps = cache.get_many(keys)
+    if len(stamps) < len(keys):
+        # Cache vazio (reinício/limpeza): começa carimbos novos
+        for key in keys:
+            if key not in stamps:
+                cache.add(key, _new_stamp(), None)
+        stamps = cache.get_many(keys)
+    return tuple(stamps.get(key) for key in keys)
+
+
+def _key(user_id, stamps):
+    return f'user_profile:{stamps[0]}:{stamps[1]}:{user_id}'
+
+
+def _bump(*keys):
+    """Troca os carimbos agora e de novo no commit (leitura concorrente antes do commit)."""
+    def bump():
+        now = _new_stamp()
+        cache.set_many({key: now for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def build_profile(user):
+    prefs_obj, _ = UserPreferences.objects.get_or_create(
+        user=user,
+        defaults={"data": {}}
+    )
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name or user.username,
+        'last_name': user.last_name or "",
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'permissions': sorted(user.get_all_permissions()),
+        'groups': list(user.groups.values_list('name', flat=True)),
+        'preferences': prefs_obj.data or {}
+    }
+
+
+def get_profile_entry(user_id):
+    """
+    Devolve {'etag', 'data'} do cache; só consulta o banco na primeira vez (ou após
+    invalidação). Retorna None se o usuário não existe ou está inativo.
+    """
+    key = _key(user_id, _stamps(user_id))
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return None
+    data = build_profile(user)
+    raw = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    entry = {'etag': f'"{hashlib.sha1(raw).hexdigest()}"', 'data': data}
+    cache.set(key, entry, PROFILE_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate_profile(user_id):
+    _bump(_user_version_key(user_id))
+
+
+def invalidate_all_profiles():
+    _bump(PROFILE_VERSION_KEY)
@@ -1,10 +1,56 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from .models import UserPreferences
+from .models import SystemPreferences, UserPreferences
+from .profile import invalidate_all_profiles, invalidate_profile
+from .system import invalidate_system_preferences
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def ensure_user_preferences(sender, instance, created, **kwargs):
     if created:
         UserPreferences.objects.create(user=instance, data={})
+
+# --- INVALIDAÇÃO DO PERFIL EM CACHE (/api/user/me) ---
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.pk)
+
+@receiver(post_save, sender=UserPreferences)
+@receiver(post_delete, sender=UserPreferences)
+def invalidate_preferences_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_membership_profile(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Alterado pelo lado do grupo/permissão: vários usuários afetados
+        invalidate_all_profiles()
+    else:
+        invalidate_profile(instance.pk)
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_all_profiles()
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_group_profiles(sender, **kwargs):
+    invalidate_all_profiles()
+
+# --- CONFIGURAÇÕES GLOBAIS ---
+
+@receiver(post_save, sender=SystemPreferences)
+@receiver(post_delete, sender=SystemPreferences)
+def invalidate_system_cache(sender, **kwargs):
+    # Edição via ORM/admin; o PATCH da API já publica a versão nova sozinho
+    invalidate_system_preferences()
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+
+from .models import SystemPreferences
+
+# As configurações globais ficam em memória em cada worker. A versão gravada no banco
+# é publicada no cache compartilhado; cada requisição só compara esse número com a
+# cópia local e recarrega o registro quando outro worker alterou as configurações.
+SYSTEM_VERSION_KEY = 'system_preferences:version'
+
+# (version, data) da última leitura neste processo
+_local = None
+
+
+def _shared_version():
+    version = cache.get(SYSTEM_VERSION_KEY)
+    if version is None:
+        # Cache compartilhado vazio (reinício/limpeza): consulta só a coluna version
+        version = SystemPreferences.objects.filter(pk=SystemPreferences.SINGLETON_ID).values_list(
+            'version', flat=True
+        ).first()
+        if version is None:
+            version = SystemPreferences.load().version
+        cache.add(SYSTEM_VERSION_KEY, version, None)
+    return version
+
+
+def _publish(version, data):
+    global _local
+    _local = (version, data)
+    cache.set(SYSTEM_VERSION_KEY, version, None)
+
+
+def get_system_preferences():
+    """Devolve (data, version), indo ao banco só quando a versão publicada mudou."""
+    global _local
+    version = _shared_version()
+    if _local is not None and _local[0] == version:
+        return _local[1], version
+
+    prefs = SystemPreferences.load()
+    _local = (prefs.version, prefs.data or {})
+    if prefs.version != version:
+        cache.set(SYSTEM_VERSION_KEY, prefs.version, None)
+    return _local[1], prefs.version
+
+
+def patch_system_preferences(merge=None, ops=None, expected_version=None):
+    data, version = SystemPreferences.apply_patch(merge, ops, expected_version)
+    _publish(version, data)
+    return data, version
+
+
+def invalidate_system_preferences():
+    global _local
+    _local = None
+    cache.delete(SYSTEM_VERSION_KEY)
@@ -1,3 +1,226 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import profile, system
+from .models import SystemPreferences, UserPreferences
+
+
+class UserProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ana', password='x', first_name='Ana')
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_me(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/user/me/', **headers)
+
+    def test_unchanged_profile_returns_304_without_queries(self):
+        first = self.get_me()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['first_name'], 'Ana')
+
+        with self.assertNumQueries(0):
+            second = self.get_me(first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        with self.assertNumQueries(0):
+            cached = self.get_me()
+        self.assertEqual(cached.data, first.data)
+
+    def test_preferences_change_invalidates(self):
+        etag = self.get_me()['ETag']
+        prefs = UserPreferences.objects.get(user=self.user)
+        prefs.data = {'theme': 'dark'}
+        prefs.save()
+
+        response = self.get_me(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['preferences'], {'theme': 'dark'})
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_group_and_permission_changes_invalidate(self):
+        etag = self.get_me()['ETag']
+        group = Group.objects.create(name='Engenharia')
+        self.user.groups.add(group)
+        response = self.get_me(etag)
+        self.assertEqual(response.data['groups'], ['Engenharia'])
+
+        permission = Permission.objects.get(codename='view_user')
+        group.permissions.add(permission)
+        response = self.get_me(response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('auth.view_user', response.data['permissions'])
+
+    def test_invalidation_during_build_is_not_lost(self):
+        build_profile = profile.build_profile
+
+        def racing_build(user):
+            data = build_profile(user)
+            # Outra requisição altera o perfil enquanto este ainda está sendo montado
+            profile.invalidate_profile(user.id)
+            profile.invalidate_all_profiles()
+            return data
+
+        with mock.patch.object(profile, 'build_profile', racing_build):
+            profile.get_profile_entry(self.user.id)
+        with CaptureQueriesContext(connection) as ctx:
+            profile.get_profile_entry(self.user.id)
+        self.assertTrue(ctx.captured_queries)
+
+    def test_inactive_user_is_rejected(self):
+        self.get_me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_me().status_code, 401)
+
+
+def auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+class PreferencesPatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='bia', password='x')
+        self.client = auth_client(self.user)
+
+    def patch(self, body, **headers):
+        return self.client.patch('/api/userprefs/me/', body, format='json', **headers)
+
+    def test_legacy_merge_keeps_other_keys(self):
+        UserPreferences.objects.filter(user=self.user).update(data={'theme': 'dark'})
+        response = self.patch({'lang': 'pt', 'is_superuser': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], {'theme': 'dark', 'lang': 'pt'})
+        self.assertEqual(response.data['version'], 2)
+
+    def test_nested_set_and_delete(self):
+        UserPreferences.objects.filter(user=self.user).update(
+            data={'tables': {'items': {'columns': ['a'], 'sort': 'nf'}}}
+        )
+        response = self.patch({'ops': [
+            {'op': 'set', 'path': ['tables', 'items', 'columns'], 'value': ['a', 'b']},
+            {'op': 'delete', 'path': 'tables.items.sort'},
+            {'op': 'set', 'path': ['tables', 'queue', 'page_size'], 'value': 100},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], {'tables': {
+            'items': {'columns': ['a', 'b']},
+            'queue': {'page_size': 100},
+        }})
+
+    def test_stale_version_returns_conflict(self):
+        first = self.patch({'data': {'theme': 'dark'}, 'version': 1})
+        self.assertEqual(first.data['version'], 2)
+
+        stale = self.patch({'data': {'theme': 'light'}}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.data['data'], {'theme': 'dark'})
+        self.assertEqual(stale.data['version'], 2)
+
+    def test_invalid_ops_are_rejected(self):
+        response = self.patch({'ops': [{'op': 'replace', 'path': ['a']}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_invalidates_profile(self):
+        self.client.get('/api/user/me/')
+        self.patch({'theme': 'dark'})
+        self.assertEqual(self.client.get('/api/user/me/').data['preferences'], {'theme': 'dark'})
+
+
+class PreferencesConcurrencyTests(TransactionTestCase):
+    def test_parallel_patches_do_not_lose_keys(self):
+        user = User.objects.create_user(username='carla', password='x')
+        errors = []
+
+        def worker(index):
+            try:
+                response = auth_client(user).patch(
+                    '/api/userprefs/me/', {f'key{index}': index}, format='json'
+                )
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        prefs = UserPreferences.objects.get(user=user)
+        self.assertEqual(prefs.data, {f'key{i}': i for i in range(8)})
+        self.assertEqual(prefs.version, 9)
+
+
+class SystemPreferencesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        system._local = None
+        self.admin = User.objects.create_superuser(username='admin', password='x')
+        self.user = User.objects.create_user(username='davi', password='x')
+        self.client = auth_client(self.user)
+
+    def get_prefs(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/userprefs/preferences/', **headers)
+
+    def test_polling_served_from_worker_memory(self):
+        first = self.get_prefs()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['data'], {})
+
+        # Só a autenticação do JWT toca o banco
+        with self.assertNumQueries(1):
+            second = self.get_prefs()
+        self.assertEqual(second.data, first.data)
+
+        with self.assertNumQueries(1):
+            not_modified = self.get_prefs(first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_superuser_update_changes_etag(self):
+        etag = self.get_prefs()['ETag']
+        forbidden = self.client.post('/api/userprefs/preferences/', {'data': {'x': 1}}, format='json')
+        self.assertEqual(forbidden.status_code, 403)
+
+        response = auth_client(self.admin).post(
+            '/api/userprefs/preferences/', {'data': {'pages': ['drawings']}}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        fresh = self.get_prefs(etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.data['data'], {'pages': ['drawings']})
+        self.assertNotEqual(fresh['ETag'], etag)
+
+    def test_change_from_another_worker_is_picked_up(self):
+        self.get_prefs()
+        # Outro worker: grava no banco e publica a versão, sem tocar a memória deste
+        _, version = SystemPreferences.apply_patch({'theme': 'dark'})
+        cache.set(system.SYSTEM_VERSION_KEY, version, None)
+        self.assertEqual(self.get_prefs().data['data'], {'theme': 'dark'})
+
+    def test_orm_save_invalidates(self):
+        self.get_prefs()
+        prefs = SystemPreferences.load()
+        prefs.data = {'lang': 'pt'}
+        prefs.save()
+        self.assertEqual(self.get_prefs().data['data'], {'lang': 'pt'})
@@ -6,7 +6,9 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth.models import User, Group, Permission
 
-from .models import UserPreferences
+from .models import PreferencesConflict, UserPreferences
+from .profile import invalidate_profile
+from .system import get_system_preferences, patch_system_preferences
 from .serializers import (
     UserPreferencesSerializer, 
     UserAdminSerializer, 
@@ -14,36 +16,106 @@ from .serializers import (
     PermissionSerializer
 )
 
+# --- ALTERAÇÃO ATÔMICA DAS PREFERÊNCIAS ---
+
+# TRAVA DE SEGURANÇA BACKEND: Remove chaves sensíveis e protege contra injeção de campos
+SENSITIVE_KEYS = {
+    'password', 'token', 'refresh', 'access', 'username', 'email', 
+    'is_staff', 'is_superuser', 'id', 'user_id'
+}
+
+class InvalidPatch(Exception):
+    pass
+
+def _normalize_path(path):
+    if isinstance(path, str):
+        path = path.split('.')
+    if not isinstance(path, list) or not path or not all(isinstance(p, str) and p for p in path):
+        raise InvalidPatch("'path' deve ser uma lista de chaves (ou 'a.b.c').")
+    return path
+
+def parse_preferences_patch(request, wrapped_only=False):
+    """
+    Aceita o formato antigo (objeto mesclado no primeiro nível, direto ou em "data")
+    e o novo formato {"ops": [...], "version": N}. A versão também pode vir no If-Match.
+    Devolve (merge, ops, expected_version).
+    """
+    body = request.data
+    if not isinstance(body, dict):
+        raise InvalidPatch("Body must be a JSON object.")
+
+    structured = 'data' in body or 'ops' in body
+    if structured or wrapped_only:
+        merge = body.get('data') or {}
+        ops = body.get('ops') or []
+        version = body.get('version')
+    else:
+        merge, ops, version = body, [], None
+
+    if version is None and request.headers.get('If-Match'):
+        version = request.headers['If-Match'].strip('"')
+    if version is not None:
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            raise InvalidPatch("'version' deve ser um número.")
+
+    if not isinstance(merge, dict):
+        raise InvalidPatch("Body must be a JSON object.")
+    merge = {k: v for k, v in merge.items() if k.lower() not in SENSITIVE_KEYS}
+
+    if not isinstance(ops, list):
+        raise InvalidPatch("'ops' deve ser uma lista.")
+    clean_ops = []
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in ('set', 'delete'):
+            raise InvalidPatch("Cada operação precisa de 'op' = 'set' ou 'delete'.")
+        path = _normalize_path(op.get('path'))
+        if path[0].lower() in SENSITIVE_KEYS:
+            continue
+        if op['op'] == 'set' and 'value' not in op:
+            raise InvalidPatch("Operação 'set' precisa de 'value'.")
+        clean_ops.append({'op': op['op'], 'path': path, 'value': op.get('value')})
+    return merge, clean_ops, version
+
+def patch_preferences(request, apply, wrapped_only=False):
+    """Valida o corpo, chama apply(merge, ops, version) e traduz conflito em 409."""
+    try:
+        merge, ops, version = parse_preferences_patch(request, wrapped_only)
+    except InvalidPatch as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        data, new_version = apply(merge, ops, version)
+    except PreferencesConflict as conflict:
+        return Response(
+            {"detail": str(conflict), "data": conflict.data, "version": conflict.version},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response({"status": "success", "data": data, "version": new_version}, headers={'ETag': f'"{new_version}"'})
+
+def _apply_user_patch(user):
+    def apply(merge, ops, version):
+        result = UserPreferences.apply_patch(user.id, merge, ops, version)
+        if result is None:
+            # Primeiro acesso: cria o registro e aplica de novo
+            UserPreferences.objects.get_or_create(user=user, defaults={"data": {}})
+            result = UserPreferences.apply_patch(user.id, merge, ops, version)
+        # UPDATE direto não dispara post_save: invalida o perfil em cache manualmente
+        invalidate_profile(user.id)
+        return result
+    return apply
+
 # --- PREFERÊNCIAS INDIVIDUAIS ---
 @api_view(["GET", "PATCH", "POST"])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def preferences_me(request):
-    prefs_obj, _ = UserPreferences.objects.get_or_create(user=request.user, defaults={"data": {}})
-
     if request.method == "GET":
-        return Response({"data": prefs_obj.data})
-
-    incoming = request.data.get('data') if 'data' in request.data else request.data
+        prefs_obj, _ = UserPreferences.objects.get_or_create(user=request.user, defaults={"data": {}})
+        return Response({"data": prefs_obj.data, "version": prefs_obj.version}, headers={'ETag': f'"{prefs_obj.version}"'})
 
-    if not isinstance(incoming, dict):
-        return Response({"detail": "Body must be a JSON object."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # TRAVA DE SEGURANÇA BACKEND: Remove chaves sensíveis e protege contra injeção de campos
-    sensitive_keys = {
-        'password', 'token', 'refresh', 'access', 'username', 'email', 
-        'is_staff', 'is_superuser', 'id', 'user_id'
-    }
-    filtered_incoming = {k: v for k, v in incoming.items() if k.lower() not in sensitive_keys}
-
-    # Lógica de Merge Robusta
-    current = prefs_obj.data if isinstance(prefs_obj.data, dict) else {}
-    current.update(filtered_incoming)
-    
-    prefs_obj.data = current
-    prefs_obj.save()
-
-    return Response({"status": "success", "data": prefs_obj.data})
+    return patch_preferences(request, _apply_user_patch(request.user))
 
 # --- VIEWS RESTANTES MANTIDAS SEM ALTERAÇÃO ---
 class UserAdminViewSet(viewsets.ModelViewSet):
@@ -66,27 +138,21 @@ class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 class UserPreferencesView(APIView):
+    """
+    Configurações globais (SystemPreferences), consultadas por todos os clientes.
+    Servidas da memória do worker; o ETag é a versão, então o polling recebe 304.
+    """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def get_system_user(self):
-        return User.objects.filter(is_superuser=True).order_by('id').first()
-
     def get(self, request):
-        system_user = self.get_system_user()
-        if not system_user:
-            return Response({"error": "Admin não encontrado"}, status=404)
-        prefs, _ = UserPreferences.objects.get_or_create(user=system_user)
-        return Response({"data": prefs.data})
+        data, version = get_system_preferences()
+        etag = f'"{version}"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response({"data": data, "version": version}, headers={'ETag': etag})
 
     def post(self, request):
         if not request.user.is_superuser:
             return Response({"detail": "Não autorizado."}, status=status.HTTP_403_FORBIDDEN)
-        system_user = self.get_system_user()
-        prefs, _ = UserPreferences.objects.get_or_create(user=system_user)
-        incoming_data = request.data.get('data', {})
-        current_data = prefs.data if isinstance(prefs.data, dict) else {}
-        current_data.update(incoming_data)
-        prefs.data = current_data
-        prefs.save() 
-        return Response({"status": "success", "data": prefs.data})
\ No newline at end of file
+        return patch_preferences(request, patch_system_preferences, wrapped_only=True)
@@ -5,10 +5,10 @@ import { Tooltip, TooltipContent, TooltipProvider, TooltipTrigger } from "@/comp
 
 interface PhysicalWarehouseMapProps {
   warehouseMap: any;
-  onSelectItem: (item: any) => void;
+  onSelectSlot: (closet: string, shelf: string, slot: string) => void;
 }
 
-export function PhysicalWarehouseMap({ warehouseMap, onSelectItem }: PhysicalWarehouseMapProps) {
+export function PhysicalWarehouseMap({ warehouseMap, onSelectSlot }: PhysicalWarehouseMapProps) {
   return (
     <TooltipProvider>
       {/* Container com scroll horizontal. 
@@ -33,15 +33,14 @@ export function PhysicalWarehouseMap({ warehouseMap, onSelectItem }: PhysicalWar
                   {/* Grade da Prateleira */}
                   <div className="grid grid-cols-4 gap-2 bg-slate-800/40 p-2 rounded-xl border border-white/5">
                     {['A', 'B', 'C', 'D'].map((slotLetter) => {
-                      const itemsInSlot = shelves[shelfNum]?.[slotLetter] || [];
-                      const hasItems = itemsInSlot.length > 0;
-                      const mainItem = itemsInSlot[0];
+                      const slotInfo = shelves[shelfNum]?.[slotLetter];
+                      const hasItems = !!slotInfo && slotInfo.items > 0;
                       
                       return (
                         <Tooltip key={slotLetter}>
                           <TooltipTrigger asChild>
                             <div 
-                              onClick={() => hasItems && onSelectItem(mainItem)}
+                              onClick={() => hasItems && onSelectSlot(closetNum, String(shelfNum), slotLetter)}
                               className={cn(
                                 "aspect-square rounded-lg flex flex-col items-center justify-between p-1.5 border-2 transition-all relative group overflow-hidden",
                                 hasItems 
@@ -53,10 +52,10 @@ export function PhysicalWarehouseMap({ warehouseMap, onSelectItem }: PhysicalWar
                               
                               {hasItems && (
                                 <div className="flex flex-col items-center justify-center flex-1 w-full gap-0.5">
-                                  <span className="text-[7px] font-bold text-primary truncate w-full text-center">NF: {mainItem.nf_number}</span>
+                                  <span className="text-[7px] font-bold text-primary truncate w-full text-center">{slotInfo.items} {slotInfo.items === 1 ? "item" : "itens"}</span>
                                   <Box className="h-4 w-4 text-primary" />
                                   <span className="text-[7px] font-mono font-black text-white/90 bg-slate-900 px-1 rounded-sm truncate w-full text-center">
-                                    {mainItem.control_id}
+                                    {slotInfo.quantity} un
                                   </span>
                                 </div>
                               )}
@@ -66,9 +65,9 @@ export function PhysicalWarehouseMap({ warehouseMap, onSelectItem }: PhysicalWar
                           {hasItems && (
                             <TooltipContent side="top" className="bg-slate-900 border-primary/50 text-white p-3 max-w-xs rounded-xl shadow-2xl">
                               <div className="space-y-2">
-                                <p className="text-xs font-bold">{mainItem.product}</p>
+                                <p className="text-xs font-bold">Armário {closetNum} • {shelfNum}{slotLetter}</p>
                                 <div className="flex gap-2 text-[9px] text-muted-foreground font-mono">
-                                  <span>NF: {mainItem.nf_number}</span><span>•</span><span>ID: {mainItem.control_id}</span>
+                                  <span>{slotInfo.items} {slotInfo.items === 1 ? "item" : "itens"}</span><span>•</span><span>{slotInfo.quantity} un</span>
                                 </div>
                                 <div className="pt-2 border-t border-white/10 text-[9px] text-primary font-bold italic flex items-center gap-1">
                                   <Info className="h-3 w-3" /> Clique para detalhes
@@ -14,6 +14,8 @@ import { PhysicalControls } from "@/components/physical/PhysicalControls";
 import { PhysicalWarehouseMap } from "@/components/physical/PhysicalWarehouseMap";
 import { Card, CardContent } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
+import { Button } from "@/components/ui/button";
+import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Table, TableBody, TableCell, TableRow } from "@/components/ui/table";
 import { MapPin, FileText, ImageIcon, Eye } from "lucide-react";
 
@@ -25,70 +27,120 @@ export default function PhysicalControl() {
   const [isLocationMgrOpen, setIsLocationMgrOpen] = useState(false);
   const [selectedItem, setSelectedItem] = useState<any>(null);
   const [items, setItems] = useState<any[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [search, setSearch] = useState("");
+  const [debouncedSearch, setDebouncedSearch] = useState("");
   const [isRefreshing, setIsRefreshing] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [locations, setLocations] = useState<any[]>([]);
+  const [mapLocation, setMapLocation] = useState<string>("");
+  const [locationMap, setLocationMap] = useState<any>(null);
 
+  // A busca vai para o servidor (?search=); espera o usuário parar de digitar
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedSearch(search.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  // Uma página por vez (cursor); as seguintes vêm pelo link `next`
   const fetchItems = async () => {
     setIsRefreshing(true);
     try {
-      const response = await inventoryService.getAll();
-      const data = Array.isArray(response.data) ? response.data : (response.data?.results || []);
-      setItems(data);
+      const res = await inventoryService.getAll({ search: debouncedSearch || undefined });
+      setItems(res.data.results);
+      setNextPage(res.data.next);
     } catch (error) {
       addToast("Erro ao carregar inventário.", "error");
       setItems([]);
+      setNextPage(null);
     } finally {
       setIsRefreshing(false);
     }
   };
 
-  useEffect(() => { fetchItems(); }, []);
+  const loadMore = async () => {
+    if (!nextPage) return;
+    setIsLoadingMore(true);
+    try {
+      const res = await inventoryService.getNextPage(nextPage);
+      setItems(prev => [...prev, ...res.data.results]);
+      setNextPage(res.data.next);
+    } catch (error) {
+      addToast("Erro ao carregar inventário.", "error");
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const fetchLocationMap = async () => {
+    if (!mapLocation) return;
+    try {
+      const res = await inventoryService.getLocationMap(mapLocation);
+      setLocationMap(res.data);
+    } catch (error) {
+      addToast("Erro ao carregar mapa.", "error");
+      setLocationMap(null);
+    }
+  };
+
+  const refresh = () => {
+    fetchItems();
+    if (viewMode === "map") fetchLocationMap();
+  };
 
-  const filteredItems = useMemo(() => {
-    const term = search.toLowerCase();
-    return items.filter(item => 
-      String(item.product).toLowerCase().includes(term) ||
-      (item.nf_number || "").toLowerCase().includes(term) ||
-      (item.control_id || "").toLowerCase().includes(term)
-    );
-  }, [items, search]);
+  useEffect(() => { fetchItems(); }, [debouncedSearch]);
 
+  useEffect(() => {
+    inventoryService.getLocations().then(res => {
+      const data = Array.isArray(res.data) ? res.data : res.data?.results || [];
+      setLocations(data);
+      if (data.length) setMapLocation(current => current || String(data[0].id));
+    });
+  }, []);
+
+  useEffect(() => { if (viewMode === "map") fetchLocationMap(); }, [viewMode, mapLocation]);
+
+  // Agrupamentos só das páginas já carregadas
   const groupedByNF = useMemo(() => {
-    return filteredItems.reduce((acc: any, item) => {
+    return items.reduce((acc: any, item) => {
       const nf = item.nf_number || "SEM NF";
       if (!acc[nf]) acc[nf] = { nf, sender: item.sender, products: [] };
       acc[nf].products.push(item);
       return acc;
     }, {});
-  }, [filteredItems]);
+  }, [items]);
 
   const kanbanColumns = useMemo(() => {
-    return filteredItems.reduce((acc: any, item) => {
+    return items.reduce((acc: any, item) => {
       const loc = item.location_name || "NÃO ENDEREÇADO";
       if (!acc[loc]) acc[loc] = [];
       acc[loc].push(item);
       return acc;
     }, {});
-  }, [filteredItems]);
+  }, [items]);
 
+  // Ocupação agregada pelo servidor em /locations/{id}/map/
   const warehouseMap = useMemo(() => {
     const map: any = {};
-    filteredItems.forEach(item => {
-      if (!item.physical_location) return;
-      const parts = item.physical_location.split(/[^a-zA-Z0-9]+/).filter(Boolean);
-      let closet, shelf, slot;
-      if (parts.length >= 4 && parts[0].toLowerCase().includes("armario")) {
-        closet = parts[1]; shelf = parts[2]; slot = parts[3].toUpperCase();
-      } else if (parts.length >= 3) {
-        closet = parts[0]; shelf = parts[1]; slot = parts[2].toUpperCase();
-      } else return;
+    (locationMap?.slots || []).forEach((row: any) => {
+      const { closet, shelf } = row;
+      const slot = String(row.slot).toUpperCase();
       if (!map[closet]) map[closet] = {};
       if (!map[closet][shelf]) map[closet][shelf] = {};
-      if (!map[closet][shelf][slot]) map[closet][shelf][slot] = [];
-      map[closet][shelf][slot].push(item);
+      map[closet][shelf][slot] = { items: row.items, quantity: row.quantity };
     });
     return map;
-  }, [filteredItems]);
+  }, [locationMap]);
+
+  // Abre o primeiro item do vão; os demais continuam acessíveis pelo filtro de posição
+  const openSlot = async (closet: string, shelf: string, slot: string) => {
+    try {
+      const res = await inventoryService.getAll({ location: mapLocation, closet, shelf, slot, page_size: 1 });
+      if (res.data.results.length) setSelectedItem(res.data.results[0]);
+    } catch (error) {
+      addToast("Erro ao carregar itens do vão.", "error");
+    }
+  };
 
   return (
     <div className="p-6 space-y-6 flex flex-col h-screen bg-background text-foreground">
@@ -100,13 +152,28 @@ export default function PhysicalControl() {
         viewMode={viewMode}
         setViewMode={setViewMode}
         isRefreshing={isRefreshing}
-        onRefresh={fetchItems}
+        onRefresh={refresh}
         onOpenLocationMgr={() => setIsLocationMgrOpen(true)}
         showAdminActions={!!(user?.isStaff || user?.isSuperuser)}
       />
 
       <div className="flex-1 overflow-auto custom-scrollbar pr-2">
-        {viewMode === "map" && <PhysicalWarehouseMap warehouseMap={warehouseMap} onSelectItem={setSelectedItem} />}
+        {viewMode === "map" && (
+          <div className="space-y-4">
+            <div className="flex items-center gap-4">
+              <Select value={mapLocation} onValueChange={setMapLocation}>
+                <SelectTrigger className="h-10 w-64"><SelectValue placeholder="Selecione o local..." /></SelectTrigger>
+                <SelectContent>{locations.map(l => <SelectItem key={l.id} value={String(l.id)}>{l.name}</SelectItem>)}</SelectContent>
+              </Select>
+              {locationMap && (
+                <p className="text-[10px] text-muted-foreground font-black uppercase">
+                  {locationMap.total_items} itens • {locationMap.unmapped} sem posição
+                </p>
+              )}
+            </div>
+            <PhysicalWarehouseMap warehouseMap={warehouseMap} onSelectSlot={openSlot} />
+          </div>
+        )}
 
         {viewMode === "kanban" && (
           <div className="flex gap-6 h-full pb-4 overflow-x-auto custom-scrollbar">
@@ -167,18 +234,26 @@ export default function PhysicalControl() {
             ))}
           </div>
         )}
+
+        {viewMode !== "map" && nextPage && (
+          <div className="flex justify-center py-6">
+            <Button variant="outline" onClick={loadMore} disabled={isLoadingMore} className="font-black uppercase">
+              {isLoadingMore ? "Carregando..." : "Carregar mais"}
+            </Button>
+          </div>
+        )}
       </div>
 
       <Dialog open={isFormOpen} onOpenChange={setIsFormOpen}>
         <DialogContent className="max-w-3xl max-h-[90vh] overflow-hidden flex flex-col z-[9999]" onPointerDownOutside={(e) => e.preventDefault()}>
           <DialogHeader className="px-6 py-4 border-b"><DialogTitle className="uppercase font-black tracking-tight">Registrar Recebimento</DialogTitle></DialogHeader>
           <div className="flex-1 overflow-y-auto p-6 custom-scrollbar">
-            <PhysicalEntryForm onSuccess={() => { setIsFormOpen(false); fetchItems(); }} />
+            <PhysicalEntryForm onSuccess={() => { setIsFormOpen(false); refresh(); }} />
           </div>
         </DialogContent>
       </Dialog>
 
-      <PhysicalDetailsModal item={selectedItem} onClose={() => setSelectedItem(null)} onRefresh={fetchItems} />
+      <PhysicalDetailsModal item={selectedItem} onClose={() => setSelectedItem(null)} onRefresh={refresh} />
       <LocationManagerModal open={isLocationMgrOpen} onOpenChange={setIsLocationMgrOpen} />
     </div>
   );
@@ -38,7 +38,7 @@ export function ProcessingQueuePage() {
       // 2. Se o usuário estiver LOGADO, busca a fila lateral
       if (isAuthenticated) {
         try {
-          const resQueue = await inventoryService.getProcessingQueue();
+          const resQueue = await inventoryService.getProcessingQueue({ status: "Pendente" });
           setQueue(resQueue.data || []);
         } catch (err) {
           console.error("Erro ao carregar fila lateral");
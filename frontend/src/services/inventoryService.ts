@@ -6,6 +6,8 @@ export const inventoryService = {
   // Physical Control - Items
   // =========================
   getAll: async (params?: any) => api.get("physical-control/items/", { params }),
+  // A lista é paginada por cursor: cada página traz `next` (URL da próxima) ou null no fim
+  getNextPage: async (next: string) => api.get(next),
   updateItem: async (id: number, data: any) => api.patch(`physical-control/items/${id}/`, data),
   deleteItem: async (id: number) => api.delete(`physical-control/items/${id}/`),
 
@@ -16,6 +18,8 @@ export const inventoryService = {
   createLocation: async (data: any) => api.post("physical-control/locations/", data),
   updateLocation: async (id: number, data: any) => api.patch(`physical-control/locations/${id}/`, data),
   deleteLocation: async (id: number) => api.delete(`physical-control/locations/${id}/`),
+  // Ocupação por armário/prateleira/vão, agregada no servidor
+  getLocationMap: async (id: number | string) => api.get(`physical-control/locations/${id}/map/`),
 
   // =========================
   // Physical Control - Batch create